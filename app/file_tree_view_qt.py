@@ -1,11 +1,33 @@
 # app/file_tree_view_qt.py
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QMenu, QAbstractItemView
+    QWidget, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QMenu, QAbstractItemView,
+    QHeaderView, QStyledItemDelegate, QStyleOptionViewItem
 )
 from PyQt6.QtGui import QIcon, QFont, QAction, QCursor
-from PyQt6.QtCore import Qt, QSize, QEvent
+from PyQt6.QtCore import Qt, QSize, QEvent, QTimer
 from pathlib import Path
 
+from core.tree_node import TreeNode
+from core.token_estimator import format_token_count
+
+
+class _TokenColumnDelegate(QStyledItemDelegate):
+    """
+    Draws the Tokens column from the view's count tables when a row is painted, so
+    counts arriving from the background need no setText call per item.
+    """
+    def __init__(self, tree_view):
+        super().__init__(tree_view.tree_widget)
+        self.tree_view = tree_view
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        item_data = index.siblingAtColumn(0).data(Qt.ItemDataRole.UserRole)
+        option.text = self.tree_view.token_text(item_data)
+        option.features |= QStyleOptionViewItem.ViewItemFeature.HasDisplay
+        option.displayAlignment = Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+
+
 class FileTreeViewQt(QWidget):
     # Qt has built-in icons for files/folders, or you can load custom ones
     # For simplicity, we'll use some standard Qt icons first
@@ -19,8 +41,15 @@ class FileTreeViewQt(QWidget):
         self.app_window = app_window # To call back to main window for ignore/unignore
 
         self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderLabel("Name") # Only one column header shown
-        self.tree_widget.setColumnCount(1) # We'll store fullpath and type in item data
+        self.tree_widget.setColumnCount(2) # We'll store fullpath and type in item data
+        self.tree_widget.setHeaderLabels(["Name", "Tokens"])
+        header = self.tree_widget.header()
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
+        header.resizeSection(1, 70)
+        self._token_delegate = _TokenColumnDelegate(self)
+        self.tree_widget.setItemDelegateForColumn(1, self._token_delegate)
 
         # --- Enable Multi-Selection ---
         self.tree_widget.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
@@ -54,19 +83,48 @@ class FileTreeViewQt(QWidget):
         self.tree_widget.customContextMenuRequested.connect(self._on_item_right_click)
 
         self._is_programmatic_change = False
-
-    def _create_tree_item(self, item_data, parent_qt_item=None):
-        if parent_qt_item:
-            qt_item = QTreeWidgetItem(parent_qt_item)
+        self._items_by_path = {} # path -> QTreeWidgetItem, for incremental updates
+        self._unloaded_dirs = set() # Lazy tree: directory paths whose child items don't exist yet
+        self._stream_checked_paths = set() # State carried over while a refresh streams in
+        self._stream_expanded_paths = set()
+
+        # Token counts (see add_token_counts), keyed by TreeNode
+        self._file_tokens = {}
+        self._dir_tokens = {} # Sum over the files counted so far below each directory
+        self._checked_files = set() # File nodes whose item is checked
+        self._checked_tokens = 0
+        # Lazy tree: directories checked while their items don't exist count through a background scan
+        self._subtree_tokens = {} # dir path -> tokens of the files its subtree scan found
+        self._checked_subtrees = set() # Paths of checked directories in _unloaded_dirs
+        self._selection_timer = QTimer(self) # Coalesces the many itemChanged of one (un)check
+        self._selection_timer.setSingleShot(True)
+        self._selection_timer.setInterval(0)
+        self._selection_timer.timeout.connect(self._report_selected_tokens)
+
+    def _create_tree_item(self, item_data, parent_qt_item=None, index=None, check_state=Qt.CheckState.Unchecked):
+        """
+        Builds the item (and its whole subtree) detached from the widget, then inserts it
+        under parent_qt_item (top level if None) at index (appended if None). Building
+        detached avoids an itemChanged signal per new item.
+        """
+        qt_item = self._build_tree_item(item_data, check_state)
+        if parent_qt_item is None:
+            parent_qt_item = self.tree_widget.invisibleRootItem()
+        if index is None:
+            parent_qt_item.addChild(qt_item)
         else:
-            qt_item = QTreeWidgetItem(self.tree_widget) # Add to root
+            parent_qt_item.insertChild(index, qt_item)
+        return qt_item
+
+    def _build_tree_item(self, item_data, check_state=Qt.CheckState.Unchecked, recursive: bool = True):
+        qt_item = QTreeWidgetItem()
 
         qt_item.setText(0, item_data['name'])
-        qt_item.setData(0, Qt.ItemDataRole.UserRole, item_data) # Store full data dict
+        qt_item.setData(0, Qt.ItemDataRole.UserRole, item_data) # The scan's TreeNode, stored by reference
 
         # Checkbox
         qt_item.setFlags(qt_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        qt_item.setCheckState(0, Qt.CheckState.Unchecked) # Default to unchecked
+        qt_item.setCheckState(0, check_state) # Default to unchecked
 
         # Icon
         item_type = item_data['type']
@@ -78,16 +136,84 @@ class FileTreeViewQt(QWidget):
             qt_item.setIcon(0, self.error_icon)
             qt_item.setText(0, f"[Err] {item_data['name']}")
 
+        if item_type == 'directory': # Only directories are ever looked up by path
+            self._items_by_path[item_data['path']] = qt_item
 
-        if item_type == 'directory' and item_data.get("children"):
+        if item_type == 'directory' and "children" in item_data and item_data["children"] is None:
+            # Lazy tree: children are listed when the item is first expanded
+            qt_item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            self._unloaded_dirs.add(item_data['path'])
+        elif recursive and item_type == 'directory' and item_data.get("children"):
             for child_data in item_data["children"]:
-                self._create_tree_item(child_data, qt_item)
+                qt_item.addChild(self._build_tree_item(child_data, check_state))
+        if check_state == Qt.CheckState.Checked: # After _unloaded_dirs, which it looks at
+            self._track_check_state(qt_item)
         return qt_item
 
+    def apply_directory_update(self, dir_path: str | None, children: list, added: list, removed: list):
+        """
+        Applies the result of FileProcessor.update_directory to the widget: removes the
+        items for 'removed' and inserts items for 'added' at their position in 'children'.
+        dir_path is None for the root directory. Other items (and their check/expand
+        state) are left untouched. New items start checked if their parent is checked.
+        """
+        if dir_path is None:
+            parent_qt_item = self.tree_widget.invisibleRootItem()
+            check_state = Qt.CheckState.Unchecked
+        else:
+            parent_qt_item = self._items_by_path.get(dir_path)
+            if parent_qt_item is None:
+                return
+            check_state = parent_qt_item.checkState(0)
+            if check_state != Qt.CheckState.Checked:
+                check_state = Qt.CheckState.Unchecked
+
+        removed_ids = {id(item_data) for item_data in removed}
+        for i in reversed(range(parent_qt_item.childCount())):
+            child = parent_qt_item.child(i)
+            child_data = child.data(0, Qt.ItemDataRole.UserRole)
+            if child_data is not None and id(child_data) in removed_ids:
+                self._forget_item_paths(child)
+                parent_qt_item.removeChild(child)
+
+        added_ids = {id(item_data) for item_data in added}
+        for index, item_data in enumerate(children):
+            if id(item_data) in added_ids:
+                self._create_tree_item(item_data, parent_qt_item, index, check_state)
+
+    def _forget_item_paths(self, qt_item):
+        item_data = qt_item.data(0, Qt.ItemDataRole.UserRole)
+        if item_data and item_data['type'] == 'directory':
+            dir_path = item_data['path']
+            if self._items_by_path.get(dir_path) is qt_item:
+                del self._items_by_path[dir_path]
+                self._unloaded_dirs.discard(dir_path)
+                self._forget_subtree_tokens(dir_path)
+        for i in range(qt_item.childCount()):
+            self._forget_item_paths(qt_item.child(i))
+        if item_data and item_data['type'] == 'file':
+            self._forget_tokens(item_data)
+        elif item_data: # After the files below it, whose removal updated its total
+            self._dir_tokens.pop(item_data, None)
+
     def _on_item_expanded(self, item):
         item_data = item.data(0, Qt.ItemDataRole.UserRole)
         if item_data and item_data['type'] == 'directory':
             item.setIcon(0, self.folder_open_icon)
+            if item_data['path'] in self._unloaded_dirs:
+                self._load_children(item, item_data['path'])
+
+    def _load_children(self, item, dir_path: str):
+        """Lists a lazily loaded directory and creates its child items (one level)."""
+        self._unloaded_dirs.discard(dir_path)
+        self._forget_subtree_tokens(dir_path) # Its items are counted from now on
+        children = self.app_window.load_directory_children(dir_path) if self.app_window else None
+        item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.DontShowIndicatorWhenChildless)
+        if not children:
+            return
+        check_state = Qt.CheckState.Checked if item.checkState(0) == Qt.CheckState.Checked else Qt.CheckState.Unchecked
+        for child_data in children:
+            item.addChild(self._build_tree_item(child_data, check_state))
 
     def _on_item_collapsed(self, item):
         item_data = item.data(0, Qt.ItemDataRole.UserRole)
@@ -99,6 +225,9 @@ class FileTreeViewQt(QWidget):
         Handles item check state changes and propagates them to children.
         Prevents recursion if the change was made programmatically by this propagation logic.
         """
+        if column == 0:
+            self._track_check_state(item) # For every change, propagated ones included
+
         if self._is_programmatic_change: 
             return
 
@@ -203,6 +332,9 @@ class FileTreeViewQt(QWidget):
                 self._collect_state_recursive(root.child(i), previously_checked_paths, previously_expanded_paths)
 
         self.tree_widget.clear()
+        self._items_by_path = {}
+        self._unloaded_dirs = set()
+        self._reset_token_counts()
 
         if directory_data_list:
             for item_data in directory_data_list:
@@ -214,6 +346,61 @@ class FileTreeViewQt(QWidget):
                 self._restore_state_recursive(root.child(i), previously_checked_paths, previously_expanded_paths)
 
 
+    # --- Streaming population (background scans) ---
+    def begin_streaming(self, preserve_state: bool = False):
+        """
+        Clears the tree for a scan whose directories arrive through add_streamed_batch.
+        With preserve_state, check/expand state is carried over by path as items appear.
+        """
+        self._stream_checked_paths = set()
+        self._stream_expanded_paths = set()
+        if preserve_state:
+            root = self.tree_widget.invisibleRootItem()
+            for i in range(root.childCount()):
+                self._collect_state_recursive(root.child(i), self._stream_checked_paths, self._stream_expanded_paths)
+
+        self.tree_widget.clear()
+        self._items_by_path = {}
+        self._unloaded_dirs = set()
+        self._reset_token_counts()
+
+    def add_streamed_batch(self, batch: list):
+        """
+        Adds one batch from ScanWorker: (dir_path, children) pairs in depth-first pre-order,
+        dir_path None for the root. Only the listed level is built for each pair; deeper
+        levels come in their own pairs, so item dicts are never walked recursively here.
+        """
+        checked_paths = self._stream_checked_paths
+        self.tree_widget.setUpdatesEnabled(False)
+        try:
+            for dir_path, children in batch:
+                if dir_path is None:
+                    parent_qt_item = self.tree_widget.invisibleRootItem()
+                else:
+                    parent_qt_item = self._items_by_path.get(dir_path)
+                    if parent_qt_item is None:
+                        continue
+                new_items = []
+                for child_data in children:
+                    check_state = Qt.CheckState.Unchecked
+                    if checked_paths and child_data['path'] in checked_paths: # Paths are rebuilt per call; skip when unused
+                        check_state = Qt.CheckState.Checked
+                    new_items.append(self._build_tree_item(child_data, check_state, recursive=False))
+                parent_qt_item.addChildren(new_items)
+
+                if dir_path in self._stream_expanded_paths:
+                    self._is_programmatic_change = True
+                    try:
+                        parent_qt_item.setExpanded(True)
+                    finally:
+                        self._is_programmatic_change = False
+        finally:
+            self.tree_widget.setUpdatesEnabled(True)
+
+    def end_streaming(self):
+        self._stream_checked_paths = set()
+        self._stream_expanded_paths = set()
+
     def _collect_state_recursive(self, item, checked_paths, expanded_paths):
         item_data = item.data(0, Qt.ItemDataRole.UserRole)
         if item_data and 'path' in item_data:
@@ -247,6 +434,142 @@ class FileTreeViewQt(QWidget):
             self._is_programmatic_change = False # Reset flag
 
 
+    # --- Token counts ---
+    def add_token_counts(self, counts: list):
+        """
+        Takes (file TreeNode, tokens) pairs from TokenCountWorker. Directory totals and the
+        checked total are adjusted by the difference to the file's previous count, so a
+        batch costs one walk up the parent chain per file, not a pass over the tree.
+        """
+        file_tokens, dir_tokens, checked_files = self._file_tokens, self._dir_tokens, self._checked_files
+        checked_delta = 0
+        for node, tokens in counts:
+            delta = tokens - file_tokens.get(node, 0)
+            file_tokens[node] = tokens
+            if not delta:
+                continue
+            if node in checked_files:
+                checked_delta += delta
+            parent = node.parent
+            while isinstance(parent, TreeNode):
+                dir_tokens[parent] = dir_tokens.get(parent, 0) + delta
+                parent = parent.parent
+        self.tree_widget.viewport().update()
+        if checked_delta:
+            self._checked_tokens += checked_delta
+            self._selection_timer.start()
+
+    def token_text(self, item_data) -> str:
+        """Text of the Tokens column for an item: its count, or the total below a directory."""
+        if item_data is None:
+            return ""
+        if item_data['type'] == 'file':
+            tokens = self._file_tokens.get(item_data)
+        elif item_data['type'] == 'directory':
+            tokens = self._dir_tokens.get(item_data)
+        else:
+            tokens = None
+        return "" if tokens is None else format_token_count(tokens)
+
+    @property
+    def selected_token_count(self) -> int:
+        """Tokens of the checked files counted so far."""
+        return self._checked_tokens
+
+    def _track_check_state(self, item):
+        item_data = item.data(0, Qt.ItemDataRole.UserRole)
+        if item_data is None:
+            return
+        if item_data['type'] == 'directory':
+            if self._unloaded_dirs:
+                self._track_unloaded_check_state(item, item_data['path'])
+            return
+        if item_data['type'] != 'file':
+            return
+        if item.checkState(0) == Qt.CheckState.Checked:
+            if item_data not in self._checked_files:
+                self._checked_files.add(item_data)
+                self._checked_tokens += self._file_tokens.get(item_data, 0)
+                self._selection_timer.start()
+        elif item_data in self._checked_files:
+            self._checked_files.discard(item_data)
+            self._checked_tokens -= self._file_tokens.get(item_data, 0)
+            self._selection_timer.start()
+
+    def _track_unloaded_check_state(self, item, dir_path: str):
+        """
+        A checked directory whose children are not loaded yet gets its files scanned in the
+        background (see add_subtree_token_counts); their tokens count while it stays checked.
+        """
+        if dir_path not in self._unloaded_dirs:
+            return
+        if item.checkState(0) == Qt.CheckState.Checked:
+            if dir_path not in self._checked_subtrees:
+                self._checked_subtrees.add(dir_path)
+                self._checked_tokens += self._subtree_tokens.get(dir_path, 0)
+                self._selection_timer.start()
+            if self.app_window:
+                self.app_window.prefetch_subtree(dir_path)
+        elif dir_path in self._checked_subtrees:
+            self._checked_subtrees.discard(dir_path)
+            self._checked_tokens -= self._subtree_tokens.get(dir_path, 0)
+            self._selection_timer.start()
+
+    def checked_unloaded_dirs(self) -> list[str]:
+        """Paths of the checked directories whose children are not loaded yet."""
+        return sorted(self._checked_subtrees)
+
+    def begin_subtree_tokens(self, dir_path: str):
+        """Drops the counts of a directory's earlier subtree scan; a new one is being counted."""
+        tokens = self._subtree_tokens.pop(dir_path, 0)
+        if tokens and dir_path in self._checked_subtrees:
+            self._checked_tokens -= tokens
+            self._selection_timer.start()
+
+    def add_subtree_token_counts(self, dir_path: str, counts: list):
+        """(TreeNode, tokens) pairs for the files of a not-yet-loaded directory's subtree scan."""
+        if dir_path not in self._unloaded_dirs: # Loaded meanwhile: its own items are counted
+            return
+        tokens = sum(file_tokens for _, file_tokens in counts)
+        self._subtree_tokens[dir_path] = self._subtree_tokens.get(dir_path, 0) + tokens
+        if tokens and dir_path in self._checked_subtrees:
+            self._checked_tokens += tokens
+            self._selection_timer.start()
+
+    def _forget_subtree_tokens(self, dir_path: str):
+        tokens = self._subtree_tokens.pop(dir_path, 0)
+        if dir_path in self._checked_subtrees:
+            self._checked_subtrees.discard(dir_path)
+            self._checked_tokens -= tokens
+            self._selection_timer.start()
+
+    def _forget_tokens(self, item_data):
+        """Takes a removed file's count out of its directories' totals and the checked total."""
+        tokens = self._file_tokens.pop(item_data, 0)
+        if item_data in self._checked_files:
+            self._checked_files.discard(item_data)
+            self._checked_tokens -= tokens
+            self._selection_timer.start()
+        if tokens:
+            parent = item_data.parent
+            while isinstance(parent, TreeNode):
+                if parent in self._dir_tokens:
+                    self._dir_tokens[parent] -= tokens
+                parent = parent.parent
+
+    def _reset_token_counts(self):
+        self._file_tokens = {}
+        self._dir_tokens = {}
+        self._checked_files = set()
+        self._checked_tokens = 0
+        self._subtree_tokens = {}
+        self._checked_subtrees = set()
+        self._selection_timer.start()
+
+    def _report_selected_tokens(self):
+        if self.app_window:
+            self.app_window.update_selected_tokens(self._checked_tokens)
+
     def get_checked_files(self) -> list[str]:
         checked_files = []
         root = self.tree_widget.invisibleRootItem()
@@ -258,6 +581,10 @@ class FileTreeViewQt(QWidget):
         item_data = item.data(0, Qt.ItemDataRole.UserRole)
         if item_data and item_data['type'] == 'file' and item.checkState(0) == Qt.CheckState.Checked:
             checked_list.append(item_data['path'])
+        elif (item_data and item_data['path'] in self._unloaded_dirs
+              and item.checkState(0) == Qt.CheckState.Checked and self.app_window):
+            # Checked but never expanded: use the (background) scan of the whole directory
+            checked_list.extend(self.app_window.get_subtree_files(item_data['path']))
         for i in range(item.childCount()):
             self._collect_checked_files_recursive(item.child(i), checked_list)
 
@@ -3,21 +3,28 @@ import sys
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QStatusBar, QSplitter, QFrame, QLabel, QFileDialog, QMessageBox,
-    QTextEdit, QDialog, QDialogButtonBox, QListWidget, QListWidgetItem
+    QTextEdit, QDialog, QDialogButtonBox, QListWidget, QListWidgetItem, QCheckBox, QSpinBox, QLineEdit
 )
 from PyQt6.QtGui import QIcon, QAction # For icons and menu actions
-from PyQt6.QtCore import Qt, QDir
+from PyQt6.QtCore import Qt, QDir, QTimer, pyqtSlot, pyqtSignal
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
 from core import config as core_config
-from core.file_processor import FileProcessor
+from core.file_processor import FileProcessor, ReadStats, DeltaSummary
+from core.fs_watcher import create_watcher
+from core.output_sinks import CompressedFileSink, COMPRESSION_METHODS, preferred_compression
+from .scan_worker_qt import ScanWorker
+from .token_worker_qt import TokenCountWorker
 # from .file_tree_view_qt import FileTreeViewQt # New Qt file tree
 # from .output_view_qt import OutputViewQt     # New Qt output view
 # from .event_handlers_qt import connect_event_handlers # Or integrate handlers directly
 
 class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolbars, status bar
     IGNORE_FILE_NAME = ".file-consolidator-ignore"
+    subtree_scanned = pyqtSignal(str, object) # dir path, Future; emitted from the subtree executor
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -35,6 +42,27 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
         self.current_tree_data = None
         self.project_specific_ignores = set()
 
+        # Live tree updates: the watcher runs in its own thread, the timer drains it on the GUI thread
+        self.fs_watcher = None
+        self.fs_watch_timer = QTimer(self)
+        self.fs_watch_timer.setInterval(200)
+        self.fs_watch_timer.timeout.connect(self._process_fs_changes)
+
+        # Lazy tree mode: background scans of checked-but-unexpanded directories
+        self._subtree_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="subtree")
+        self._subtree_scans = {} # dir path -> Future of its full child list
+        self.subtree_scanned.connect(self._on_subtree_scanned)
+
+        # Background scan state
+        self._scan_worker = None
+        self._scan_is_refresh = False
+        self._scan_started_at = 0.0
+        self._scan_counts = (0, 0) # entries, files
+
+        # Background token counting; several run at once when items are added to a counted tree
+        self._token_workers = []
+        self._subtree_token_workers = {} # TokenCountWorker -> dir path, for subtree scans
+
         self._create_widgets()
         self._layout_widgets()
         self._connect_signals() # For event handling
@@ -51,8 +79,28 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
         self.btn_select_dir = QPushButton("Select Root Directory")
         self.btn_refresh_dir = QPushButton("Refresh Tree")
         self.btn_refresh_dir.setEnabled(False)
+        self.btn_cancel_scan = QPushButton("Cancel Scan")
+        self.btn_cancel_scan.setEnabled(False)
         self.btn_consolidate = QPushButton("Consolidate Checked Files")
+        self.chk_deduplicate = QCheckBox("Deduplicate identical files")
+        self.chk_deduplicate.setChecked(core_config.CONSOLIDATE_DEDUPLICATE)
+        self.spin_token_budget = QSpinBox()
+        self.spin_token_budget.setRange(0, 10_000_000)
+        self.spin_token_budget.setSingleStep(1000)
+        self.spin_token_budget.setGroupSeparatorShown(True)
+        self.spin_token_budget.setSpecialValueText("No budget") # Shown for 0
+        self.spin_token_budget.setSuffix(" tokens")
+        self.spin_token_budget.setToolTip("Token budget: consolidate only what fits, by priority (0 = no budget)")
+        self.spin_token_budget.setValue(core_config.CONSOLIDATE_TOKEN_BUDGET)
         self.btn_view_ignored = QPushButton("View Ignored Patterns")
+        # Delta consolidation: only what changed since the last consolidation or a git revision
+        self.chk_changes_only = QCheckBox("Changes only")
+        self.chk_changes_only.setToolTip("Consolidate only the files added, modified or removed since the baseline")
+        self.chk_diffs = QCheckBox("Modified files as diffs")
+        self.chk_diffs.setEnabled(False)
+        self.edit_since_ref = QLineEdit()
+        self.edit_since_ref.setPlaceholderText("Since the last consolidation, or a git revision (e.g. HEAD, main)")
+        self.edit_since_ref.setEnabled(False)
 
         # --- Main Splitter (replaces PanedWindow) ---
         self.main_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -64,7 +112,12 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
         # For QGroupBox like LabelFrame:
         file_tree_groupbox = QFrame() # Or QGroupBox("File Structure")
         file_tree_layout = QVBoxLayout(file_tree_groupbox)
-        file_tree_layout.addWidget(QLabel("File Structure (Check/Uncheck)")) # Title if not QGroupBox
+        file_tree_title_layout = QHBoxLayout()
+        file_tree_title_layout.addWidget(QLabel("File Structure (Check/Uncheck)")) # Title if not QGroupBox
+        file_tree_title_layout.addStretch()
+        self.lbl_selected_tokens = QLabel("")
+        file_tree_title_layout.addWidget(self.lbl_selected_tokens)
+        file_tree_layout.addLayout(file_tree_title_layout)
         file_tree_layout.addWidget(self.file_tree_view)
         self.main_splitter.addWidget(file_tree_groupbox)
 
@@ -93,16 +146,28 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
         controls_layout = QHBoxLayout()
         controls_layout.addWidget(self.btn_select_dir)
         controls_layout.addWidget(self.btn_refresh_dir)
+        controls_layout.addWidget(self.btn_cancel_scan)
         controls_layout.addWidget(self.btn_consolidate)
+        controls_layout.addWidget(self.chk_deduplicate)
+        controls_layout.addWidget(self.spin_token_budget)
         controls_layout.addWidget(self.btn_view_ignored)
         controls_layout.addStretch() # Pushes buttons to the left
 
+        delta_layout = QHBoxLayout()
+        delta_layout.addWidget(self.chk_changes_only)
+        delta_layout.addWidget(self.chk_diffs)
+        delta_layout.addWidget(self.edit_since_ref, 1)
+
         main_layout.addLayout(controls_layout)
+        main_layout.addLayout(delta_layout)
         main_layout.addWidget(self.main_splitter) # Splitter will take up remaining space
 
     def _connect_signals(self):
         self.btn_select_dir.clicked.connect(self.handle_select_directory)
         self.btn_refresh_dir.clicked.connect(self.handle_refresh_directory)
+        self.btn_cancel_scan.clicked.connect(self.handle_cancel_scan)
+        self.chk_changes_only.toggled.connect(self.chk_diffs.setEnabled)
+        self.chk_changes_only.toggled.connect(self.edit_since_ref.setEnabled)
         self.btn_consolidate.clicked.connect(self.handle_consolidate_files)
         self.btn_view_ignored.clicked.connect(self.show_ignored_patterns_window)
         # More connections as needed
@@ -111,48 +176,126 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
     def handle_select_directory(self):
         directory = QFileDialog.getExistingDirectory(self, "Select Project Root Directory", self.selected_root_dir or QDir.homePath())
         if directory:
+            self._cancel_scan()
             self.selected_root_dir = directory
             self.current_tree_data = None
+            self._stop_watching()
             self.status_bar.showMessage(f"Selected: {directory}. Loading ignores...")
             QApplication.processEvents() # Ensure UI updates
 
             self.load_project_ignores()
-
-            self.status_bar.showMessage(f"Scanning: {directory}...")
-            QApplication.processEvents()
-
-            try:
-                self.current_tree_data = self.file_processor.generate_file_tree(
-                    directory,
-                    additional_ignore_patterns=list(self.project_specific_ignores)
-                )
-                self.file_tree_view.populate_tree(self.current_tree_data, preserve_state=False)
-                self.output_view.set_text("")
-                self.status_bar.showMessage(f"Scanned: {directory}")
-                self.btn_refresh_dir.setEnabled(True)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to scan directory: {e}")
-                self.status_bar.showMessage(f"Error: Failed to scan. {e}")
-                self.btn_refresh_dir.setEnabled(False)
+            self.output_view.set_text("")
+            self._start_scan(is_refresh=False)
 
     def handle_refresh_directory(self):
         if not self.selected_root_dir:
             QMessageBox.information(self, "Info", "No directory selected to refresh.")
             return
-
-        self.status_bar.showMessage(f"Refreshing: {self.selected_root_dir}...")
-        QApplication.processEvents()
-
-        try:
-            self.current_tree_data = self.file_processor.generate_file_tree(
-                self.selected_root_dir,
-                additional_ignore_patterns=list(self.project_specific_ignores)
+        self._start_scan(is_refresh=True)
+
+    # --- Background scanning ---
+    def _start_scan(self, is_refresh: bool):
+        """Scans selected_root_dir on a worker thread, streaming directories into the tree as they are listed."""
+        self._cancel_scan() # A new scan supersedes a running one
+        self._cancel_token_counts()
+        self._stop_watching()
+        self._subtree_scans.clear()
+        self._scan_is_refresh = is_refresh
+        self._scan_started_at = time.monotonic()
+        self.file_tree_view.begin_streaming(preserve_state=is_refresh)
+
+        worker = ScanWorker(
+            self.file_processor, self.selected_root_dir,
+            additional_ignore_patterns=list(self.project_specific_ignores),
+            lazy=core_config.LAZY_TREE_LOADING
+        )
+        worker.batch_ready.connect(self._on_scan_batch)
+        worker.progress.connect(self._on_scan_progress)
+        worker.finished.connect(self._on_scan_finished)
+        worker.failed.connect(self._on_scan_failed)
+        worker.cancelled.connect(self._on_scan_cancelled)
+        self._scan_worker = worker
+        self.btn_cancel_scan.setEnabled(True)
+        self.status_bar.showMessage(f"{'Refreshing' if is_refresh else 'Scanning'}: {self.selected_root_dir}...")
+        worker.start()
+
+    def _cancel_scan(self):
+        """Stops the running scan, if any. Signals still queued from it are ignored."""
+        if self._scan_worker is not None:
+            self._scan_worker.cancel()
+            self._scan_worker = None
+        self.btn_cancel_scan.setEnabled(False)
+
+    def handle_cancel_scan(self):
+        worker = self._scan_worker
+        if worker is not None:
+            worker.cancel() # The worker answers with 'cancelled' after its current directory
+            self.btn_cancel_scan.setEnabled(False)
+            self.status_bar.showMessage("Cancelling scan...")
+
+    def _is_current_scan(self) -> bool:
+        return self._scan_worker is not None and self.sender() is self._scan_worker
+
+    @pyqtSlot(object)
+    def _on_scan_batch(self, batch):
+        if self._is_current_scan():
+            self.file_tree_view.add_streamed_batch(batch)
+            self._scan_worker.batch_consumed()
+
+    @pyqtSlot(int, int, float)
+    def _on_scan_progress(self, entry_count, file_count, entries_per_second):
+        if self._is_current_scan():
+            self._scan_counts = (entry_count, file_count)
+            self.status_bar.showMessage(
+                f"Scanning: {entry_count:,} entries, {file_count:,} files ({entries_per_second:,.0f} entries/s)..."
             )
-            self.file_tree_view.populate_tree(self.current_tree_data, preserve_state=True)
-            self.status_bar.showMessage(f"Refreshed: {self.selected_root_dir}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to refresh directory: {e}")
-            self.status_bar.showMessage(f"Error: Refresh failed. {e}")
+
+    @pyqtSlot(object)
+    def _on_scan_finished(self, tree_items):
+        if not self._is_current_scan():
+            return
+        self._scan_worker = None
+        self.btn_cancel_scan.setEnabled(False)
+        self.current_tree_data = tree_items
+        self.file_tree_view.end_streaming()
+        entry_count, file_count = self._scan_counts
+        elapsed = time.monotonic() - self._scan_started_at
+        action = "Refreshed" if self._scan_is_refresh else "Scanned"
+        self.status_bar.showMessage(
+            f"{action}: {self.selected_root_dir} ({file_count:,} files, {entry_count:,} entries in {elapsed:.1f}s)"
+        )
+        self.btn_refresh_dir.setEnabled(True)
+        self._start_watching()
+        self._count_tokens(tree_items, full_tree=not core_config.LAZY_TREE_LOADING)
+
+    @pyqtSlot(str)
+    def _on_scan_failed(self, error_message):
+        if not self._is_current_scan():
+            return
+        self._scan_worker = None
+        self.btn_cancel_scan.setEnabled(False)
+        self.file_tree_view.end_streaming()
+        if self._scan_is_refresh:
+            QMessageBox.critical(self, "Error", f"Failed to refresh directory: {error_message}")
+            self.status_bar.showMessage(f"Error: Refresh failed. {error_message}")
+        else:
+            QMessageBox.critical(self, "Error", f"Failed to scan directory: {error_message}")
+            self.status_bar.showMessage(f"Error: Failed to scan. {error_message}")
+            self.btn_refresh_dir.setEnabled(False)
+
+    @pyqtSlot(object)
+    def _on_scan_cancelled(self, partial_tree_items):
+        if not self._is_current_scan():
+            return # Superseded by a newer scan
+        self._scan_worker = None
+        self.btn_cancel_scan.setEnabled(False)
+        # Keep what was listed so far; Refresh Tree rescans fully
+        self.current_tree_data = partial_tree_items
+        self.file_tree_view.end_streaming()
+        entry_count, file_count = self._scan_counts
+        self.status_bar.showMessage(f"Scan cancelled after {entry_count:,} entries ({file_count:,} files); tree is incomplete.")
+        self.btn_refresh_dir.setEnabled(True)
+        self._count_tokens(partial_tree_items)
 
     def handle_consolidate_files(self):
         if not self.selected_root_dir:
@@ -162,27 +305,279 @@ class AppMainWindowQt(QMainWindow): # Inherit from QMainWindow for menus, toolba
         if not checked_files:
             QMessageBox.information(self, "Info", "No files checked in the tree.")
             return
+        if self.chk_changes_only.isChecked():
+            self._consolidate_changes(checked_files)
+            return
         try:
-            output_parts = [f"Current Root Directory: {self.selected_root_dir}\n"]
-            if self.current_tree_data is not None:
-                root_dir_name = Path(self.selected_root_dir).name
-                formatted_tree = self.file_processor.format_tree_structure(
-                    self.current_tree_data, root_dir_name
+            read_stats = ReadStats()
+            budget_plan = None
+            tree_items = self._structure_tree()
+            if self.spin_token_budget.value() > 0:
+                budget_plan = self.file_processor.plan_budget(
+                    checked_files, self.selected_root_dir, self.spin_token_budget.value(),
+                    tree_items=tree_items
                 )
-                output_parts.append(f"File Structure:\n{formatted_tree}\n")
-            else:
-                output_parts.append("File Structure: (Not available - rescan directory if needed)\n")
-            output_parts.append("Selected File Contents:\n" + "="*30 + "\n")
-            consolidated_content_str = self.file_processor.consolidate_files_content(
-                checked_files, self.selected_root_dir
+            # Chunks go straight into the view; the whole document is never built as one string
+            self._show_chunks(self.file_processor.iter_consolidation(
+                checked_files, self.selected_root_dir, tree_items, stats=read_stats,
+                deduplicate=self.chk_deduplicate.isChecked(), budget_plan=budget_plan), read_stats.duplicates)
+            message = (
+                f"Consolidated {len(checked_files)} file(s) ({read_stats.cache_hits} from cache): "
+                f"{read_stats.files_per_second:,.0f} files/s, {read_stats.mb_per_second:.1f} MB/s."
             )
-            output_parts.append(consolidated_content_str)
-            self.output_view.set_text("".join(output_parts))
-            self.status_bar.showMessage(f"Consolidated {len(checked_files)} file(s).")
+            if read_stats.duplicate_files:
+                message += (f" {read_stats.duplicate_files} duplicate(s) referenced, "
+                            f"{read_stats.bytes_deduplicated:,} bytes saved.")
+            if budget_plan is not None:
+                message += f" Budget: {budget_plan.summary()}."
+            self.status_bar.showMessage(message)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to consolidate files: {e}")
             self.status_bar.showMessage(f"Error: Consolidation failed. {e}")
 
+    def _show_chunks(self, chunks, duplicates: dict = None):
+        """Streams consolidation chunks into the output view, and into the archive if one is configured."""
+        archive_sink = None
+        if core_config.OUTPUT_ARCHIVE_DIR:
+            archive_dir = Path(core_config.OUTPUT_ARCHIVE_DIR)
+            method = preferred_compression()
+            archive_path = archive_dir / f"consolidation-{time.strftime('%Y%m%d-%H%M%S')}.txt{COMPRESSION_METHODS[method][0]}"
+            try:
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                archive_sink = CompressedFileSink(archive_path, method)
+            except OSError as e:
+                print(f"Could not archive the consolidation to {archive_path}: {e}")
+        self.output_view.begin_text(duplicates)
+        try:
+            for chunk in chunks:
+                self.output_view.append_text(chunk)
+                if archive_sink is not None:
+                    archive_sink.write(chunk)
+        finally:
+            self.output_view.end_text()
+            if archive_sink is not None:
+                archive_sink.close()
+
+    def _consolidate_changes(self, checked_files: list):
+        """Delta consolidation of the checked files (FileProcessor.iter_delta); the token budget does not apply."""
+        since_ref = self.edit_since_ref.text().strip() or None
+        read_stats = ReadStats()
+        summary = DeltaSummary()
+        try:
+            chunks = self.file_processor.iter_delta(checked_files, self.selected_root_dir, since_ref=since_ref,
+                                                    diffs=self.chk_diffs.isChecked(), stats=read_stats, summary=summary)
+            self._show_chunks(chunks)
+            self.status_bar.showMessage(f"Changes: {summary}; {read_stats.files:,} file(s) included.")
+        except RuntimeError as e: # git could not provide the baseline
+            QMessageBox.warning(self, "Git Baseline", f"Could not compare with '{since_ref}':\n{e}")
+            self.status_bar.showMessage(f"Error: No changes computed. {e}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to consolidate changes: {e}")
+            self.status_bar.showMessage(f"Error: Consolidation failed. {e}")
+
+    # --- Lazy tree support (called by FileTreeViewQt) ---
+    def load_directory_children(self, dir_path: str):
+        """Lists a not-yet-loaded directory of the current tree; returns its child list."""
+        if self.current_tree_data is None:
+            return None
+        try:
+            children = self.file_processor.expand_directory(
+                self.current_tree_data, self.selected_root_dir, dir_path,
+                additional_ignore_patterns=list(self.project_specific_ignores)
+            )
+        except Exception as e:
+            self.status_bar.showMessage(f"Error: Could not list {dir_path}. {e}")
+            return None
+        if children is not None and self.fs_watcher is not None:
+            self.fs_watcher.add_directory(dir_path)
+        if children:
+            self._count_tokens(children)
+        return children
+
+    def prefetch_subtree(self, dir_path: str):
+        """Starts a background scan of a whole directory so its files are known when consolidating."""
+        if dir_path not in self._subtree_scans and self.selected_root_dir:
+            future = self._subtree_executor.submit(
+                self.file_processor.scan_subtree,
+                self.selected_root_dir, dir_path, list(self.project_specific_ignores)
+            )
+            self._subtree_scans[dir_path] = future
+            future.add_done_callback(lambda done: self.subtree_scanned.emit(dir_path, done))
+
+    @pyqtSlot(str, object)
+    def _on_subtree_scanned(self, dir_path: str, future):
+        """Counts the tokens of a finished subtree scan, for the checked total of a collapsed directory."""
+        if self._subtree_scans.get(dir_path) is not future or future.cancelled() or future.exception() is not None:
+            return
+        for worker, worker_dir_path in list(self._subtree_token_workers.items()):
+            if worker_dir_path == dir_path: # Counting an earlier scan of the same directory
+                worker.cancel()
+                self._token_workers.remove(worker)
+                del self._subtree_token_workers[worker]
+        self.file_tree_view.begin_subtree_tokens(dir_path)
+        children = future.result()
+        if not children or not self.selected_root_dir:
+            return
+        worker = TokenCountWorker(self.file_processor, str(Path(self.selected_root_dir).resolve()), children)
+        worker.counts_ready.connect(self._on_token_counts)
+        worker.finished.connect(self._on_token_count_finished)
+        self._token_workers.append(worker)
+        self._subtree_token_workers[worker] = dir_path
+        worker.start()
+        self.update_selected_tokens(self.file_tree_view.selected_token_count)
+
+    def _structure_tree(self):
+        """
+        current_tree_data for the "File Structure" preamble. In a lazy tree, collapsed directories
+        whose background scan has finished are filled in, on a copy: the scan results and the
+        live tree stay as they are. Directories still unknown are shown as not loaded.
+        """
+        subtrees = {dir_path: future.result() for dir_path, future in self._subtree_scans.items()
+                    if future.done() and not future.cancelled() and future.exception() is None}
+        if not subtrees or self.current_tree_data is None:
+            return self.current_tree_data
+        return self.file_processor.copy_tree(self.current_tree_data, subtrees)
+
+    def get_subtree_files(self, dir_path: str) -> list[str]:
+        """All files below a directory, from its background scan (waiting for it if still running)."""
+        self.prefetch_subtree(dir_path)
+        future = self._subtree_scans.get(dir_path)
+        if future is None:
+            return []
+        if not future.done():
+            self.status_bar.showMessage(f"Scanning {dir_path}...")
+            QApplication.processEvents()
+        try:
+            return list(self.file_processor.iter_file_paths(future.result()))
+        except Exception as e:
+            self._subtree_scans.pop(dir_path, None) # Retry next time
+            self.status_bar.showMessage(f"Error: Could not scan {dir_path}. {e}")
+            return []
+
+    # --- Live updates from the filesystem watcher ---
+    def _start_watching(self):
+        """(Re)starts watching every directory of the current tree for added/removed entries."""
+        self._stop_watching()
+        if not core_config.WATCH_ENABLED or not self.selected_root_dir or self.current_tree_data is None:
+            return
+        try:
+            self.fs_watcher = create_watcher()
+            root_path_str = str(Path(self.selected_root_dir).resolve())
+            self.fs_watcher.add_directory(root_path_str)
+            self.fs_watcher.watch_git_excludes(root_path_str)
+            self.fs_watcher.watch_directories(self.file_processor.iter_directory_paths(self.current_tree_data))
+            self.fs_watcher.start()
+            self.fs_watch_timer.start()
+        except Exception as e: # Watching is a convenience; Refresh still works without it
+            print(f"Could not start filesystem watcher: {e}")
+            self._stop_watching()
+
+    def _stop_watching(self):
+        self.fs_watch_timer.stop()
+        if self.fs_watcher is not None:
+            self.fs_watcher.stop()
+            self.fs_watcher = None
+
+    def _process_fs_changes(self):
+        if self.fs_watcher is None or self.current_tree_data is None or self._scan_worker is not None:
+            return
+        changes = self.fs_watcher.take_changes()
+        if changes is None:
+            return
+        changed_dirs, needs_full_rescan = changes
+        self._subtree_scans.clear() # Background scans may predate the change
+        if needs_full_rescan:
+            self.handle_refresh_directory()
+            return
+        for dir_path in self.file_tree_view.checked_unloaded_dirs(): # Their token counts are rescanned too
+            self.prefetch_subtree(dir_path)
+
+        root_dir = str(Path(self.selected_root_dir).resolve())
+        added_count = removed_count = 0
+        # Parents first: a directory removed along with its parent is then simply skipped
+        for dir_path in sorted(changed_dirs, key=lambda p: p.count(os.sep)):
+            try:
+                result = self.file_processor.update_directory(
+                    self.current_tree_data, root_dir, dir_path,
+                    additional_ignore_patterns=list(self.project_specific_ignores)
+                )
+            except Exception as e:
+                print(f"Could not update {dir_path}: {e}")
+                continue
+            if result is None:
+                continue
+            children, added, removed = result
+            if not added and not removed:
+                continue
+            self.file_tree_view.apply_directory_update(
+                None if dir_path == root_dir else dir_path, children, added, removed
+            )
+            for item_data in removed:
+                for removed_dir in self.file_processor.iter_directory_paths([item_data]):
+                    self.fs_watcher.remove_directory(removed_dir)
+            for item_data in added:
+                self.fs_watcher.watch_directories(self.file_processor.iter_directory_paths([item_data]))
+            if added:
+                self._count_tokens(added)
+            added_count += len(added)
+            removed_count += len(removed)
+        if added_count or removed_count:
+            self.status_bar.showMessage(f"Tree updated: {added_count} added, {removed_count} removed.", 3000)
+
+    # --- Token counts ---
+    def _count_tokens(self, tree_items: list, full_tree: bool = False):
+        """
+        Counts the tokens of the files in tree_items in the background; the tree shows them
+        as they arrive. full_tree means tree_items is the whole (fully loaded) tree.
+        """
+        if not tree_items or not self.selected_root_dir:
+            return
+        worker = TokenCountWorker(
+            self.file_processor, str(Path(self.selected_root_dir).resolve()), tree_items, full_tree=full_tree
+        )
+        worker.counts_ready.connect(self._on_token_counts)
+        worker.finished.connect(self._on_token_count_finished)
+        self._token_workers.append(worker)
+        worker.start()
+        self.update_selected_tokens(self.file_tree_view.selected_token_count)
+
+    def _cancel_token_counts(self):
+        for worker in self._token_workers:
+            worker.cancel()
+        self._token_workers = []
+        self._subtree_token_workers = {}
+
+    @pyqtSlot(object)
+    def _on_token_counts(self, counts):
+        worker = self.sender()
+        if worker not in self._token_workers: # Counts of a superseded tree are dropped
+            return
+        if worker in self._subtree_token_workers:
+            self.file_tree_view.add_subtree_token_counts(self._subtree_token_workers[worker], counts)
+        else:
+            self.file_tree_view.add_token_counts(counts)
+
+    @pyqtSlot()
+    def _on_token_count_finished(self):
+        worker = self.sender()
+        self._subtree_token_workers.pop(worker, None)
+        if worker in self._token_workers:
+            self._token_workers.remove(worker)
+            self.update_selected_tokens(self.file_tree_view.selected_token_count)
+
+    def update_selected_tokens(self, tokens: int):
+        """Shows the token total of the checked files (called by FileTreeViewQt)."""
+        approximate = "" if self.file_processor.token_counter.exact else "~"
+        counting = " (counting...)" if self._token_workers else ""
+        self.lbl_selected_tokens.setText(f"Checked: {approximate}{tokens:,} tokens{counting}")
+
+    def closeEvent(self, event):
+        self._cancel_scan()
+        self._cancel_token_counts()
+        self._stop_watching()
+        self._subtree_executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
     # ... (load_project_ignores, save_project_ignores, get_relative_path_for_item,
     #      ignore_folder_and_refresh, unignore_folder_and_refresh, get_all_current_ignore_patterns
     #      methods can be ported with minor changes for UI feedback using QMessageBox) ...
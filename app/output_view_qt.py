@@ -1,13 +1,22 @@
 # app/output_view_qt.py
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTextEdit, QPushButton, QLabel, QMessageBox, QApplication, QHBoxLayout
-from PyQt6.QtGui import QDrag, QCursor
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTextEdit, QPushButton, QLabel, QMessageBox, QApplication, QHBoxLayout, QFileDialog
+from PyQt6.QtGui import QDrag, QCursor, QTextCursor
 from PyQt6.QtCore import Qt, QMimeData, QUrl
 import tempfile
 import os
 import stat
 from utils import clipboard_helper # Can still use this
+from core.output_sinks import (FileSink, write_chunks, open_file_sink, compression_for_path,
+                               preferred_compression, COMPRESSION_METHODS)
+from core.container_format import ContainerSink, FILE_EXTENSION as CONTAINER_EXTENSION
 
 class OutputViewQt(QWidget):
+    # Characters of the document handed out per iter_text_chunks() chunk
+    EXPORT_CHUNK_CHARS = 1024 * 1024
+    # What toPlainText() turns Qt's separator characters into
+    _PLAIN_TEXT_REPLACEMENTS = (("\u2029", "\n"), ("\u2028", "\n"), ("\ufdd0", "\n"), ("\ufdd1", "\n"),
+                                ("\u00a0", " "))
+
     def __init__(self, parent=None, app_window=None):
         super().__init__(parent)
         self.app_window = app_window # Main window reference if needed
@@ -15,8 +24,14 @@ class OutputViewQt(QWidget):
         self.text_area = QTextEdit()
         self.text_area.setReadOnly(True)
         self.text_area.setFontFamily("Courier New") # Or QFont("Courier New", 10)
+        # Read-only output: an undo stack would only keep a second copy of every insert
+        self.text_area.setUndoRedoEnabled(False)
+        self._append_cursor = None
+        self._append_format = None
+        self._duplicates = {} # Of the consolidation shown, for saving it as a container
 
         self.btn_copy = QPushButton("Copy to Clipboard")
+        self.btn_save = QPushButton("Save As...")
         self.drag_handle_label = QLabel("Drag as File")
         self.drag_handle_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.drag_handle_label.setStyleSheet("QLabel { border: 1px solid gray; padding: 5px; }") # Basic styling
@@ -34,6 +49,7 @@ class OutputViewQt(QWidget):
 
         buttons_layout = QHBoxLayout()
         buttons_layout.addWidget(self.btn_copy)
+        buttons_layout.addWidget(self.btn_save)
         buttons_layout.addWidget(self.drag_handle_label)
         main_layout.addLayout(buttons_layout)
         main_layout.setContentsMargins(0,0,0,0)
@@ -41,17 +57,50 @@ class OutputViewQt(QWidget):
 
         # --- CONNECTIONS ---
         self.btn_copy.clicked.connect(self.copy_content)
+        self.btn_save.clicked.connect(self.save_content)
 
     def set_text(self, content: str):
+        self._duplicates = {}
         self.text_area.setPlainText(content)
 
     def get_text(self) -> str:
         return self.text_area.toPlainText()
 
+    def has_text(self) -> bool:
+        return not self.text_area.document().isEmpty()
+
+    # --- Streaming ---
+    def begin_text(self, duplicates: dict = None):
+        """Clears the view for a series of append_text() calls (duplicates: see ContainerSink)."""
+        self._duplicates = duplicates if duplicates is not None else {}
+        self.text_area.clear()
+        self._append_cursor = QTextCursor(self.text_area.document())
+        self._append_cursor.movePosition(QTextCursor.MoveOperation.End)
+        self._append_format = self.text_area.currentCharFormat()
+
+    def append_text(self, chunk: str):
+        self._append_cursor.insertText(chunk, self._append_format)
+
+    def end_text(self):
+        self._append_cursor = None
+        self.text_area.moveCursor(QTextCursor.MoveOperation.Start)
+
+    def iter_text_chunks(self):
+        """The text of get_text() in pieces of EXPORT_CHUNK_CHARS, without copying it out whole."""
+        document = self.text_area.document()
+        end = document.characterCount() - 1 # The document always ends in one extra paragraph separator
+        cursor = QTextCursor(document)
+        for start in range(0, end, self.EXPORT_CHUNK_CHARS):
+            cursor.setPosition(start)
+            cursor.setPosition(min(start + self.EXPORT_CHUNK_CHARS, end), QTextCursor.MoveMode.KeepAnchor)
+            text = cursor.selectedText()
+            for separator, replacement in self._PLAIN_TEXT_REPLACEMENTS: # str.replace is far faster than translate
+                text = text.replace(separator, replacement)
+            yield text
+
     def copy_content(self):
-        text_to_copy = self.get_text()
-        if text_to_copy:
-            clipboard_helper.copy_to_clipboard(text_to_copy)
+        if self.has_text():
+            clipboard_helper.copy_chunks_to_clipboard(self.iter_text_chunks())
             original_text = self.btn_copy.text()
             self.btn_copy.setText("Copied!")
             self.btn_copy.repaint()
@@ -64,9 +113,37 @@ class OutputViewQt(QWidget):
         else:
             QMessageBox.information(self, "Clipboard", "Nothing to copy.")
 
+    def save_content(self):
+        """Saves the output as text or as an indexed container (see core.container_format)."""
+        if not self.has_text():
+            QMessageBox.information(self, "Save", "Nothing to save.")
+            return
+        container_filter = f"Indexed container (*{CONTAINER_EXTENSION})"
+        compressed_filter = "Compressed text (*.txt.zst *.txt.gz)"
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Output", "consolidated.txt", f"Text (*.txt);;{compressed_filter};;{container_filter}")
+        if not path:
+            return
+        as_container = selected_filter == container_filter or path.endswith(CONTAINER_EXTENSION)
+        if as_container and not path.endswith(CONTAINER_EXTENSION):
+            path += CONTAINER_EXTENSION
+        elif selected_filter == compressed_filter and not compression_for_path(path):
+            path += COMPRESSION_METHODS[preferred_compression()][0]
+        try:
+            if as_container:
+                sink = ContainerSink(path, duplicates=self._duplicates)
+            else:
+                sink = open_file_sink(path, encoding='utf-8')
+            with sink:
+                write_chunks(self.iter_text_chunks(), sink)
+        except Exception as e:
+            QMessageBox.critical(self, "Save Error", f"Could not save {path}:\n{e}")
+            return
+        if self.app_window and hasattr(self.app_window, 'status_bar'):
+            self.app_window.status_bar.showMessage(f"Saved {sink.bytes_written:,} bytes to {path}.", 3000)
+
     def _prepare_temp_file_for_drag(self) -> bool:
-        content = self.get_text()
-        if not content:
+        if not self.has_text():
             QMessageBox.information(self, "Drag File", "Output is empty, nothing to drag.")
             return False
         self._cleanup_temp_drag_file() # Cleanup previous temp file if any
@@ -74,9 +151,9 @@ class OutputViewQt(QWidget):
             # Create a temporary file. mkstemp returns a low-level file handle and an absolute pathname.
             fd, self._temp_drag_file_path = tempfile.mkstemp(suffix=".txt", prefix="consolidated_output_", text=False)
             
-            # Write content to the temporary file using the file descriptor
-            with os.fdopen(fd, "wb") as f: # 'wb' for binary mode, content encoded to utf-8
-                f.write(content.encode('utf-8'))
+            # Write content to the temporary file using the file descriptor, a chunk at a time
+            with os.fdopen(fd, "wb") as f, FileSink(f, encoding='utf-8') as sink:
+                write_chunks(self.iter_text_chunks(), sink)
             
             # IMPORTANT: Set permissions to make it readable by other applications.
             # tempfile.mkstemp usually creates files with 0o600 (owner read/write).
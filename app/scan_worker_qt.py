@@ -0,0 +1,102 @@
+# app/scan_worker_qt.py
+import time
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from core.file_processor import ScanCancelled
+
+
+class ScanWorker(QObject):
+    """
+    Runs FileProcessor.iter_file_tree on a background thread and streams the result.
+
+    The worker object itself lives in the GUI thread; run() executes on a plain Python
+    thread, so every signal is delivered to GUI-thread receivers as a queued call.
+    Signals carry Python objects as 'object' so item dicts are passed by reference
+    instead of being converted to Qt containers.
+    """
+    # list of (dir_path or None for the root, children) in discovery order
+    batch_ready = pyqtSignal(object)
+    # entries seen, files seen, entries per second
+    progress = pyqtSignal(int, int, float)
+    finished = pyqtSignal(object) # Complete list of root items
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal(object) # Partial list of root items
+
+    BATCH_INTERVAL_SECONDS = 0.1
+    BATCH_MAX_ENTRIES = 2000
+    # Batches emitted but not yet acknowledged with batch_consumed(). Building items is
+    # slower than listing directories, so without this limit a fast (index-backed) scan
+    # would queue the whole tree and the GUI thread would block while draining it.
+    MAX_BATCHES_IN_FLIGHT = 2
+
+    def __init__(self, file_processor, root_path_str: str, additional_ignore_patterns: list = None,
+                 lazy: bool = False, parent=None):
+        super().__init__(parent)
+        self.file_processor = file_processor
+        self.root_path_str = root_path_str
+        self.additional_ignore_patterns = list(additional_ignore_patterns or [])
+        self.lazy = lazy
+        self._cancel_event = threading.Event()
+        self._in_flight = threading.Semaphore(self.MAX_BATCHES_IN_FLIGHT)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="ScanWorker", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def batch_consumed(self):
+        """Called by the receiver once it has handled a batch_ready batch."""
+        self._in_flight.release()
+
+    def _emit_batch(self, batch: list):
+        # Wait for the receiver to catch up, but keep reacting to cancel()
+        while not self._in_flight.acquire(timeout=0.05):
+            if self._cancel_event.is_set():
+                return
+        self.batch_ready.emit(batch)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        start_time = last_emit_time = time.monotonic()
+        entry_count = file_count = 0
+        pending, pending_entries = [], 0
+        root_items = []
+        try:
+            for dir_path, children in self.file_processor.iter_file_tree(
+                    self.root_path_str,
+                    additional_ignore_patterns=self.additional_ignore_patterns,
+                    lazy=self.lazy,
+                    cancel_event=self._cancel_event):
+                if dir_path is None:
+                    root_items = children
+                pending.append((dir_path, children))
+                pending_entries += len(children)
+                entry_count += len(children)
+                file_count += sum(1 for item_info in children if item_info["type"] == "file")
+
+                now = time.monotonic()
+                if now - last_emit_time >= self.BATCH_INTERVAL_SECONDS or pending_entries >= self.BATCH_MAX_ENTRIES:
+                    self._emit_batch(pending)
+                    self.progress.emit(entry_count, file_count, entry_count / max(now - start_time, 1e-6))
+                    pending, pending_entries = [], 0
+                    last_emit_time = now
+        except ScanCancelled:
+            if pending:
+                self.batch_ready.emit(pending) # Keeps the view in step with the partial tree
+            self.cancelled.emit(root_items)
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
+        if pending:
+            self._emit_batch(pending)
+        elapsed = time.monotonic() - start_time
+        self.progress.emit(entry_count, file_count, entry_count / max(elapsed, 1e-6))
+        self.finished.emit(root_items)
@@ -0,0 +1,42 @@
+# app/token_worker_qt.py
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class TokenCountWorker(QObject):
+    """
+    Counts the tokens of every file in a list of tree items on a background thread
+    (FileProcessor.iter_token_counts) and streams the counts back, like ScanWorker
+    streams a scan. Counts arrive as lists of (TreeNode, tokens).
+    """
+    counts_ready = pyqtSignal(object)
+    finished = pyqtSignal()
+
+    def __init__(self, file_processor, root_path_str: str, tree_items: list, full_tree: bool = False, parent=None):
+        super().__init__(parent)
+        self.file_processor = file_processor
+        self.root_path_str = root_path_str
+        self.tree_items = tree_items
+        self.full_tree = full_tree # Counts of files no longer in the tree are dropped from the index
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="TokenCountWorker", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        try:
+            file_items = list(self.file_processor.iter_file_items(self.tree_items))
+            for counts in self.file_processor.iter_token_counts(
+                    self.root_path_str, file_items, cancel_event=self._cancel_event, prune=self.full_tree):
+                self.counts_ready.emit(counts)
+        except Exception as e: # Counts are informational; the tree works without them
+            print(f"Token counting failed: {e}")
+        self.finished.emit()
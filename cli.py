@@ -0,0 +1,327 @@
+# cli.py
+# Headless entry point: python -m cli consolidate [ROOT] [options]
+#                       python -m cli batch MANIFEST [--jobs N] [--report PATH]
+#                       python -m cli serve [--socket PATH] [--port N]
+# Only argparse is imported up front; the core modules are imported by the command that
+# needs them, and nothing here imports PyQt6, tkinter or pyperclip (except --clipboard
+# on systems without a copy command to pipe into).
+import os
+import sys
+import json
+import time
+import argparse
+
+
+def add_consolidate_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("root", nargs="?", default=".", help="directory to consolidate (default: the current one)")
+    parser.add_argument("-i", "--include", action="append", metavar="PATTERN",
+                        help="only include files matching PATTERN (a glob; without '/' it matches file names "
+                             "at any depth, e.g. '*.py', else the relative path, e.g. 'src/*'); repeatable")
+    parser.add_argument("-x", "--exclude", action="append", metavar="PATTERN",
+                        help="ignore pattern added to the defaults and the project's ignore file; repeatable")
+    parser.add_argument("--no-default-ignores", action="store_true",
+                        help="do not apply the built-in ignore patterns (.git, node_modules, ...)")
+    parser.add_argument("-o", "--output", default="-", metavar="PATH",
+                        help="output file ('-' for stdout, the default); .gz/.zst files are compressed")
+    parser.add_argument("-f", "--format", choices=("text", "container"),
+                        help="text (the default) or the indexed container (the default for .fccx outputs)")
+    parser.add_argument("--clipboard", action="store_true", help="copy the output to the clipboard instead")
+    parser.add_argument("--budget", type=int, default=0, metavar="TOKENS",
+                        help="include only what fits into TOKENS tokens, by priority (see CONSOLIDATE_PRIORITIES)")
+    parser.add_argument("--changes", action="store_true",
+                        help="only the files added, modified or removed since the last consolidation")
+    parser.add_argument("--since", metavar="REF", help="only the changes since git revision REF")
+    parser.add_argument("--diffs", action="store_true", help="with --changes/--since: modified files as diffs")
+    parser.add_argument("--deduplicate", action=argparse.BooleanOptionalAction, default=None,
+                        help="reference files identical to an earlier one instead of repeating them")
+    parser.add_argument("--no-tree", action="store_true", help="leave out the file structure")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="do not record this consolidation as the baseline for --changes")
+    parser.add_argument("--workers", type=int, metavar="N", help="threads reading files")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no summary on stderr")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Consolidate a directory's files into one document, without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    consolidate_parser = subparsers.add_parser(
+        "consolidate", help="consolidate one directory", description="Consolidate one directory.")
+    add_consolidate_arguments(consolidate_parser)
+    consolidate_parser.set_defaults(handler=run_consolidate)
+    batch_parser = subparsers.add_parser(
+        "batch", help="run the consolidations of a manifest on a process pool",
+        description="Run the consolidation jobs of a JSON manifest on a process pool. The manifest is a list "
+                    "of jobs or {\"defaults\": {...}, \"jobs\": [...]}; a job has a \"root\", an \"output\" "
+                    "and optionally a \"name\" and any consolidate option by its long name, e.g. "
+                    "{\"root\": \"services/api\", \"output\": \"out/api.txt.gz\", \"include\": [\"*.py\"]}. "
+                    "Relative paths are taken from the manifest's directory. Jobs on the same root run in "
+                    "one process and share its scan.")
+    batch_parser.add_argument("manifest", help="JSON manifest of jobs")
+    batch_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+                              help="worker processes (default: the CPU count)")
+    batch_parser.add_argument("--report", metavar="PATH", help="also write the per-job report as JSON to PATH")
+    batch_parser.add_argument("-q", "--quiet", action="store_true", help="no report on stderr")
+    batch_parser.set_defaults(handler=run_batch)
+    serve_parser = subparsers.add_parser(
+        "serve", help="keep roots scanned and serve scans, token counts and consolidations over HTTP",
+        description="Run the consolidation daemon: roots are scanned on first use and kept in memory, in sync "
+                    "through a filesystem watcher, with their file contents and token counts cached. It serves "
+                    "HTTP with JSON bodies (GET /status, POST /scan, /tokens, /consolidate, /shutdown; see "
+                    "core/daemon.py) on a Unix socket and/or on 127.0.0.1.")
+    serve_parser.add_argument("--socket", metavar="PATH",
+                              help="Unix socket to listen on (default: DAEMON_SOCKET_PATH in the user config "
+                                   "directory, where Unix sockets are available)")
+    serve_parser.add_argument("--no-socket", action="store_true", help="do not listen on a Unix socket")
+    serve_parser.add_argument("--port", type=int, metavar="N",
+                              help="also listen on 127.0.0.1:N (0 for any free port); clients must send the token "
+                                   "from DAEMON_STATE_FILE. The default without a Unix socket is DAEMON_PORT")
+    serve_parser.set_defaults(handler=run_serve)
+    return parser
+
+
+def open_output_sink(output: str, output_format: str = None, clipboard: bool = False, duplicates: dict = None):
+    """The sink for an --output/--format/--clipboard combination; duplicates is ReadStats.duplicates."""
+    from core.output_sinks import FileSink, open_file_sink, open_clipboard_sink
+    if clipboard:
+        return open_clipboard_sink()
+    if output_format is None:
+        output_format = "container" if output.endswith(".fccx") else "text"
+    if output_format == "container":
+        from core.container_format import ContainerSink
+        return ContainerSink(sys.stdout.buffer if output == "-" else output, duplicates=duplicates)
+    if output == "-":
+        return FileSink(sys.stdout.buffer)
+    return open_file_sink(output)
+
+
+def select_files(file_processor, args, scans: dict = None) -> tuple:
+    """
+    Scans args.root and returns (resolved root, tree items, the file paths to consolidate).
+    With scans, a dict kept across calls, a root scanned before with the same ignore
+    settings is not scanned again.
+    """
+    from pathlib import Path
+    from core import config
+    from core.budget_packer import PriorityRules
+    from core.ignore_matcher import load_project_ignores
+    file_processor.ignore_patterns = [] if args.no_default_ignores else config.DEFAULT_IGNORE_PATTERNS
+    root_path_str = str(Path(args.root).resolve())
+    ignore_patterns = load_project_ignores(root_path_str)
+    ignore_patterns += [pattern for pattern in args.exclude or () if pattern not in ignore_patterns]
+    scan_key = (root_path_str, args.no_default_ignores, tuple(ignore_patterns))
+    scan = scans.get(scan_key) if scans is not None else None
+    if scan is None:
+        tree_items = file_processor.generate_file_tree(root_path_str, ignore_patterns)
+        scan = (tree_items, list(file_processor.iter_file_paths(tree_items)))
+        if scans is not None:
+            scans[scan_key] = scan
+    tree_items, file_paths = scan
+    if args.include:
+        included = PriorityRules({pattern: 1 for pattern in args.include}) # Matched like priorities
+        prefix_length = len(root_path_str.rstrip(os.sep)) + 1
+        file_paths = [path for path in file_paths if included(path[prefix_length:]) > 0]
+    return root_path_str, tree_items, file_paths
+
+
+def consolidation_chunks(file_processor, args, root_path_str: str, tree_items: list, file_paths: list,
+                         stats, notes: list):
+    """The output of one consolidate command as text chunks; notes collects lines for the summary."""
+    from core.file_processor import DeltaSummary
+    record_snapshot = False if args.no_snapshot else None
+    if args.changes or args.since:
+        summary = DeltaSummary()
+        chunks = file_processor.iter_delta(file_paths, root_path_str, since_ref=args.since, diffs=args.diffs,
+                                           workers=args.workers, stats=stats, summary=summary,
+                                           record_snapshot=record_snapshot)
+        yield from chunks
+        notes.append(f"Changes: {summary}")
+        return
+    budget_plan = None
+    if args.budget > 0:
+        budget_plan = file_processor.plan_budget(file_paths, root_path_str, args.budget,
+                                                 tree_items=None if args.no_tree else tree_items)
+        notes.append(f"Budget: {budget_plan.summary()}")
+    yield from file_processor.iter_consolidation(
+        file_paths, root_path_str, None if args.no_tree else tree_items, workers=args.workers, stats=stats,
+        deduplicate=args.deduplicate, budget_plan=budget_plan, record_snapshot=record_snapshot)
+
+
+def run_consolidate(args) -> int:
+    from core.file_processor import FileProcessor, ReadStats # Imported here so --help starts at once
+    from core.output_sinks import write_chunks
+    file_processor = FileProcessor()
+    stats = ReadStats()
+    notes = []
+    root_path_str, tree_items, file_paths = select_files(file_processor, args)
+    with open_output_sink(args.output, args.format, args.clipboard, stats.duplicates) as sink:
+        write_chunks(consolidation_chunks(file_processor, args, root_path_str, tree_items, file_paths,
+                                          stats, notes), sink)
+    if not args.quiet:
+        print(f"Consolidated {len(file_paths):,} file(s) from {root_path_str}: {stats}", file=sys.stderr)
+        for note in notes:
+            print(note, file=sys.stderr)
+    return 0
+
+
+# --- Batch ---
+def load_manifest(manifest_path: str) -> list:
+    """
+    The jobs of a manifest as consolidate argument namespaces, each with a 'name'.
+    Raises ValueError for a manifest that cannot be used; nothing has run by then.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{manifest_path} is not valid JSON: {e}") from e
+    defaults, jobs = ({}, manifest) if isinstance(manifest, list) else (manifest.get("defaults", {}), manifest.get("jobs"))
+    if not isinstance(jobs, list) or not isinstance(defaults, dict):
+        raise ValueError(f"{manifest_path}: expected a list of jobs or {{\"defaults\": {{...}}, \"jobs\": [...]}}")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    consolidate_parser = argparse.ArgumentParser(add_help=False)
+    add_consolidate_arguments(consolidate_parser)
+    known = vars(consolidate_parser.parse_args([]))
+    namespaces = []
+    for number, job in enumerate(jobs, 1):
+        if not isinstance(job, dict):
+            raise ValueError(f"{manifest_path}: job {number} is not an object")
+        options = {**defaults, **job}
+        name = options.pop("name", None) or f"{number}: {options.get('root', '.')}"
+        unknown = sorted(key for key in options if key.replace("-", "_") not in known)
+        if unknown:
+            raise ValueError(f"{manifest_path}: job '{name}' has unknown option(s): {', '.join(unknown)}")
+        args = argparse.Namespace(**known)
+        for key, value in options.items():
+            setattr(args, key.replace("-", "_"), value)
+        for key in ("include", "exclude"): # A single pattern may be given as a string
+            if isinstance(getattr(args, key), str):
+                setattr(args, key, [getattr(args, key)])
+        if args.output in (None, "-") or args.clipboard:
+            raise ValueError(f"{manifest_path}: job '{name}' needs an output file")
+        args.root = os.path.join(base_dir, args.root)
+        args.output = os.path.join(base_dir, args.output)
+        args.name = name
+        args.quiet = True
+        namespaces.append(args)
+    return namespaces
+
+
+def run_batch_group(jobs: list) -> list:
+    """
+    Runs the jobs of one root in this (worker) process, one after the other, sharing one
+    FileProcessor: the scan, content cache and indexes of the root are reused, and only
+    this process writes the root's snapshot. Returns one report dict per job.
+    """
+    from core.file_processor import FileProcessor, ReadStats
+    from core.output_sinks import write_chunks
+    file_processor = FileProcessor()
+    scans = {}
+    reports = []
+    for args in jobs:
+        report = {"name": args.name, "root": args.root, "output": args.output, "pid": os.getpid()}
+        started = time.perf_counter()
+        try:
+            scans_before = len(scans)
+            root_path_str, tree_items, file_paths = select_files(file_processor, args, scans)
+            scanned = time.perf_counter()
+            stats = ReadStats()
+            notes = []
+            output_dir = os.path.dirname(args.output)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            with open_output_sink(args.output, args.format, duplicates=stats.duplicates) as sink:
+                write_chunks(consolidation_chunks(file_processor, args, root_path_str, tree_items, file_paths,
+                                                  stats, notes), sink)
+            report.update(status="ok", files=len(file_paths), files_read=stats.files, bytes_read=stats.bytes_read,
+                          output_bytes=os.path.getsize(args.output), scan_shared=len(scans) == scans_before,
+                          scan_seconds=scanned - started, consolidate_seconds=time.perf_counter() - scanned,
+                          notes=notes)
+        except Exception as e: # One failing job must not take the others down
+            report.update(status="failed", error=f"{type(e).__name__}: {e}")
+        report["seconds"] = time.perf_counter() - started
+        reports.append(report)
+    return reports
+
+
+def format_batch_report(reports: list, wall_seconds: float, processes: int) -> str:
+    def size(value):
+        return f"{value / (1024 * 1024):,.1f} MB" if value >= 1024 * 1024 else f"{value / 1024:,.1f} KB"
+
+    name_width = min(max([len("JOB")] + [len(report["name"]) for report in reports]), 40)
+    lines = [f"{'JOB':<{name_width}}  {'FILES':>8}  {'READ':>10}  {'OUTPUT':>10}  {'SCAN':>8}  {'CONSOL.':>8}  STATUS"]
+    for report in reports:
+        name = report["name"][:name_width]
+        if report["status"] != "ok":
+            lines.append(f"{name:<{name_width}}  {'':>8}  {'':>10}  {'':>10}  {'':>8}  {report['seconds']:>7.2f}s  "
+                         f"FAILED: {report['error']}")
+            continue
+        scan = "shared" if report["scan_shared"] else f"{report['scan_seconds']:.2f}s"
+        lines.append(f"{name:<{name_width}}  {report['files']:>8,}  {size(report['bytes_read']):>10}  "
+                     f"{size(report['output_bytes']):>10}  {scan:>8}  {report['consolidate_seconds']:>7.2f}s  ok")
+    failed = sum(report["status"] != "ok" for report in reports)
+    busy = sum(report["seconds"] for report in reports)
+    lines.append(f"{len(reports)} job(s) in {wall_seconds:.2f}s on {processes} process(es) "
+                 f"({busy:.2f}s of job time){f'; {failed} failed' if failed else ''}")
+    return "\n".join(lines)
+
+
+def run_batch(args) -> int:
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = load_manifest(args.manifest)
+    groups = {} # resolved root -> its jobs, in manifest order
+    for job in jobs:
+        groups.setdefault(os.path.realpath(job.root), []).append(job)
+    # Largest groups first, so a long one does not start last
+    ordered_groups = sorted(groups.values(), key=len, reverse=True)
+    processes = max(1, min(args.jobs, len(ordered_groups)))
+    started = time.perf_counter()
+    reports_by_job = {}
+    if processes == 1:
+        results = map(run_batch_group, ordered_groups)
+        for group, reports in zip(ordered_groups, results):
+            reports_by_job.update(zip(map(id, group), reports))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [(group, pool.submit(run_batch_group, group)) for group in ordered_groups]
+            for group, future in futures:
+                reports_by_job.update(zip(map(id, group), future.result()))
+    wall_seconds = time.perf_counter() - started
+    reports = [reports_by_job[id(job)] for job in jobs]
+    if not args.quiet:
+        print(format_batch_report(reports, wall_seconds, processes), file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"wall_seconds": wall_seconds, "processes": processes, "jobs": reports}, f, indent=2)
+    return 1 if any(report["status"] != "ok" for report in reports) else 0
+
+
+def run_serve(args) -> int:
+    from core import config
+    from core.daemon import ConsolidationDaemon, unix_sockets_available
+    socket_path = None
+    if not args.no_socket and unix_sockets_available():
+        socket_path = args.socket or str(config.DAEMON_SOCKET_PATH)
+    port = args.port
+    if socket_path is None and port is None:
+        port = config.DAEMON_PORT
+    ConsolidationDaemon().serve(socket_path, port)
+    return 0
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except BrokenPipeError: # Output piped into e.g. head, which stopped reading
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno()) # Nothing more to flush at exit
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
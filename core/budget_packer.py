@@ -0,0 +1,122 @@
+# core/budget_packer.py
+import re
+import fnmatch
+
+
+class PriorityRules:
+    """
+    Priorities for relative paths from a {path or glob pattern: number} mapping. An exact
+    path wins; otherwise the highest priority of the matching patterns applies, and
+    unmatched paths get the default. Patterns without a '/' match the file name at any
+    depth ('*.md'); others match the whole '/'-separated path ('src/*').
+    """
+    def __init__(self, priorities: dict = None, default: float = 0):
+        self.default = default
+        self._exact = {}
+        self._name_patterns = []
+        self._path_patterns = []
+        for pattern, priority in (priorities or {}).items():
+            pattern = pattern.replace("\\", "/").strip("/")
+            if not any(c in pattern for c in "*?["):
+                self._exact[pattern] = priority
+            elif "/" in pattern:
+                self._path_patterns.append((re.compile(fnmatch.translate(pattern)).match, priority))
+            else:
+                self._name_patterns.append((re.compile(fnmatch.translate(pattern)).match, priority))
+
+    def __call__(self, relative_path: str) -> float:
+        relative_path = relative_path.replace("\\", "/")
+        priority = self._exact.get(relative_path)
+        if priority is not None:
+            return priority
+        name = relative_path.rsplit("/", 1)[-1]
+        matched = [p for match, p in self._path_patterns if match(relative_path)]
+        matched += [p for match, p in self._name_patterns if match(name)]
+        return max(matched) if matched else self.default
+
+
+class BudgetPlan:
+    """
+    What pack() decided for each candidate: included whole, truncated to an allowance,
+    or dropped. Costs are in 'unit' ("tokens" or "bytes"); labels map keys to the names
+    used in report().
+    """
+    REPORT_MAX_LINES = 50
+
+    def __init__(self, budget: int, unit: str = "tokens"):
+        self.budget = budget
+        self.unit = unit
+        self.costs = {} # key -> cost of the whole candidate
+        self.included = [] # keys included whole
+        self.truncated = {} # key -> allowance (< its cost)
+        self.dropped = [] # keys left out, highest priority first
+        self.used = 0
+        self.labels = {}
+        self._allowances = {} # key -> None (whole), allowance or 0 (dropped)
+
+    @property
+    def is_complete(self) -> bool:
+        return not self.truncated and not self.dropped
+
+    def allowance(self, key):
+        """None for a candidate included whole, its allowance if truncated, 0 if dropped (or unknown)."""
+        return self._allowances.get(key, 0)
+
+    def summary(self) -> str:
+        return (f"{len(self.included)} file(s) whole, {len(self.truncated)} truncated, {len(self.dropped)} left out; "
+                f"{self.used:,} of {self.budget:,} {self.unit}")
+
+    def report(self) -> str:
+        """The list of truncated and dropped candidates appended to a consolidation ('' if none)."""
+        if self.is_complete:
+            return ""
+        lines = [f"--- OMITTED TO FIT THE BUDGET OF {self.budget:,} {self.unit.upper()} ---"]
+        entries = [f"Truncated: {self.labels.get(key, key)} (kept {allowance:,} of {self.costs[key]:,} {self.unit})"
+                   for key, allowance in self.truncated.items()]
+        entries += [f"Left out: {self.labels.get(key, key)} ({self.costs[key]:,} {self.unit})" for key in self.dropped]
+        if len(entries) > self.REPORT_MAX_LINES:
+            rest = self.dropped[len(self.dropped) - (len(entries) - self.REPORT_MAX_LINES):]
+            entries = entries[:self.REPORT_MAX_LINES]
+            entries.append(f"... and {len(rest):,} more file(s) ({sum(self.costs[key] for key in rest):,} {self.unit})")
+        lines += entries
+        lines.append("--- END OF OMISSIONS ---")
+        return "\n".join(lines) + "\n"
+
+
+def pack(candidates, budget: int, allow_truncation: bool = True, min_truncated: int = 1,
+         unit: str = "tokens") -> BudgetPlan:
+    """
+    Greedy packing of (key, cost, priority) candidates into budget, in O(n log n).
+
+    Candidates are taken by priority, highest first, and the cheaper ones first within a
+    priority. Each is included whole if it fits. The first one that does not fit is
+    truncated to the rest of the budget (if truncation is allowed and at least
+    min_truncated is left), which fills the budget exactly; otherwise it is dropped and
+    cheaper candidates further down may still fit. Since a truncated candidate fills
+    whatever is left, the cheapest-first order costs no content, and it makes as many
+    files as possible whole. An exact knapsack would only matter without truncation, and
+    its pseudo-polynomial table is out of reach for budgets of 10^5-10^6 anyway.
+    """
+    plan = BudgetPlan(budget, unit)
+    costs = plan.costs
+    order = []
+    for key, cost, priority in candidates:
+        costs[key] = cost
+        order.append((-priority, cost, len(order), key))
+    order.sort()
+    remaining = budget
+    min_truncated = max(min_truncated, 1)
+    allowances = plan._allowances
+    for _, cost, _, key in order:
+        if cost <= remaining:
+            plan.included.append(key)
+            allowances[key] = None
+            remaining -= cost
+        elif allow_truncation and remaining >= min_truncated:
+            plan.truncated[key] = allowances[key] = remaining
+            remaining = 0
+        else:
+            plan.dropped.append(key)
+            allowances[key] = 0
+    plan.used = budget - remaining
+    return plan
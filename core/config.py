@@ -1,6 +1,7 @@
 # core/config.py
+import os
+import sys
 from pathlib import Path
-import appdirs # For user-specific config directory
 
 # Application name for appdirs
 APP_NAME = "LLMContextBuilder"
@@ -14,12 +15,167 @@ DEFAULT_IGNORE_PATTERNS = [
     "*.swp", "*.swo",
 ]
 
+# Number of threads used to list directories during a scan. 1 keeps the serial walk;
+# higher values help on high-latency filesystems (NFS, container overlays).
+SCAN_WORKERS = 1
+
+# Keep a persistent per-root index of directory listings (validated by directory mtime)
+# so that refreshes only re-read directories that changed.
+SCAN_INDEX_ENABLED = True
+
+# Honour the project's own .gitignore files (nested ones included), .git/info/exclude
+# and the global git excludes file, in addition to the patterns above.
+GITIGNORE_ENABLED = True
+
+# For git checkouts, take the file list from .git/index instead of walking the
+# directories (falls back to the walk for non-git roots or an unreadable index).
+# SCAN_GIT_UNTRACKED adds untracked files and drops deleted ones via 'git ls-files';
+# git itself then reads every directory, so this mainly pays off with git's
+# untracked cache / fsmonitor enabled. Without it (or without a git binary) only
+# tracked files are listed, with no directory reads at all.
+SCAN_USE_GIT_INDEX = False
+SCAN_GIT_UNTRACKED = True
+
+# Lazy tree: list only the root when scanning and each directory when it is first
+# expanded, so the tree appears immediately regardless of the project's size.
+LAZY_TREE_LOADING = False
+
+# Live tree updates: watch the selected root (inotify on Linux, polling elsewhere).
+# Events are coalesced until nothing happened for WATCH_DEBOUNCE_MS (but at most
+# WATCH_MAX_DELAY_MS); batches touching more directories than
+# WATCH_MAX_INCREMENTAL_DIRS fall back to a full refresh.
+WATCH_ENABLED = True
+WATCH_FORCE_POLLING = False
+WATCH_DEBOUNCE_MS = 300
+WATCH_MAX_DELAY_MS = 2000
+WATCH_MAX_INCREMENTAL_DIRS = 200
+WATCH_POLL_INTERVAL_MS = 1000
+
+# Threads reading files during consolidation. Output order is unaffected; more
+# threads mostly help on network storage, where each open/stat is a round trip.
+CONSOLIDATE_WORKERS = 8
+
+# Emit files whose content is identical to an earlier file in the output as a short
+# reference to that file instead of repeating them (vendored copies, LICENSE files...).
+# Default for the "Deduplicate identical files" checkbox.
+CONSOLIDATE_DEDUPLICATE = False
+
+# "Fit to budget" consolidation: with a token budget (0 = off; default for the budget
+# box), files are included by priority until it is used up, the next one truncated
+# and the rest left out and listed at the end. CONSOLIDATE_PRIORITIES maps relative
+# paths or glob patterns ('src/*', '*.md') to numbers, higher first; unmatched files get 0.
+CONSOLIDATE_TOKEN_BUDGET = 0
+CONSOLIDATE_PRIORITIES = {}
+
+# Every consolidation records a snapshot of the files it included (signature and content
+# hash) under SNAPSHOT_DIR, one <sha1 of the root>.json manifest per root. "Changes only"
+# consolidations then emit just the files added, modified or removed since - or since a
+# git revision - optionally as unified diffs. Diffs against a snapshot need the old text:
+# with SNAPSHOT_STORE_CONTENT every root, and otherwise a root once a diff has been
+# requested for it, also keeps a zlib-compressed copy of each included file's text in the
+# <sha1 of the root>/ directory next to its manifest. Until then diffs show whole files.
+SNAPSHOT_ENABLED = True
+SNAPSHOT_STORE_CONTENT = False
+
+# Decoded file contents are cached between consolidations and reused while a file's
+# (size, mtime, inode) is unchanged. CONTENT_CACHE_MB bounds the in-memory LRU (0 turns
+# caching off); CONTENT_CACHE_DISK_MB > 0 also keeps entries under CONTENT_CACHE_DIR
+# across restarts, which mostly helps with slow (network) storage.
+CONTENT_CACHE_MB = 256
+CONTENT_CACHE_DISK_MB = 0
+
+# Files are classified before being included: binary files are always skipped, text
+# is decoded in its detected encoding (UTF-8, UTF-16/32 with or without BOM, else
+# cp1252/latin-1). Files averaging CLASSIFY_MINIFIED_LINE_LENGTH characters per line
+# count as minified if they are dense as well (little whitespace or much punctuation, so
+# soft-wrapped prose is kept); files with an '@generated'/'DO NOT EDIT' style marker count
+# as generated.
+CLASSIFY_MINIFIED_LINE_LENGTH = 500
+CLASSIFY_SKIP_MINIFIED = True
+CLASSIFY_SKIP_GENERATED = False
+
+# Token counts shown in the tree. "estimate" is a fast byte-statistics estimate
+# (calibrated against cl100k_base, a few percent off per file); "tiktoken:<encoding>"
+# counts exactly with tiktoken if it is installed, falling back to the estimate if not.
+# Counts are kept per file under TOKEN_INDEX_DIR and only redone for changed files.
+TOKEN_COUNTER = "estimate"
+
+# Output saved as .zst or .gz is compressed on OUTPUT_COMPRESSION_THREADS threads while it is
+# produced. "zstd" needs the zstandard package (or Python 3.14); without it gzip is used.
+# Levels favour speed, so compression keeps up with reading: zstd 3 is its default, and
+# gzip 3 compresses source text about 4:1 at twice the speed of gzip's default 6.
+OUTPUT_COMPRESSION = "zstd"
+OUTPUT_COMPRESSION_LEVELS = {"zstd": 3, "gzip": 3}
+OUTPUT_COMPRESSION_THREADS = 4 # At most one per CPU
+# If set (e.g. USER_CONFIG_DIR / "archive"), every consolidation made in the app is also
+# written there, compressed, as consolidation-<date>-<time>.txt.zst (or .gz).
+OUTPUT_ARCHIVE_DIR = None
+
+# Daemon (python -m cli serve): keeps the scans of the roots it is asked about in memory,
+# in sync through the watcher, along with the content cache and token indexes. It serves
+# HTTP on a Unix socket (DAEMON_SOCKET_PATH) and/or on 127.0.0.1:DAEMON_PORT; TCP clients
+# must send the token the daemon writes to DAEMON_STATE_FILE. Beyond DAEMON_MAX_ROOTS the
+# least recently used root is dropped.
+DAEMON_PORT = 7468
+DAEMON_MAX_ROOTS = 16
+
 MAX_FILE_SIZE_TO_READ_MB = 5
+# Files larger than that are included as a window of LARGE_FILE_WINDOW_KB read with seeks:
+# "head" (the start), "tail" (the end), "head_tail" (half of each) or "sample"
+# (LARGE_FILE_SAMPLES slices spread over the file), cut to whole lines, with markers for
+# the elided byte ranges and lines. "skip" keeps the old "[File too large]" placeholder.
+LARGE_FILE_MODE = "head_tail"
+LARGE_FILE_WINDOW_KB = 256
+LARGE_FILE_SAMPLES = 8
+# Files at least this large are memory-mapped and decoded in place when read.
+READ_MMAP_THRESHOLD_KB = 256
 DEFAULT_ENCODING = "utf-8"
 
-# Path for user-specific ignore patterns file
-USER_CONFIG_DIR = Path(appdirs.user_config_dir(APP_NAME, APP_AUTHOR))
-USER_IGNORE_FILE = USER_CONFIG_DIR / "user_ignores.txt"
+# User-specific files live under USER_CONFIG_DIR. It and the paths below are resolved on
+# first use (see __getattr__), so importing config neither imports appdirs nor touches the
+# disk; whatever writes there creates its directory. Assigning them overrides as usual.
+_USER_CONFIG_PATHS = {
+    "USER_IGNORE_FILE": "user_ignores.txt",
+    "SCAN_INDEX_DIR": "scan_index",
+    "CONTENT_CACHE_DIR": "content_cache",
+    "TOKEN_INDEX_DIR": "token_index",
+    "SNAPSHOT_DIR": "snapshots",
+    "DAEMON_SOCKET_PATH": "daemon.sock",
+    "DAEMON_STATE_FILE": "daemon.json",
+}
+
+
+def _user_config_dir() -> Path:
+    try:
+        import appdirs
+        return Path(appdirs.user_config_dir(APP_NAME, APP_AUTHOR))
+    except ImportError: # Headless installs may lack it; use the same locations appdirs would
+        if sys.platform.startswith("win"):
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+            return Path(base) / APP_AUTHOR / APP_NAME
+        if sys.platform == "darwin":
+            return Path.home() / "Library" / "Application Support" / APP_NAME
+        return Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config") / APP_NAME
+
+
+def __getattr__(name: str):
+    if name == "USER_CONFIG_DIR":
+        value = _user_config_dir()
+    elif name in _USER_CONFIG_PATHS:
+        value = _setting("USER_CONFIG_DIR") / _USER_CONFIG_PATHS[name]
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def _setting(name: str):
+    """A setting by name, resolving it if it is one of the lazy ones (module code bypasses __getattr__)."""
+    return globals()[name] if name in globals() else __getattr__(name)
+
 
-# Ensure the user config directory exists
-USER_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+def ensure_user_config_dir() -> Path:
+    """Creates USER_CONFIG_DIR if needed and returns it."""
+    user_config_dir = _setting("USER_CONFIG_DIR")
+    user_config_dir.mkdir(parents=True, exist_ok=True)
+    return user_config_dir
\ No newline at end of file
@@ -0,0 +1,317 @@
+# core/container_format.py
+# Indexed container for consolidations, next to the plain text format.
+#
+# Layout (all integers little endian):
+#     0   4 bytes  magic b"FCCX"
+#     4   u32      format version
+#     8   u64      length N of the index
+#     16  N bytes  index: UTF-8 JSON, see below
+#     16+N         data: the file contents, UTF-8, back to back
+#
+# The index holds the document around the files ("preamble", "epilogue") and one entry
+# per file: {"path", "offset", "length", "hash"}. offset is relative to the start of the
+# data, so a file is read with one seek to 16 + N + offset; hash is the hex blake2b
+# (16-byte digest) of its bytes. Optional keys keep the text format reproducible:
+# "status" for delta headers ("added", "modified"), "same_as" for a deduplicated file
+# (it shares the entry's bytes), "prefix" for text between the previous file and this
+# one, "separator": false if the blank line after the file was missing.
+import os
+import re
+import codecs
+import json
+import mmap
+import struct
+import shutil
+import hashlib
+import tempfile
+from .output_sinks import OutputSink
+
+MAGIC = b"FCCX"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQ")
+FILE_EXTENSION = ".fccx"
+
+_FILE_HEADER_RE = re.compile(r"^--- FILE(?: \(([a-z]+)\))?: (.*) ---\n", re.MULTILINE)
+
+
+class ContainerError(ValueError):
+    """Raised for a file that is not a valid container."""
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ContainerSink(OutputSink):
+    """
+    Writes a consolidation streamed as text (the iter_consolidation chunks, or a text
+    consolidation read back) as a container. File blocks are found with str.find as
+    the text arrives and their contents go straight to a temporary data file, so only
+    the index is held in memory; close() writes header and index and appends the data.
+    duplicates maps the paths of files the consolidation emitted as a reference to an
+    identical file (ReadStats.duplicates) to that file; they share its bytes. Without
+    it every block is stored as it reads, even one that looks like a reference.
+    """
+    def __init__(self, target, encoding: str = "utf-8", duplicates: dict = None):
+        self.encoding = encoding
+        self._duplicates = duplicates if duplicates is not None else {}
+        self._owns_file = isinstance(target, (str, os.PathLike))
+        self._target = target
+        spool_dir = os.path.dirname(os.path.abspath(target)) if self._owns_file else None
+        self._data = tempfile.TemporaryFile(prefix="fccx-", dir=spool_dir)
+        self._data_length = 0
+        self._buffer = ""
+        self._preamble = None
+        self._prefix = "" # Text outside file blocks since the last one
+        self._entries = []
+        self._offsets = {} # path -> entry index, for deduplicated files
+        self._current = None # Entry of the file block being read
+        self._footer = None
+        self._hasher = None
+        self._content_head = "" # Enough of the start to check a duplicate's reference text
+        self._closed = False
+        self.bytes_written = 0
+
+    def write(self, text: str):
+        self._buffer += text
+        self._consume(final=False)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._consume(final=True)
+            if self._current is not None: # Unterminated block: keep what arrived
+                self._finish_file(separator=False)
+            if self._preamble is None: # No file blocks at all
+                preamble, epilogue = self._prefix, ""
+            else:
+                preamble, epilogue = self._preamble, self._prefix
+            index = {"version": VERSION, "encoding": self.encoding, "preamble": preamble, "epilogue": epilogue,
+                     "files": self._entries}
+            index_data = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            self._data.seek(0)
+            if self._owns_file:
+                with open(self._target, "wb") as f:
+                    self._write_container(f, index_data)
+            else:
+                self._write_container(self._target, index_data)
+                self._target.flush()
+        finally:
+            self._data.close()
+
+    def _write_container(self, f, index_data: bytes):
+        f.write(_HEADER.pack(MAGIC, VERSION, len(index_data)))
+        f.write(index_data)
+        shutil.copyfileobj(self._data, f, 1024 * 1024)
+        self.bytes_written = _HEADER.size + len(index_data) + self._data_length
+
+    def _consume(self, final: bool):
+        buffer = self._buffer
+        position = 0
+        while True:
+            if self._current is None:
+                match = _FILE_HEADER_RE.search(buffer, position)
+                if match is None:
+                    # Keep the unfinished last line; it may turn out to be a file header
+                    keep_from = len(buffer) if final else buffer.rfind("\n", position) + 1
+                    self._add_outside_text(buffer[position:max(keep_from, position)])
+                    position = max(keep_from, position)
+                    break
+                self._add_outside_text(buffer[position:match.start()])
+                self._start_file(match.group(2), match.group(1))
+                position = match.end()
+            else:
+                end = buffer.find(self._footer, position)
+                if end < 0:
+                    # Everything but a possible start of the footer can be stored now
+                    safe_end = len(buffer) if final else max(position, len(buffer) - len(self._footer) + 1)
+                    self._write_content(buffer[position:safe_end])
+                    position = safe_end
+                    break
+                self._write_content(buffer[position:end])
+                position = end + len(self._footer)
+                if position < len(buffer) or final:
+                    separator = buffer.startswith("\n", position)
+                    position += separator
+                    self._finish_file(separator)
+                else: # Wait for the blank line that may follow; the footer is found again then
+                    position -= len(self._footer)
+                    break
+        self._buffer = buffer[position:]
+
+    def _add_outside_text(self, text: str):
+        self._prefix += text
+
+    def _start_file(self, path: str, status: str):
+        if self._preamble is None:
+            self._preamble, self._prefix = self._prefix, ""
+        entry = {"path": path, "offset": self._data_length, "length": 0}
+        if status:
+            entry["status"] = status
+        if self._prefix:
+            entry["prefix"], self._prefix = self._prefix, ""
+        self._current = entry
+        self._footer = f"\n--- END OF FILE: {path} ---\n"
+        self._hasher = hashlib.blake2b(digest_size=16)
+        self._content_head = ""
+
+    def _write_content(self, text: str):
+        if not text:
+            return
+        if len(self._content_head) < 4096:
+            self._content_head += text[:4096]
+        data = text.encode(self.encoding, 'surrogatepass')
+        self._data.write(data)
+        self._hasher.update(data)
+        self._current["length"] += len(data)
+        self._data_length += len(data)
+
+    def _finish_file(self, separator: bool):
+        entry = self._current
+        entry["hash"] = self._hasher.hexdigest()
+        same_as = self._duplicates.get(entry["path"])
+        original = None
+        if same_as is not None and entry["length"] < 4096 and self._content_head == f"[Identical to {same_as}]":
+            original = self._offsets.get(same_as)
+        if original is not None: # Deduplicated: point at the original's bytes instead
+            self._data.seek(entry["offset"])
+            self._data.truncate()
+            self._data_length = entry["offset"]
+            for key in ("offset", "length", "hash"):
+                entry[key] = self._entries[original][key]
+            entry["same_as"] = same_as
+        elif entry["path"] not in self._offsets:
+            self._offsets[entry["path"]] = len(self._entries)
+        if not separator:
+            entry["separator"] = False
+        self._entries.append(entry)
+        self._current = self._footer = self._hasher = None
+
+
+class ContainerReader:
+    """
+    Random access to a container: read(path) seeks straight to one file, verify()
+    checks the hashes, iter_text() gives back the text format. memory_map() maps the
+    whole container; file_span(path) is the (offset, length) of a file within it.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ContainerError(f"{path} is too short to be a container")
+            magic, version, index_length = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ContainerError(f"{path} is not a container (bad magic)")
+            if version != VERSION:
+                raise ContainerError(f"{path} has unsupported container version {version}")
+            try:
+                self.index = json.loads(self._file.read(index_length).decode('utf-8'))
+            except ValueError as e:
+                raise ContainerError(f"{path} has a damaged index: {e}") from e
+        except Exception:
+            self._file.close()
+            raise
+        self.data_offset = _HEADER.size + index_length
+        self.encoding = self.index.get("encoding", "utf-8")
+        self.entries = self.index["files"]
+        self._by_path = {}
+        for entry in self.entries:
+            self._by_path.setdefault(entry["path"], entry)
+
+    @property
+    def paths(self) -> list:
+        return [entry["path"] for entry in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._by_path
+
+    def file_span(self, path: str) -> tuple:
+        """(offset in the container, length) of a file's bytes; KeyError if it is not in it."""
+        entry = self._by_path[path]
+        return self.data_offset + entry["offset"], entry["length"]
+
+    def read_bytes(self, path: str, verify: bool = False) -> bytes:
+        offset, length = self.file_span(path)
+        self._file.seek(offset)
+        data = self._file.read(length)
+        if verify and _content_hash(data) != self._by_path[path]["hash"]:
+            raise ContainerError(f"Content of {path} does not match its hash")
+        return data
+
+    def read(self, path: str, verify: bool = False) -> str:
+        return self.read_bytes(path, verify).decode(self.encoding, 'surrogatepass')
+
+    def verify(self) -> list:
+        """Paths whose content does not match its hash (empty if the container is intact)."""
+        return [entry["path"] for entry in self.entries
+                if _content_hash(self.read_bytes(entry["path"])) != entry["hash"]]
+
+    def memory_map(self) -> mmap.mmap:
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_text(self, chunk_bytes: int = 1024 * 1024):
+        """The consolidation in the text format, exactly as it was written, in chunks."""
+        yield self.index.get("preamble", "")
+        for entry in self.entries:
+            yield entry.get("prefix", "")
+            status = entry.get("status")
+            yield f"--- FILE ({status}): {entry['path']} ---\n" if status else f"--- FILE: {entry['path']} ---\n"
+            if "same_as" in entry:
+                yield f"[Identical to {entry['same_as']}]"
+            else:
+                self._file.seek(self.data_offset + entry["offset"])
+                remaining = entry["length"]
+                decoder = codecs.getincrementaldecoder(self.encoding)('surrogatepass')
+                while remaining > 0:
+                    data = self._file.read(min(chunk_bytes, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield decoder.decode(data, final=remaining <= 0)
+            yield f"\n--- END OF FILE: {entry['path']} ---\n" + ("\n" if entry.get("separator", True) else "")
+        yield self.index.get("epilogue", "")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_container(path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def text_to_container(text_path, container_path, encoding: str = "utf-8", chunk_chars: int = 1024 * 1024) -> int:
+    """Converts a text consolidation to a container; returns the container's size in bytes."""
+    with open(text_path, "r", encoding=encoding, newline="") as f, ContainerSink(container_path, encoding) as sink:
+        while True:
+            text = f.read(chunk_chars)
+            if not text:
+                break
+            sink.write(text)
+    return sink.bytes_written
+
+
+def container_to_text(container_path, text_path) -> int:
+    """Converts a container back to the text format; returns the number of characters written."""
+    written = 0
+    with ContainerReader(container_path) as reader, open(text_path, "w", encoding=reader.encoding, newline="") as f:
+        for text in reader.iter_text():
+            f.write(text)
+            written += len(text)
+    return written
@@ -0,0 +1,197 @@
+# core/content_cache.py
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# An entry is only stored if the file's mtime is older than the moment it was read by
+# at least this much; a write within the same timestamp tick would otherwise leave the
+# signature unchanged (same reasoning as the scan index).
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def file_signature(st) -> tuple:
+    """(size, mtime_ns, inode) of an os.stat result; any edit or replacement changes it."""
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def signature_is_settled(signature: tuple, read_at_ns: int) -> bool:
+    """False if the file was modified too recently (before read_at_ns) to trust its signature."""
+    return signature[1] + _RACY_WINDOW_NS < read_at_ns
+
+
+class ContentCache:
+    """
+    Decoded file contents keyed by path and validated by file_signature(), so an
+    unchanged file is not read or decoded again. Callers may also pass settings, a
+    tuple of JSON-serialisable values that decided what was stored (encoding, skip
+    options); an entry stored under other settings is a miss.
+
+    The memory tier is an LRU bounded by max_bytes (the size of the cached str objects).
+    With disk_dir set, entries are also written there, one file per path, and survive
+    restarts; the directory is kept under disk_max_bytes by deleting the oldest files.
+    All methods are thread-safe; reads for consolidation run on a thread pool.
+    """
+    DISK_FORMAT = 2
+
+    def __init__(self, max_bytes: int, disk_dir: Path = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict() # path -> ((signature, settings), content, cost)
+        self._bytes = 0
+        self._disk_bytes = None # Counted on the first disk write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.disk_dir is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, path_str: str, signature: tuple, settings: tuple = ()):
+        """Returns the cached content for path_str if it was stored with this signature and settings, else None."""
+        with self._lock:
+            entry = self._entries.get(path_str)
+            if entry is not None:
+                if entry[0] == (signature, settings):
+                    self._entries.move_to_end(path_str)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(path_str)
+        content = self._disk_get(path_str, signature, settings) if self.disk_dir is not None else None
+        with self._lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(path_str, signature, settings, content)
+        return content
+
+    def put(self, path_str: str, signature: tuple, content: str, read_at_ns: int = None, settings: tuple = ()):
+        """Stores content read from a file with the given signature (taken before the read)."""
+        if read_at_ns is None:
+            read_at_ns = time.time_ns()
+        if not signature_is_settled(signature, read_at_ns):
+            return
+        self._memory_put(path_str, signature, settings, content)
+        if self.disk_dir is not None:
+            self._disk_put(path_str, signature, settings, content)
+
+    def invalidate(self, path_str: str):
+        with self._lock:
+            self._remove(path_str)
+        if self.disk_dir is not None:
+            try:
+                os.remove(self._disk_path(path_str))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset_counters(self):
+        self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> str:
+        return (f"{self.hits} hits, {self.disk_hits} disk hits, {self.misses} misses; "
+                f"{len(self._entries)} entries, {self._bytes / (1024 * 1024):.1f} MB")
+
+    # --- Memory tier ---
+    def _memory_put(self, path_str: str, signature: tuple, settings: tuple, content: str):
+        cost = sys.getsizeof(content)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(path_str)
+            self._entries[path_str] = ((signature, settings), content, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_cost) = self._entries.popitem(last=False)
+                self._bytes -= evicted_cost
+
+    def _remove(self, path_str: str):
+        entry = self._entries.pop(path_str, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    # --- Disk tier ---
+    def _disk_path(self, path_str: str) -> Path:
+        digest = hashlib.sha1(path_str.encode('utf-8', 'surrogatepass')).hexdigest()
+        return self.disk_dir / f"{digest}.txt"
+
+    def _disk_get(self, path_str: str, signature: tuple, settings: tuple):
+        """Each file is a JSON header line ([format, path, size, mtime_ns, inode, settings]) followed by the UTF-8 text."""
+        try:
+            with self._disk_path(path_str).open('rb') as f:
+                header = json.loads(f.readline())
+                if header != [self.DISK_FORMAT, path_str, *signature, list(settings)]:
+                    return None
+                return f.read().decode('utf-8', 'surrogatepass')
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, path_str: str, signature: tuple, settings: tuple, content: str):
+        data = content.encode('utf-8', 'surrogatepass')
+        header = json.dumps([self.DISK_FORMAT, path_str, *signature, list(settings)]).encode('utf-8') + b"\n"
+        disk_path = self._disk_path(path_str)
+        tmp_path = disk_path.with_name(f"{disk_path.name}.{threading.get_ident()}.tmp")
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('wb') as f:
+                f.write(header)
+                f.write(data)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            print(f"Could not write content cache entry {disk_path}: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            else:
+                self._disk_bytes += len(header) + len(data)
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._disk_prune()
+
+    def _disk_usage(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.disk_dir) if entry.is_file())
+        except OSError:
+            return 0
+
+    def _disk_prune(self):
+        """Deletes the oldest entries until the directory is at 80% of its budget."""
+        try:
+            files = sorted(
+                ((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                 for entry in os.scandir(self.disk_dir) if entry.is_file()),
+            )
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.8
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,525 @@
+# core/daemon.py
+# Long-lived consolidation service (python -m cli serve). Roots are scanned on first use
+# and kept in memory, in sync through a filesystem watcher; file contents stay in the
+# content cache and token counts in the token indexes, so a request on a warm root costs
+# the stat of each file and the writing of the output.
+#
+# The API is HTTP with JSON request bodies, served on a Unix socket and/or 127.0.0.1:
+#     GET  /status       roots kept warm, cache statistics
+#     POST /scan         {"root", "include"?, "exclude"?, "no_default_ignores"?, "tree"?}
+#                        -> {"root", "files": [relative paths], "directories", "tree"?}
+#     POST /tokens       {"root", "include"?, "exclude"?, "no_default_ignores"?, "per_file"?}
+#                        -> {"root", "counter", "exact", "files", "tokens", "file_tokens"?}
+#     POST /consolidate  {"root", ...}: the consolidate command's options by their long
+#                        names ("budget", "changes", "since", "diffs", "deduplicate",
+#                        "no_tree", "no_snapshot", "format": "text" | "container", ...);
+#                        the document is streamed as the response body
+#     POST /shutdown
+# "root" must be an absolute path. Errors are {"error": message} with status 400 (bad
+# request) or 500. For example:
+#     curl --unix-socket ~/.config/LLMContextBuilder/daemon.sock -d '{"root": "/src/app"}' http://localhost/consolidate
+# Over TCP every request needs "Authorization: Bearer <token>", the token being in
+# config.DAEMON_STATE_FILE (readable by the user only); the Unix socket is created with
+# the same permissions and needs none.
+import os
+import json
+import time
+import socket
+import secrets
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import config
+from .budget_packer import PriorityRules
+from .file_processor import FileProcessor, ReadStats, DeltaSummary
+from .fs_watcher import create_watcher
+from .ignore_matcher import load_project_ignores
+from .output_sinks import FileSink, write_chunks
+
+# Options of each request with their defaults; "root" is required
+_SELECTION_OPTIONS = {"root": None, "include": None, "exclude": None, "no_default_ignores": False}
+SCAN_OPTIONS = {**_SELECTION_OPTIONS, "tree": False}
+TOKEN_OPTIONS = {**_SELECTION_OPTIONS, "per_file": False}
+CONSOLIDATE_OPTIONS = {**_SELECTION_OPTIONS, "format": "text", "budget": 0, "changes": False, "since": None,
+                       "diffs": False, "deduplicate": None, "no_tree": False, "no_snapshot": False, "workers": None}
+
+
+def _parse_options(payload: dict, allowed: dict) -> dict:
+    unknown = sorted(key for key in payload if key.replace("-", "_") not in allowed)
+    if unknown:
+        raise ValueError(f"Unknown option(s): {', '.join(unknown)}")
+    options = dict(allowed)
+    options.update((key.replace("-", "_"), value) for key, value in payload.items())
+    root = options["root"]
+    if not isinstance(root, str) or not os.path.isabs(root):
+        raise ValueError("'root' must be an absolute path")
+    for key in ("include", "exclude"): # A single pattern may be given as a string
+        if isinstance(options[key], str):
+            options[key] = [options[key]]
+        elif options[key] is not None and not all(isinstance(pattern, str) for pattern in options[key]):
+            raise ValueError(f"'{key}' must be a pattern or a list of patterns")
+    return options
+
+
+class WarmRoot:
+    """
+    A scanned root, for one set of ignore settings: its tree, kept current by a watcher
+    (or rescanned on every use if watching is off or failed). Used under the lock of its
+    root path, which also serializes the writes to that root's snapshot and indexes.
+    """
+    def __init__(self, root_path_str: str, file_processor: FileProcessor, lock: threading.Lock):
+        self.root_path_str = root_path_str
+        self.file_processor = file_processor
+        self.lock = lock
+        self.ignore_patterns = None
+        self.tree_items = None
+        self.watcher = None
+        self.closed = False
+        self.scans = 0
+        self.updates = 0 # Directories re-listed from watcher events
+        self.requests = 0
+        self.last_used = time.time()
+        self._file_paths = None
+
+    def refresh(self, ignore_patterns: list):
+        """Brings the tree up to date before a request: applies what the watcher saw, or rescans."""
+        self.requests += 1
+        self.last_used = time.time()
+        if self.tree_items is None or self.watcher is None or ignore_patterns != self.ignore_patterns:
+            self._rescan(ignore_patterns)
+            return
+        changes = self.watcher.take_changes(settled=False)
+        if changes is None:
+            return
+        changed_dirs, needs_full_rescan = changes
+        if needs_full_rescan:
+            self._rescan(ignore_patterns)
+            return
+        # Parents first: a directory removed along with its parent is then simply skipped
+        for dir_path in sorted(changed_dirs, key=lambda p: p.count(os.sep)):
+            try:
+                result = self.file_processor.update_directory(self.tree_items, self.root_path_str, dir_path,
+                                                              additional_ignore_patterns=ignore_patterns)
+            except Exception as e:
+                print(f"Could not update {dir_path}, rescanning {self.root_path_str}: {e}")
+                self._rescan(ignore_patterns)
+                return
+            self.updates += 1
+            if result is None:
+                continue
+            _, added, removed = result
+            for item_data in removed:
+                for removed_dir in self.file_processor.iter_directory_paths([item_data]):
+                    self.watcher.remove_directory(removed_dir)
+            for item_data in added:
+                self.watcher.watch_directories(self.file_processor.iter_directory_paths([item_data]))
+            if added or removed:
+                self._file_paths = None
+
+    def _rescan(self, ignore_patterns: list):
+        self.stop_watching()
+        self.tree_items = self.file_processor.generate_file_tree(self.root_path_str, ignore_patterns)
+        self.ignore_patterns = list(ignore_patterns)
+        self._file_paths = None
+        self.scans += 1
+        if not config.WATCH_ENABLED or self.closed:
+            return
+        try:
+            self.watcher = create_watcher()
+            self.watcher.add_directory(self.root_path_str)
+            self.watcher.watch_git_excludes(self.root_path_str)
+            self.watcher.watch_directories(self.file_processor.iter_directory_paths(self.tree_items))
+            self.watcher.start()
+        except Exception as e: # Without a watcher the root is rescanned on every request
+            print(f"Could not watch {self.root_path_str}: {e}")
+            self.stop_watching()
+
+    @property
+    def file_paths(self) -> list:
+        if self._file_paths is None:
+            self._file_paths = list(self.file_processor.iter_file_paths(self.tree_items))
+        return self._file_paths
+
+    @property
+    def file_count(self):
+        """Files in the tree as of the last request, if it has been listed."""
+        return len(self._file_paths) if self._file_paths is not None else None
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+
+class _Stream:
+    """A streamed response; close() ends it and releases the root it is read from."""
+    def __init__(self, content_type: str, chunks, headers: dict, on_close, duplicates: dict = None):
+        self.content_type = content_type
+        self.chunks = chunks
+        self.headers = headers
+        self.duplicates = duplicates # ReadStats.duplicates, for a container
+        self._on_close = on_close
+
+    def close(self):
+        if self._on_close is not None:
+            self.chunks.close()
+            self._on_close()
+            self._on_close = None
+
+
+class ConsolidationDaemon:
+    """
+    Serves scans, token counts and consolidations of any number of roots from one
+    FileProcessor (a second one, sharing its content cache, per-root indexes and
+    snapshots, handles requests with no_default_ignores). Requests on different roots
+    run in parallel, those on the same root one after the other. serve() runs until
+    shutdown() or an interrupt.
+    """
+    def __init__(self, max_roots: int = None):
+        self.max_roots = config.DAEMON_MAX_ROOTS if max_roots is None else max_roots
+        self.file_processor = FileProcessor()
+        self._processors = {False: self.file_processor}
+        self._roots = OrderedDict() # (root, no_default_ignores, exclude patterns) -> WarmRoot, least recent first
+        self._root_locks = {} # resolved root path -> lock shared by its WarmRoots
+        self._lock = threading.Lock()
+        self._servers = []
+        self._stopped = threading.Event()
+        self.started_at = time.time()
+        self.routes = {
+            ("GET", "/status"): self.status,
+            ("POST", "/scan"): self.scan,
+            ("POST", "/tokens"): self.count_tokens,
+            ("POST", "/consolidate"): self.consolidate,
+            ("POST", "/shutdown"): self.request_shutdown,
+        }
+
+    # --- Roots ---
+    def _processor(self, no_default_ignores: bool) -> FileProcessor:
+        processor = self._processors.get(no_default_ignores)
+        if processor is None:
+            processor = FileProcessor()
+            processor.ignore_patterns = []
+            processor.content_cache = self.file_processor.content_cache
+            processor.file_classifier = self.file_processor.file_classifier
+            processor.share_root_stores(self.file_processor) # One snapshot per root: deltas see every consolidation
+            self._processors[no_default_ignores] = processor
+        return processor
+
+    def _use_root(self, options: dict) -> tuple:
+        """
+        Locks and refreshes the root of a request; returns (WarmRoot, the selected file
+        paths). The caller must release warm_root.lock.
+        """
+        root_path_str = os.path.realpath(options["root"])
+        if not os.path.isdir(root_path_str):
+            raise ValueError(f"Provided path '{options['root']}' is not a valid directory.")
+        no_default_ignores = bool(options["no_default_ignores"])
+        exclude = tuple(options["exclude"] or ())
+        key = (root_path_str, no_default_ignores, exclude)
+        evicted = []
+        with self._lock:
+            warm_root = self._roots.get(key)
+            if warm_root is None:
+                lock = self._root_locks.setdefault(root_path_str, threading.Lock())
+                warm_root = self._roots[key] = WarmRoot(root_path_str, self._processor(no_default_ignores), lock)
+                while len(self._roots) > max(1, self.max_roots):
+                    evicted.append(self._roots.popitem(last=False)[1])
+            else:
+                self._roots.move_to_end(key)
+        for old_root in evicted:
+            with old_root.lock:
+                old_root.closed = True
+                old_root.stop_watching()
+        warm_root.lock.acquire()
+        try:
+            ignore_patterns = load_project_ignores(root_path_str)
+            ignore_patterns += [pattern for pattern in exclude if pattern not in ignore_patterns]
+            warm_root.refresh(ignore_patterns)
+            file_paths = warm_root.file_paths
+            if options["include"]:
+                included = PriorityRules({pattern: 1 for pattern in options["include"]}) # Matched like priorities
+                prefix_length = len(root_path_str.rstrip(os.sep)) + 1
+                file_paths = [path for path in file_paths if included(path[prefix_length:]) > 0]
+        except BaseException:
+            warm_root.lock.release()
+            raise
+        return warm_root, file_paths
+
+    # --- Requests ---
+    def status(self, payload: dict) -> dict:
+        with self._lock:
+            roots = list(self._roots.items())
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "roots": [{"root": key[0], "no_default_ignores": key[1], "exclude": list(key[2]),
+                       "files": warm_root.file_count,
+                       "watching": warm_root.watcher is not None, "scans": warm_root.scans,
+                       "updates": warm_root.updates, "requests": warm_root.requests,
+                       "last_used": warm_root.last_used} for key, warm_root in roots],
+            "content_cache": self.file_processor.content_cache.stats(),
+        }
+
+    def scan(self, payload: dict) -> dict:
+        options = _parse_options(payload, SCAN_OPTIONS)
+        warm_root, file_paths = self._use_root(options)
+        try:
+            prefix_length = len(warm_root.root_path_str.rstrip(os.sep)) + 1
+            result = {"root": warm_root.root_path_str, "files": [path[prefix_length:] for path in file_paths],
+                      "directories": sum(1 for _ in warm_root.file_processor.iter_directory_paths(warm_root.tree_items))}
+            if options["tree"]:
+                result["tree"] = warm_root.file_processor.format_tree_structure(
+                    warm_root.tree_items, os.path.basename(warm_root.root_path_str))
+        finally:
+            warm_root.lock.release()
+        return result
+
+    def count_tokens(self, payload: dict) -> dict:
+        options = _parse_options(payload, TOKEN_OPTIONS)
+        warm_root, file_paths = self._use_root(options)
+        try:
+            file_processor = warm_root.file_processor
+            prefix_length = len(warm_root.root_path_str.rstrip(os.sep)) + 1
+            file_tokens = {}
+            for counts in file_processor.iter_token_counts(warm_root.root_path_str,
+                                                            [(path[prefix_length:], path) for path in file_paths]):
+                file_tokens.update(counts)
+        finally:
+            warm_root.lock.release()
+        result = {"root": warm_root.root_path_str, "counter": file_processor.token_counter.name,
+                  "exact": file_processor.token_counter.exact, "files": len(file_tokens),
+                  "tokens": sum(file_tokens.values())}
+        if options["per_file"]:
+            result["file_tokens"] = file_tokens
+        return result
+
+    def consolidate(self, payload: dict) -> _Stream:
+        options = _parse_options(payload, CONSOLIDATE_OPTIONS)
+        if options["format"] not in ("text", "container"):
+            raise ValueError(f"Unknown format '{options['format']}' (expected text or container)")
+        started = time.perf_counter()
+        warm_root, file_paths = self._use_root(options)
+        stats = ReadStats()
+        notes = []
+        try:
+            chunks = self._consolidation_chunks(warm_root, options, file_paths, stats, notes)
+        except BaseException:
+            warm_root.lock.release()
+            raise
+
+        def on_close():
+            warm_root.lock.release()
+            print(f"Consolidated {len(file_paths):,} file(s) from {warm_root.root_path_str} in "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms: {stats}{''.join('; ' + note for note in notes)}")
+
+        content_type = "application/octet-stream" if options["format"] == "container" else "text/plain; charset=utf-8"
+        return _Stream(content_type, chunks, {"X-File-Count": str(len(file_paths))}, on_close, stats.duplicates)
+
+    @staticmethod
+    def _consolidation_chunks(warm_root: WarmRoot, options: dict, file_paths: list, stats: ReadStats, notes: list):
+        """As the consolidate command builds its output (see cli.consolidation_chunks)."""
+        file_processor = warm_root.file_processor
+        root_path_str = warm_root.root_path_str
+        tree_items = None if options["no_tree"] else warm_root.tree_items
+        record_snapshot = False if options["no_snapshot"] else None
+        if options["changes"] or options["since"]:
+            summary = DeltaSummary()
+            yield from file_processor.iter_delta(file_paths, root_path_str, since_ref=options["since"],
+                                                 diffs=options["diffs"], workers=options["workers"], stats=stats,
+                                                 summary=summary, record_snapshot=record_snapshot)
+            notes.append(f"Changes: {summary}")
+            return
+        budget_plan = None
+        if options["budget"] > 0:
+            budget_plan = file_processor.plan_budget(file_paths, root_path_str, options["budget"], tree_items=tree_items)
+            notes.append(f"Budget: {budget_plan.summary()}")
+        yield from file_processor.iter_consolidation(
+            file_paths, root_path_str, tree_items, workers=options["workers"], stats=stats,
+            deduplicate=options["deduplicate"], budget_plan=budget_plan, record_snapshot=record_snapshot)
+
+    def request_shutdown(self, payload: dict) -> dict:
+        self._stopped.set()
+        return {"stopping": True}
+
+    # --- Serving ---
+    def serve(self, socket_path=None, port: int = None):
+        """
+        Listens on the Unix socket socket_path and/or on 127.0.0.1:port (0 picks a free
+        port) until shutdown(), POST /shutdown or an interrupt. Writes the TCP port and
+        token to config.DAEMON_STATE_FILE and removes it again on exit.
+        """
+        if socket_path is None and port is None:
+            raise ValueError("Nothing to listen on: give a socket path or a port")
+        state_file = config.DAEMON_STATE_FILE
+        try:
+            if socket_path is not None:
+                server = _UnixServer(str(socket_path), self)
+                self._servers.append(server)
+                print(f"Listening on {socket_path}")
+            if port is not None:
+                server = _TcpServer(("127.0.0.1", port), self, secrets.token_urlsafe(32))
+                self._servers.append(server)
+                port = server.server_address[1]
+                print(f"Listening on http://127.0.0.1:{port}/ (token in {state_file})")
+            config.ensure_user_config_dir()
+            _write_private(state_file, json.dumps({
+                "pid": os.getpid(), "socket": str(socket_path) if socket_path is not None else None,
+                "port": port, "token": self._servers[-1].token if port is not None else None}))
+            for server in self._servers:
+                threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True).start()
+            while not self._stopped.wait(1):
+                pass
+        finally:
+            self.shutdown()
+            try:
+                os.remove(state_file)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._stopped.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, _UnixServer):
+                try:
+                    os.remove(server.server_address)
+                except OSError:
+                    pass
+        self._servers = []
+        with self._lock:
+            roots = list(self._roots.values())
+            self._roots.clear()
+        for warm_root in roots:
+            with warm_root.lock:
+                warm_root.closed = True
+                warm_root.stop_watching()
+
+
+def _write_private(path, text: str):
+    """Writes a file only its owner can read."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = f"{config.APP_NAME}-daemon"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        started = time.perf_counter()
+        daemon = self.server.consolidation_daemon
+        token = self.server.token
+        if token is not None and not secrets.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            self._send_json(401, {"error": "Missing or wrong token"})
+            return
+        route = daemon.routes.get((method, self.path.split("?", 1)[0]))
+        if route is None:
+            self._send_json(404, {"error": f"No such endpoint: {method} {self.path}"})
+            return
+        try:
+            payload = {}
+            if method == "POST":
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("The request body must be a JSON object")
+            result = route(payload)
+        except (ValueError, RuntimeError) as e: # Bad request, e.g. a root that is not a directory
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"{method} {self.path} failed: {type(e).__name__}: {e}")
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        if isinstance(result, _Stream):
+            self._send_stream(result)
+        else:
+            self._send_json(200, result)
+        print(f"{method} {self.path} {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def _send_json(self, status: int, result: dict):
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, stream: _Stream):
+        """Streams until the document ends; without a length, the closed connection ends it."""
+        from .container_format import ContainerSink
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", stream.content_type)
+            for name, value in stream.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            is_container = stream.content_type == "application/octet-stream"
+            sink = ContainerSink(self.wfile, duplicates=stream.duplicates) if is_container else FileSink(self.wfile)
+            with sink:
+                write_chunks(stream.chunks, sink)
+        except (BrokenPipeError, ConnectionResetError): # The client went away
+            pass
+        except Exception as e: # Headers are out; all that is left is to cut the document short
+            print(f"{self.command} {self.path} failed while streaming: {type(e).__name__}: {e}")
+        finally:
+            stream.close()
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def log_request(self, code="-", size="-"):
+        pass # _dispatch logs the requests it served
+
+
+class _TcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, consolidation_daemon: ConsolidationDaemon, token: str):
+        self.consolidation_daemon = consolidation_daemon
+        self.token = token
+        super().__init__(address, _RequestHandler)
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        token = None # Access is limited by the socket file's permissions
+
+        def __init__(self, socket_path: str, consolidation_daemon: ConsolidationDaemon):
+            self.consolidation_daemon = consolidation_daemon
+            if os.path.exists(socket_path):
+                _remove_stale_socket(socket_path)
+            os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+            old_umask = os.umask(0o177) # The socket is created 0600
+            try:
+                super().__init__(socket_path, _RequestHandler)
+            finally:
+                os.umask(old_umask)
+else: # No Unix sockets on this platform; serve on a port instead
+    _UnixServer = None
+
+
+def unix_sockets_available() -> bool:
+    return _UnixServer is not None
+
+
+def _remove_stale_socket(socket_path: str):
+    """Removes the socket of a daemon that is gone; RuntimeError if one still listens there."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.remove(socket_path)
+    else:
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    finally:
+        probe.close()
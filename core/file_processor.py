@@ -1,100 +1,634 @@
 # core/file_processor.py
+import io
 import os
+import sys
+import mmap
+import stat
+import time
+import difflib
+import threading
+from collections import deque
 from pathlib import Path
-import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 from . import config # Import config from the same package
+from .ignore_matcher import IgnoreMatcher
+from .scan_index import ScanIndex
+from .tree_node import TreeNode
+from .gitignore import GitIgnoreStack
+from .git_index import GitIndexError, list_work_tree_files
+from .content_cache import ContentCache, file_signature
+from .file_classifier import FileClassifier, SAMPLE_BYTES
+from .token_estimator import HeuristicTokenCounter, TokenIndex, create_token_counter
+from .budget_packer import BudgetPlan, PriorityRules, pack
+from .snapshot import ConsolidationSnapshot, SnapshotBaseline, GitBaseline, content_hash
+from .file_window import plan_windows, newline_bytes, read_windows, format_windows
+
+class ScanCancelled(Exception):
+    """Raised by iter_file_tree when its cancel_event is set."""
+
+
+class _ScanContext:
+    """State shared by every directory listing of one generate_file_tree call."""
+    __slots__ = ("root_path_str", "ignore_matcher", "scan_index", "gitignore", "entries_by_dir")
+
+    def __init__(self, root_path_str: str, ignore_matcher: IgnoreMatcher, scan_index: ScanIndex = None,
+                 gitignore: GitIgnoreStack = None):
+        self.root_path_str = root_path_str
+        self.ignore_matcher = ignore_matcher
+        self.scan_index = scan_index
+        self.gitignore = gitignore
+        # Git index backend: relative dir -> listing entries; directories missing here are read from disk
+        self.entries_by_dir = None
+
+
+class ReadStats:
+    """Throughput of the read stage of one consolidation."""
+    __slots__ = ("files", "bytes_read", "seconds", "cache_hits", "duplicate_files", "bytes_deduplicated",
+                 "duplicates")
+
+    def __init__(self):
+        self.files = 0
+        self.bytes_read = 0
+        self.seconds = 0.0
+        self.cache_hits = 0 # Files served from the content cache
+        self.duplicate_files = 0 # Files emitted as a reference to an identical earlier one
+        self.bytes_deduplicated = 0 # Output bytes those references saved
+        self.duplicates = {} # Display path of each such file -> the path it references (see ContainerSink)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_read / (1024 * 1024) / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.files} files ({self.cache_hits} cached), {self.bytes_read / (1024 * 1024):.1f} MB "
+                f"in {self.seconds:.2f}s ({self.files_per_second:,.0f} files/s, {self.mb_per_second:.1f} MB/s)")
+
+
+class DeltaSummary:
+    """What iter_delta found, for status messages."""
+    __slots__ = ("baseline", "added", "modified", "removed", "unchanged")
+
+    def __init__(self):
+        self.baseline = ""
+        self.added = self.modified = self.removed = self.unchanged = 0
+
+    def __str__(self):
+        return (f"{self.added} added, {self.modified} modified, {self.removed} removed since {self.baseline} "
+                f"({self.unchanged} unchanged)")
+
 
 class FileProcessor:
     def __init__(self):
         self.ignore_patterns = config.DEFAULT_IGNORE_PATTERNS
         self.max_file_size_bytes = config.MAX_FILE_SIZE_TO_READ_MB * 1024 * 1024
+        self._ignore_matchers = {} # patterns tuple -> IgnoreMatcher
+        self._ignore_matchers_lock = threading.Lock() # Scans of different roots may run at once
+        self._scan_indexes = {} # resolved root path -> ScanIndex
+        self._gitignore_rules = {} # ignore file path -> ((mtime_ns, size), GitIgnoreRules)
+        self.content_cache = ContentCache(
+            config.CONTENT_CACHE_MB * 1024 * 1024,
+            disk_dir=config.CONTENT_CACHE_DIR,
+            disk_max_bytes=config.CONTENT_CACHE_DISK_MB * 1024 * 1024,
+        )
+        self.file_classifier = FileClassifier(config.DEFAULT_ENCODING, config.CLASSIFY_MINIFIED_LINE_LENGTH)
+        self.token_counter = create_token_counter(config.TOKEN_COUNTER)
+        self._token_indexes = {} # resolved root path -> TokenIndex
+        self._snapshots = {} # resolved root path -> ConsolidationSnapshot
+
+    def compile_ignore_patterns(self, ignore_patterns: list) -> IgnoreMatcher:
+        """
+        Returns the compiled matcher for a pattern list. Matchers are reused for identical
+        lists, which also lets the scan index recognise listings built with the same patterns.
+        """
+        key = tuple(ignore_patterns)
+        with self._ignore_matchers_lock:
+            ignore_matcher = self._ignore_matchers.get(key)
+            if ignore_matcher is None:
+                if len(self._ignore_matchers) >= 8: # Patterns rarely change; keep only a few
+                    self._ignore_matchers.pop(next(iter(self._ignore_matchers)))
+                ignore_matcher = self._ignore_matchers[key] = IgnoreMatcher(ignore_patterns)
+        return ignore_matcher
+
+    def share_root_stores(self, other: "FileProcessor"):
+        """
+        Makes this processor use other's per-root scan indexes, token indexes and snapshots.
+        Two processors serving the same roots (with different default ignores, say) then
+        keep one record of each root, not two that overwrite each other's files.
+        """
+        self._scan_indexes = other._scan_indexes
+        self._token_indexes = other._token_indexes
+        self._snapshots = other._snapshots
+
+    def get_scan_index(self, root_path_str: str) -> ScanIndex:
+        """Returns the (lazily loaded) persistent scan index for a resolved root path."""
+        scan_index = self._scan_indexes.get(root_path_str)
+        if scan_index is None:
+            scan_index = self._scan_indexes[root_path_str] = ScanIndex(root_path_str)
+        return scan_index
 
     def _is_ignored(self, path_obj: Path, root_path_obj: Path, current_scan_ignore_patterns: list) -> bool: # Added current_scan_ignore_patterns
         """Checks if a path should be ignored based on combined ignore_patterns."""
-        # Check against item name
-        if any(fnmatch.fnmatch(path_obj.name, pattern) for pattern in current_scan_ignore_patterns):
-            return True
-        # Check against relative path
         try:
             relative_path_str = str(path_obj.relative_to(root_path_obj))
-            if any(fnmatch.fnmatch(relative_path_str, pattern) for pattern in current_scan_ignore_patterns):
-                return True
-            parts = relative_path_str.split(os.sep)
-            current_path_part = ""
-            for part in parts:
-                current_path_part = os.path.join(current_path_part, part)
-                if any(fnmatch.fnmatch(current_path_part + os.sep, p) for p in current_scan_ignore_patterns if p.endswith(('/', '\\'))):
-                    return True
-                if path_obj.is_dir() and any(fnmatch.fnmatch(current_path_part, p) for p in current_scan_ignore_patterns if not p.endswith(('/', '\\')) and Path(p).name == current_path_part):
-                    return True
         except ValueError:
-            pass
-        return False
+            relative_path_str = None
+        ignore_matcher = self.compile_ignore_patterns(current_scan_ignore_patterns)
+        return ignore_matcher.is_ignored(path_obj.name, relative_path_str, path_obj.is_dir())
 
-    def generate_file_tree(self, root_path_str: str, additional_ignore_patterns: list = None): # Modified signature
+    def generate_file_tree(self, root_path_str: str, additional_ignore_patterns: list = None, workers: int = None,
+                           use_index: bool = None, lazy: bool = False, use_git_index: bool = None): # Modified signature
         """
         Generates a tree-like structure of files and directories.
+        Returns the root's child TreeNodes; they can be read like the item dicts this
+        used to return (node["path"], node.get("children")).
         Combines default ignore patterns with additionally provided ones.
+        With workers > 1 (default: config.SCAN_WORKERS) subdirectories are listed
+        concurrently on a thread pool; the resulting tree is identical to the serial walk.
+        With use_index (default: config.SCAN_INDEX_ENABLED) directory listings are
+        taken from the root's persistent ScanIndex whenever the directory's mtime is
+        unchanged, so a rescan only reads directories that actually changed.
+        With lazy=True only the root is listed; its directories get "children": None
+        (not loaded yet) and are filled in later with expand_directory.
+        With config.GITIGNORE_ENABLED the project's .gitignore files are honoured as well;
+        directories they exclude are skipped without being listed.
+        With use_git_index (default: config.SCAN_USE_GIT_INDEX) a git checkout's file list
+        comes from its index instead of a directory walk (see _use_git_index); the same
+        ignore rules apply, but empty directories do not appear.
+        """
+        if workers is None:
+            workers = config.SCAN_WORKERS
+        scan = self._create_scan_context(root_path_str, additional_ignore_patterns, use_index)
+        if not lazy and self._use_git_index(scan, use_git_index):
+            workers = 1 # Nothing left to wait for on disk
+        if scan.scan_index is not None:
+            scan.scan_index.begin_scan()
+        # Errors listing the root itself propagate to the caller.
+        if lazy:
+            tree_data_items = self._list_unloaded(scan.root_path_str, "", scan, is_root=True)
+            if scan.scan_index is not None:
+                scan.scan_index.end_scan(prune=False) # Most directories were not visited
+            return tree_data_items
+        if workers > 1:
+            tree_data_items = self._scan_tree_parallel(scan, workers)
+        else:
+            tree_data_items = self._scan_directory(scan.root_path_str, "", scan)
+        if scan.scan_index is not None:
+            scan.scan_index.end_scan()
+        return tree_data_items
+
+    def iter_file_tree(self, root_path_str: str, additional_ignore_patterns: list = None, use_index: bool = None,
+                       lazy: bool = False, cancel_event: threading.Event = None, use_git_index: bool = None):
+        """
+        Streaming form of generate_file_tree for progressive display.
+        Yields (dir_path, children) for every directory as soon as it has been listed,
+        in depth-first pre-order, so a directory's item has always been yielded before
+        its own children. dir_path is None for the root. Each children list is the one
+        stored in the directory item's "children", so when the generator is exhausted
+        the root's list is the complete tree. Subdirectory items get "children" only
+        when they are listed (None in lazy mode, where only the root is listed).
+        Raises ScanCancelled if cancel_event gets set; it is checked between directories.
         """
+        scan = self._create_scan_context(root_path_str, additional_ignore_patterns, use_index)
+        if not lazy:
+            self._use_git_index(scan, use_git_index)
+        if scan.scan_index is not None:
+            scan.scan_index.begin_scan()
+        # Errors listing the root itself propagate to the caller.
+        listing = self._list_directory(scan.root_path_str, "", scan)
+        stack = []
+        root_items = self._take_listing(listing, stack, lazy)
+        yield None, root_items
+        while stack:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ScanCancelled()
+            item_info, relative_path_str = stack.pop()
+            listing = self._list_subdirectory(item_info["path"], relative_path_str, scan, item_info)
+            item_info["children"] = self._take_listing(listing, stack, lazy)
+            yield item_info["path"], item_info["children"]
+        if scan.scan_index is not None:
+            scan.scan_index.end_scan(prune=not lazy)
+
+    @staticmethod
+    def _take_listing(listing: list, stack: list, lazy: bool) -> list:
+        """Splits a listing into its item list and (in reverse, for pre-order) the subdirectories still to visit."""
+        subdirectories = []
+        for item_info, relative_path_str in listing:
+            if relative_path_str is not None:
+                if lazy:
+                    item_info["children"] = None
+                else:
+                    subdirectories.append((item_info, relative_path_str))
+        stack.extend(reversed(subdirectories))
+        return [item_info for item_info, _ in listing]
+
+    def _create_scan_context(self, root_path_str: str, additional_ignore_patterns: list = None, use_index: bool = None) -> _ScanContext:
         # Combine default and additional ignore patterns for this scan
         current_scan_ignore_patterns = list(self.ignore_patterns) # Start with a copy of defaults
         if additional_ignore_patterns:
             current_scan_ignore_patterns.extend(p for p in additional_ignore_patterns if p not in current_scan_ignore_patterns)
-        
+
         root_path = Path(root_path_str).resolve()
         if not root_path.is_dir():
             raise ValueError(f"Provided path '{root_path_str}' is not a valid directory.")
 
-        tree_data_items = []
-        for item in sorted(root_path.iterdir(), key=lambda p: (p.is_file(), p.name.lower())):
-            # Pass the combined ignore patterns to _is_ignored
-            if self._is_ignored(item, root_path, current_scan_ignore_patterns):
+        if use_index is None:
+            use_index = config.SCAN_INDEX_ENABLED
+        # Patterns are compiled once here and shared by every directory of the scan.
+        return _ScanContext(
+            str(root_path),
+            self.compile_ignore_patterns(current_scan_ignore_patterns),
+            self.get_scan_index(str(root_path)) if use_index else None,
+            GitIgnoreStack(str(root_path), self._gitignore_rules) if config.GITIGNORE_ENABLED else None
+        )
+
+    def _use_git_index(self, scan: _ScanContext, use_git_index: bool = None) -> bool:
+        """
+        Switches a scan to the git index backend if enabled and possible: directory
+        listings are then assembled from the index and git's untracked files instead of
+        being read, and the scan index is bypassed. Submodules and nested repositories
+        are still read from disk. Returns False (the scan stays a directory walk) for
+        non-git roots or if the index cannot be parsed.
+        """
+        if use_git_index is None:
+            use_git_index = config.SCAN_USE_GIT_INDEX
+        if not use_git_index:
+            return False
+        try:
+            work_tree_files = list_work_tree_files(scan.root_path_str, include_untracked=config.SCAN_GIT_UNTRACKED)
+        except GitIndexError as e:
+            print(f"Git index unusable for {scan.root_path_str}, walking the directory instead: {e}")
+            return False
+        if work_tree_files is None:
+            return False
+        files, external_dirs = work_tree_files
+
+        entries_by_dir = {"": []}
+        def dir_entries(relative_dir_str):
+            entries = entries_by_dir.get(relative_dir_str)
+            if entries is None:
+                entries = entries_by_dir[relative_dir_str] = []
+                parent_dir_str, _, name = relative_dir_str.rpartition(os.sep)
+                name = sys.intern(name)
+                dir_entries(parent_dir_str).append((False, name.lower(), name, True))
+            return entries
+
+        for relative_path_str in files:
+            if os.sep != "/":
+                relative_path_str = relative_path_str.replace("/", os.sep)
+            relative_dir_str, _, name = relative_path_str.rpartition(os.sep)
+            name = sys.intern(name)
+            dir_entries(relative_dir_str).append((True, name.lower(), name, False))
+        for relative_path_str in external_dirs:
+            # Listed as a directory but given no entries, so it is read from disk
+            relative_dir_str, _, name = relative_path_str.replace("/", os.sep).rpartition(os.sep)
+            name = sys.intern(name)
+            dir_entries(relative_dir_str).append((False, name.lower(), name, True))
+        for entries in entries_by_dir.values():
+            entries.sort() # Same order as _read_directory
+        scan.entries_by_dir = entries_by_dir
+        scan.scan_index = None
+        return True
+
+    def update_directory(self, tree_items: list, root_path_str: str, dir_path_str: str,
+                         additional_ignore_patterns: list = None, use_index: bool = None):
+        """
+        Re-lists a single directory of a tree returned by generate_file_tree and applies
+        the difference in place, without walking the rest of the tree.
+        Entries that still exist keep their existing nodes (and subtrees); new
+        subdirectories are scanned in full.
+        Returns (children, added, removed): the directory's updated child list and the
+        nodes inserted into / removed from it. Returns None if the directory is not
+        part of the tree (ignored, outside the root, or no longer present).
+        """
+        scan = self._create_scan_context(root_path_str, additional_ignore_patterns, use_index)
+        relative_dir_str = self._relative_dir(scan, dir_path_str)
+        if relative_dir_str is None:
+            return None
+        if relative_dir_str:
+            dir_info = self._find_item(tree_items, relative_dir_str.split(os.sep))
+            children = dir_info.get("children") if dir_info is not None else None
+            if children is None: # Unknown, or not loaded yet in a lazy tree
+                return None
+        else:
+            children = tree_items
+
+        try:
+            if relative_dir_str:
+                listing = self._list_subdirectory(dir_path_str, relative_dir_str, scan, dir_info)
+            else:
+                listing = self._list_directory(dir_path_str, relative_dir_str, scan)
+        except (FileNotFoundError, NotADirectoryError): # Removed meanwhile; its parent reports that
+            return None
+
+        existing_by_key = {(item_info["name"], item_info["type"]): item_info for item_info in children}
+        updated_children, added = [], []
+        for item_info, relative_path_str in listing:
+            existing = existing_by_key.pop((item_info["name"], item_info["type"]), None)
+            if existing is not None:
+                updated_children.append(existing)
                 continue
-            item_info = {
-                "name": item.name,
-                "path": str(item.resolve()),
-                "type": "file" if item.is_file() else "directory"
-            }
-            if item.is_dir():
-                # Pass combined patterns to subtree generation as well
-                item_info["children"] = self._generate_subtree(item, root_path, current_scan_ignore_patterns)
-            tree_data_items.append(item_info)
-        
-        return tree_data_items
+            if relative_path_str is not None:
+                item_info["children"] = self._generate_subtree(item_info["path"], relative_path_str, scan, item_info)
+            updated_children.append(item_info)
+            added.append(item_info)
+        removed = list(existing_by_key.values())
+        children[:] = updated_children # In place, so the parent item keeps pointing at it
+        return children, added, removed
+
+    def expand_directory(self, tree_items: list, root_path_str: str, dir_path_str: str,
+                         additional_ignore_patterns: list = None, use_index: bool = None):
+        """
+        Loads the children of a directory in a lazy tree (one level; subdirectories get
+        "children": None again) and stores them on its item. Returns the child list,
+        or None if the directory is not part of the tree.
+        """
+        scan = self._create_scan_context(root_path_str, additional_ignore_patterns, use_index)
+        relative_dir_str = self._relative_dir(scan, dir_path_str)
+        if not relative_dir_str:
+            return tree_items if relative_dir_str == "" else None
+        dir_info = self._find_item(tree_items, relative_dir_str.split(os.sep))
+        if dir_info is None:
+            return None
+        if dir_info.get("children") is None:
+            dir_info["children"] = self._list_unloaded(dir_info["path"], relative_dir_str, scan, parent=dir_info)
+        return dir_info["children"]
+
+    def scan_subtree(self, root_path_str: str, dir_path_str: str, additional_ignore_patterns: list = None,
+                     use_index: bool = None) -> list:
+        """
+        Fully scans one directory below root_path_str, applying the same ignore rules as
+        a scan of the whole root. Returns the directory's child list. Safe to run on a
+        worker thread; the caller's tree is not touched.
+        """
+        scan = self._create_scan_context(root_path_str, additional_ignore_patterns, use_index)
+        relative_dir_str = self._relative_dir(scan, dir_path_str)
+        if relative_dir_str is None:
+            raise ValueError(f"'{dir_path_str}' is not inside '{root_path_str}'.")
+        if not relative_dir_str:
+            return self._scan_directory(scan.root_path_str, "", scan)
+        return self._generate_subtree(os.path.join(scan.root_path_str, relative_dir_str), relative_dir_str, scan)
+
+    def _list_unloaded(self, dir_path_str: str, relative_dir_str: str, scan: _ScanContext, is_root: bool = False,
+                       parent: TreeNode = None) -> list:
+        """Lists one directory for a lazy tree: subdirectories are marked as not loaded."""
+        if is_root:
+            listing = self._list_directory(dir_path_str, relative_dir_str, scan)
+        else:
+            listing = self._list_subdirectory(dir_path_str, relative_dir_str, scan, parent)
+        for item_info, relative_path_str in listing:
+            if relative_path_str is not None:
+                item_info["children"] = None
+        return [item_info for item_info, _ in listing]
+
+    @staticmethod
+    def _relative_dir(scan: _ScanContext, dir_path_str: str):
+        """Path of dir_path_str relative to the scan root ("" for the root), or None if outside it."""
+        relative_dir_str = os.path.relpath(dir_path_str, scan.root_path_str)
+        if relative_dir_str == os.curdir:
+            return ""
+        if relative_dir_str == os.pardir or relative_dir_str.startswith(os.pardir + os.sep):
+            return None
+        return relative_dir_str
+
+    @staticmethod
+    def _find_item(tree_items: list, names: list):
+        """Follows directory names down from the root items; returns the last directory's item or None."""
+        children = tree_items
+        dir_info = None
+        for name in names:
+            if children is None: # Not loaded (lazy tree)
+                return None
+            for item_info in children:
+                if item_info["name"] == name and item_info["type"] == "directory":
+                    dir_info = item_info
+                    children = item_info.get("children")
+                    break
+            else:
+                return None
+        return dir_info
+
+    @staticmethod
+    def _iter_with_paths(tree_items: list):
+        """
+        Yields (item, path) for every loaded item of a scanned tree (depth first).
+        Paths are built from the parent's path on the way down instead of asking
+        each node to walk its parent chain.
+        """
+        if not tree_items:
+            return
+        parent = tree_items[0].parent
+        base_path = parent.path if isinstance(parent, TreeNode) else parent
+        prefix = base_path if base_path.endswith(os.sep) else base_path + os.sep
+        stack = [(item_info, prefix) for item_info in reversed(tree_items)]
+        while stack:
+            item_info, prefix = stack.pop()
+            if item_info["type"] == "directory_error":
+                yield item_info, prefix.rstrip(os.sep) or os.sep
+                continue
+            path = prefix + item_info["name"]
+            yield item_info, path
+            children = item_info.get("children")
+            if children:
+                child_prefix = path + os.sep
+                stack.extend((child_info, child_prefix) for child_info in reversed(children))
+
+    @classmethod
+    def iter_directory_paths(cls, tree_items: list):
+        """Yields the path of every loaded directory in a scanned tree (depth first)."""
+        for item_info, path in cls._iter_with_paths(tree_items):
+            if item_info["type"] == "directory" and item_info.get("children") is not None:
+                yield path
+
+    @classmethod
+    def iter_file_paths(cls, tree_items: list):
+        """Yields the path of every file in a scanned tree (depth first)."""
+        for item_info, path in cls._iter_with_paths(tree_items):
+            if item_info["type"] == "file":
+                yield path
 
+    @classmethod
+    def iter_file_items(cls, tree_items: list):
+        """Yields (item, path) for every file in a scanned tree (depth first)."""
+        for item_info, path in cls._iter_with_paths(tree_items):
+            if item_info["type"] == "file":
+                yield item_info, path
 
-    def _generate_subtree(self, dir_path: Path, overall_root_path: Path, current_scan_ignore_patterns: list): # Modified signature
-        """Helper for recursive subtree generation using current scan's ignore patterns."""
-        children_data = []
+    @classmethod
+    def copy_tree(cls, tree_items: list, subtrees: dict = None) -> list:
+        """
+        Returns a copy of a scanned tree made of new nodes; tree_items is not touched.
+        Directories not loaded yet (lazy trees) whose path is in subtrees get a copy of
+        subtrees[path], e.g. a scan_subtree result, as children.
+        """
+        subtrees = subtrees or {}
+
+        def copy_items(items, parent):
+            copies = []
+            for item_info in items:
+                node = TreeNode(item_info.name, item_info.type, item_info.parent if parent is None else parent)
+                if "children" in item_info:
+                    children = item_info.children
+                    if children is None and subtrees:
+                        children = subtrees.get(item_info.path)
+                    node.children = None if children is None else copy_items(children, node)
+                copies.append(node)
+            return copies
+
+        return copy_items(tree_items, None)
+
+    def _generate_subtree(self, dir_path_str: str, relative_dir_str: str, scan: _ScanContext, parent: TreeNode = None):
+        """Helper for recursive subtree generation using current scan's ignore matcher."""
         try:
-            for item in sorted(dir_path.iterdir(), key=lambda p: (p.is_file(), p.name.lower())):
-                if self._is_ignored(item, overall_root_path, current_scan_ignore_patterns): # Use passed patterns
+            return self._scan_directory(dir_path_str, relative_dir_str, scan, parent)
+        except PermissionError:
+            return [self._access_denied_item(dir_path_str, parent)]
+
+    def _access_denied_item(self, dir_path_str: str, parent: TreeNode = None) -> TreeNode:
+        # Placeholder child of the unreadable directory; its path is the directory's own
+        return TreeNode("[Access Denied]", "directory_error", parent if parent is not None else dir_path_str, [])
+
+    def _scan_directory(self, dir_path_str: str, relative_dir_str: str, scan: _ScanContext, parent: TreeNode = None):
+        """Lists one directory and recurses into its subdirectories (serial walk)."""
+        listing = self._list_directory(dir_path_str, relative_dir_str, scan, parent)
+        dir_prefix = dir_path_str if dir_path_str.endswith(os.sep) else dir_path_str + os.sep
+        for item_info, relative_path_str in listing:
+            if relative_path_str is not None:
+                item_info["children"] = self._generate_subtree(dir_prefix + item_info.name, relative_path_str, scan, item_info)
+        return [item_info for item_info, _ in listing]
+
+    def _read_directory(self, dir_path_str: str) -> list:
+        """
+        Reads a directory with os.scandir. Entry types come from the DirEntry cache
+        (no stat for regular entries on most filesystems).
+        Returns sorted (is_file, lowercase name, name, is_dir) tuples.
+        """
+        entries = []
+        with os.scandir(dir_path_str) as it:
+            for entry in it:
+                is_file = entry.is_file()
+                name = sys.intern(entry.name) # Shared with the tree nodes built from it
+                entries.append((is_file, name.lower(), name, entry.is_dir()))
+        entries.sort()
+        return entries
+
+    def _list_directory(self, dir_path_str: str, relative_dir_str: str, scan: _ScanContext, parent: TreeNode = None):
+        """
+        Lists a single directory without recursing. The nodes hang off 'parent' (the
+        directory's own node; None for a directory listed on its own, whose path then
+        becomes the parent), so no per-entry path strings are built.
+        Returns sorted (item_info, relative_path_str) pairs for the entries that are not
+        ignored; relative_path_str is None for entries that should not be descended into.
+        """
+        if parent is None:
+            parent = dir_path_str
+        scan_index = scan.scan_index
+        entries = scan.entries_by_dir.get(relative_dir_str) if scan.entries_by_dir is not None else None
+        if entries is not None:
+            reused = False
+        elif scan_index is not None:
+            entries, reused = scan_index.get_entries(dir_path_str, relative_dir_str, self._read_directory)
+        else:
+            entries, reused = self._read_directory(dir_path_str), False
+
+        ignore_matcher = scan.ignore_matcher
+        gitignore_chain = None
+        if scan.gitignore is not None:
+            has_gitignore = any(name == GitIgnoreStack.FILE_NAME for is_file, _, name, _ in entries if is_file)
+            gitignore_chain = scan.gitignore.chain_for(relative_dir_str, has_gitignore) or None
+        filter_key = ignore_matcher if gitignore_chain is None else (ignore_matcher, gitignore_chain.sources)
+
+        kept = scan_index.get_built_listing(relative_dir_str, filter_key, entries) if reused else None
+        if kept is None:
+            relative_prefix = relative_dir_str + os.sep if relative_dir_str else ""
+            kept = []
+            for is_file, _, name, is_dir in entries:
+                relative_path_str = relative_prefix + name
+                # Ancestors were already checked on the way down, so only this entry's own prefix matters.
+                if ignore_matcher.is_ignored(name, relative_path_str, is_dir, parents_checked=True):
+                    continue
+                if gitignore_chain is not None and gitignore_chain.is_ignored(
+                        relative_path_str if os.sep == "/" else relative_path_str.replace(os.sep, "/"), name, is_dir):
                     continue
-                item_info = {
-                    "name": item.name,
-                    "path": str(item.resolve()),
-                    "type": "file" if item.is_file() else "directory"
-                }
-                if item.is_dir():
-                    item_info["children"] = self._generate_subtree(item, overall_root_path, current_scan_ignore_patterns)
-                children_data.append(item_info)
+                kept.append((name, "file" if is_file else "directory", relative_path_str if is_dir else None))
+            kept = tuple(kept)
+            if scan_index is not None:
+                scan_index.store_built_listing(relative_dir_str, filter_key, entries, kept)
+        # Every scan gets new nodes: trees handed out before may still be in use on another thread
+        return [(TreeNode(name, node_type, parent), relative_path_str) for name, node_type, relative_path_str in kept]
+
+    def _list_subdirectory(self, dir_path_str: str, relative_dir_str: str, scan: _ScanContext, parent: TreeNode = None):
+        """_list_directory for a non-root directory: access errors become a placeholder entry."""
+        try:
+            return self._list_directory(dir_path_str, relative_dir_str, scan, parent)
         except PermissionError:
-            children_data.append({
-                "name": f"[Access Denied]",
-                "path": str(dir_path.resolve()),
-                "type": "directory_error",
-                "children": []
-            })
-        return children_data
+            return [(self._access_denied_item(dir_path_str, parent), None)]
+
+    def _scan_tree_parallel(self, scan: _ScanContext, workers: int):
+        """
+        Parallel variant of the serial walk. Every directory listing is a pool task that
+        queues its own subdirectories as soon as it has listed them, so the pool stays
+        busy at every depth. Each listing is attached to its own parent item, which keeps
+        the tree (and its order) identical to the serial walk.
+        """
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+        lock = threading.Lock()
+        done = threading.Event()
+        state = {"pending": 0, "error": None}
+        root_items = []
+
+        def schedule(item_info, relative_path_str):
+            with lock:
+                state["pending"] += 1
+            pool.submit(list_task, item_info, relative_path_str)
+
+        def list_task(item_info, relative_path_str):
+            try:
+                if item_info is None: # The root: errors propagate to the caller
+                    listing = self._list_directory(scan.root_path_str, "", scan)
+                    root_items.extend(child_info for child_info, _ in listing)
+                else:
+                    listing = self._list_subdirectory(item_info["path"], relative_path_str, scan, item_info)
+                    item_info["children"] = [child_info for child_info, _ in listing]
+                for child_info, child_relative_path_str in listing:
+                    if child_relative_path_str is not None:
+                        schedule(child_info, child_relative_path_str)
+            except BaseException as e:
+                with lock:
+                    if state["error"] is None:
+                        state["error"] = e
+                done.set()
+            finally:
+                with lock:
+                    state["pending"] -= 1
+                    if state["pending"] == 0:
+                        done.set()
+
+        try:
+            schedule(None, "")
+            done.wait()
+        finally:
+            # On success nothing is left queued; on error drop the remaining listings.
+            pool.shutdown(wait=True, cancel_futures=True)
+        if state["error"] is not None:
+            raise state["error"]
+        return root_items
 
     def format_tree_structure(self, tree_items: list, root_display_name: str) -> str:
         """
         Formats the scanned tree data (list of items within the root) into a string similar to 'tree' command.
         Args:
-            tree_items: The list of dictionaries returned by generate_file_tree (items *within* the root).
+            tree_items: The list of nodes returned by generate_file_tree (items *within* the root).
             root_display_name: The name of the root directory to display.
         """
-        output_lines = [root_display_name]
+        return "\n".join(self.iter_tree_structure_lines(tree_items, root_display_name))
+
+    def iter_tree_structure_lines(self, tree_items: list, root_display_name: str):
+        """The lines of format_tree_structure, one at a time (without newlines)."""
+        yield root_display_name
 
         def _recursive_format(items, prefix="", is_last_parent_item=False):
             for i, item_data in enumerate(items):
@@ -105,63 +639,634 @@ class FileProcessor:
                 # Add a slash for directories for clarity
                 if item_data["type"] == "directory" or item_data["type"] == "directory_error":
                     line += "/"
-                
-                output_lines.append(line)
+                    if item_data.get("children", []) is None: # Lazy tree: never listed, not empty
+                        line += " (not loaded)"
+
+                yield line
 
                 if "children" in item_data and item_data["children"]:
                     new_prefix = prefix + ("    " if is_last else "│   ")
-                    _recursive_format(item_data["children"], new_prefix, is_last)
+                    yield from _recursive_format(item_data["children"], new_prefix, is_last)
         
-        _recursive_format(tree_items) # Start recursion with the items within the root
-        return "\n".join(output_lines)
+        yield from _recursive_format(tree_items) # Start recursion with the items within the root
 
     def read_file_content(self, file_path_str: str) -> str:
-        file_path = Path(file_path_str)
+        return self._read_file(file_path_str)[0]
+
+    def _read_file(self, file_path_str: str):
+        """
+        read_file_content plus the file's size in bytes (0 if it was not read). Decoded
+        text is served from content_cache while the file's signature and the settings
+        deciding skips are unchanged, and files already classified as skipped are not
+        opened again.
+        """
+        file_name = os.path.basename(file_path_str)
         try:
-            if not file_path.is_file(): # Ensure it's a file before attempting to read
-                return f"[Not a file: {file_path.name}]"
-            if file_path.stat().st_size > self.max_file_size_bytes:
-                return f"[File too large (>{config.MAX_FILE_SIZE_TO_READ_MB}MB): {file_path.name}]"
             try:
-                with file_path.open('rb') as f_bin:
-                    chunk = f_bin.read(1024)
-                    if b'\0' in chunk:
-                        return f"[Likely binary file, skipped: {file_path.name}]"
-            except Exception:
-                pass
-            with file_path.open('r', encoding=config.DEFAULT_ENCODING, errors='ignore') as f:
-                return f.read()
+                st = os.stat(file_path_str)
+            except (FileNotFoundError, NotADirectoryError):
+                st = None
+            if st is None or not stat.S_ISREG(st.st_mode): # Ensure it's a file before attempting to read
+                return f"[Not a file: {file_name}]", 0
+            size = st.st_size
+            signature = file_signature(st)
+            read_at_ns = time.time_ns()
+            if size > self.max_file_size_bytes:
+                if config.LARGE_FILE_MODE == "skip":
+                    return f"[File too large (>{config.MAX_FILE_SIZE_TO_READ_MB}MB): {file_name}]", 0
+                return self._read_window(file_path_str, size, signature, read_at_ns)
+            cache = self.content_cache if self.content_cache.enabled else None
+            if cache is not None:
+                # Cached text was stored only because these settings did not skip the file
+                settings = self._content_settings()
+                content = cache.get(file_path_str, signature, settings)
+                if content is not None:
+                    return content, size
+            classification = self.file_classifier.lookup(file_path_str, signature)
+            if classification is None or not self._skip_message(classification, file_name):
+                content, classification = self._read_text(file_path_str, size, signature, read_at_ns, classification)
+            skip_message = self._skip_message(classification, file_name)
+            if skip_message:
+                return skip_message, 0
+            if cache is not None:
+                cache.put(file_path_str, signature, content, read_at_ns, settings)
+            return content, size
         except FileNotFoundError:
-            return f"[File not found: {file_path.name}]"
+            return f"[File not found: {file_name}]", 0
         except PermissionError:
-            return f"[Permission denied: {file_path.name}]"
+            return f"[Permission denied: {file_name}]", 0
         except Exception as e:
-            return f"[Error reading {file_path.name}: {e}]"
+            return f"[Error reading {file_name}: {e}]", 0
+
+    def _read_window(self, file_path_str: str, size: int, signature: tuple, read_at_ns: int):
+        """
+        An oversized file as the window config.LARGE_FILE_MODE selects (see file_window),
+        read with a seek per slice, so its cost does not grow with the file. Returns
+        (content, bytes read) like _read_file; the window is not kept in content_cache.
+        """
+        name = os.path.basename(file_path_str)
+        mode = config.LARGE_FILE_MODE
+        ranges = plan_windows(size, mode, config.LARGE_FILE_WINDOW_KB * 1024, config.LARGE_FILE_SAMPLES)
+        with open(file_path_str, 'rb') as f:
+            head = f.read(SAMPLE_BYTES)
+            classification = self.file_classifier.classify(file_path_str, signature, head, read_at_ns)
+            skip_message = self._skip_message(classification, name)
+            if skip_message:
+                return skip_message, 0
+            newline, unit, encoding = newline_bytes(classification.encoding, head)
+            slices = read_windows(f, size, ranges, newline, unit)
+        def decode(start, data): # Only a slice at offset 0 has the BOM
+            return data.decode(classification.encoding if start == 0 else encoding, 'ignore')
+        content = format_windows(slices, size, newline, decode)
+        if '\r' in content:
+            content = io.IncrementalNewlineDecoder(None, translate=True).decode(content, final=True)
+        bytes_read = sum(len(data) for _, _, data in slices)
+        shown = {"head": "the start", "tail": "the end", "head_tail": "the start and end"}.get(mode, f"{len(slices)} slices")
+        note = f"[Large file ({size / (1024 * 1024):,.1f} MB): showing {shown}, {bytes_read:,} of {size:,} bytes]\n"
+        return note + content, bytes_read
+
+    def _content_settings(self) -> tuple:
+        """The settings deciding how a file is decoded and whether it is skipped (see ContentCache)."""
+        return (self.file_classifier.default_encoding, self.file_classifier.minified_line_length,
+                config.CLASSIFY_SKIP_MINIFIED, config.CLASSIFY_SKIP_GENERATED)
+
+    @staticmethod
+    def _skip_message(classification, file_name: str):
+        """The placeholder for a file the classification says not to include, else None."""
+        if not classification.is_text:
+            return f"[Likely binary file, skipped: {file_name}]"
+        if classification.minified and config.CLASSIFY_SKIP_MINIFIED:
+            return f"[Minified file, skipped: {file_name}]"
+        if classification.generated and config.CLASSIFY_SKIP_GENERATED:
+            return f"[Generated file, skipped: {file_name}]"
+        return None
+
+    def _read_text(self, file_path_str: str, size: int, signature: tuple, read_at_ns: int, classification=None):
+        """
+        Reads a file with a single open, classifies it (unless a classification is given)
+        and decodes it in the detected encoding. Returns (content, classification);
+        content is None for binary files. Files of READ_MMAP_THRESHOLD_KB or more are
+        mapped, and classified and decoded straight from the mapping instead of being
+        copied into a bytes object first. Newlines are translated as in text mode.
+        """
+        with open(file_path_str, 'rb') as f:
+            if size >= config.READ_MMAP_THRESHOLD_KB * 1024:
+                try:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError): # Empty by now, or a filesystem that cannot map
+                    buffer = f.read()
+            else:
+                buffer = f.read()
+        try:
+            if classification is None:
+                classification = self.file_classifier.classify(file_path_str, signature, buffer, read_at_ns)
+            if not classification.is_text:
+                return None, classification
+            content = classification.decode(buffer)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        if '\r' in content: # Universal newlines, with the translator text mode itself uses
+            content = io.IncrementalNewlineDecoder(None, translate=True).decode(content, final=True)
+        return content, classification
+
+    @staticmethod
+    def _display_path(resolved_path_str: str, root_dir_str: str) -> str:
+        """Path relative to root_dir_str if the file is inside it, else the absolute path."""
+        if root_dir_str:
+            path_key, root_key = os.path.normcase(resolved_path_str), os.path.normcase(root_dir_str)
+            if path_key == root_key:
+                return "."
+            prefix = root_key if root_key.endswith(os.sep) else root_key + os.sep
+            if path_key.startswith(prefix):
+                return resolved_path_str[len(prefix):]
+        return resolved_path_str
+
+    @staticmethod
+    def _resolve_file_path(file_path_str: str, resolved_dirs: dict) -> str:
+        """
+        os.path.realpath for a file, with the resolution of its directory memoised in
+        resolved_dirs: checked files share a handful of directories, so this costs one
+        lstat per file instead of one per path component.
+        """
+        dir_path_str, name = os.path.split(os.path.abspath(file_path_str))
+        resolved_dir = resolved_dirs.get(dir_path_str)
+        if resolved_dir is None:
+            resolved_dir = resolved_dirs[dir_path_str] = os.path.realpath(dir_path_str)
+        resolved_path_str = os.path.join(resolved_dir, name)
+        if os.path.islink(resolved_path_str):
+            return os.path.realpath(resolved_path_str)
+        return resolved_path_str
+
+    def _load_for_consolidation(self, file_path_str: str, root_dir_str: str, resolved_dirs: dict, with_digest: bool,
+                                snapshot: ConsolidationSnapshot = None):
+        """
+        Resolves, reads and decodes one file; runs on the read pool. With with_digest a
+        content key is computed too (None for files that were not read): the length plus
+        the 128-bit BLAKE2b hash snapshots use. Duplicates are referenced on the strength
+        of the key alone, so it has to be collision-resistant; Python's 64-bit string
+        hash, several times cheaper, is not. The cost (~2 ms per MB) is paid on the pool.
+        The file is recorded in snapshot, if given.
+        """
+        resolved_path_str = self._resolve_file_path(file_path_str, resolved_dirs)
+        content, size = self._read_file(resolved_path_str)
+        digest = (len(content), content_hash(content.encode('utf-8', 'surrogatepass'))) if with_digest and size else None
+        display_path = self._display_path(resolved_path_str, root_dir_str)
+        if snapshot is not None:
+            snapshot.record(display_path, resolved_path_str, content)
+        return display_path, content, size, digest
 
-    def consolidate_files_content(self, file_paths: list[str], root_dir_path_str: str = None) -> str:
-        consolidated_texts = []
+    def iter_file_contents(self, file_paths: list[str], root_dir_path_str: str = None, workers: int = None,
+                           stats: ReadStats = None, with_digests: bool = False, snapshot: ConsolidationSnapshot = None):
+        """
+        Yields (display_path, content) for file_paths, in their order. Files are read
+        concurrently by up to 'workers' threads (default: config.CONSOLIDATE_WORKERS),
+        at most a few per thread ahead of the consumer, so memory stays bounded.
+        If stats is given it is updated with the files/bytes read and the time taken.
+        With with_digests the tuples are (display_path, content, digest), digest being
+        a hash of the content (None for placeholders such as skipped or missing files).
+        With a snapshot, every file is recorded in it (see ConsolidationSnapshot).
+        """
         try:
-            root_dir = Path(root_dir_path_str).resolve() if root_dir_path_str else None
+            root_dir = os.path.realpath(root_dir_path_str) if root_dir_path_str else None
         except Exception:
             root_dir = None
+        resolved_dirs = {} # directory -> realpath, shared by the read threads
+        if workers is None:
+            workers = config.CONSOLIDATE_WORKERS
+        start_time = time.perf_counter()
+        cache_hits_before = self.content_cache.hits + self.content_cache.disk_hits
 
-        for file_path_str in file_paths:
-            file_path_obj = Path(file_path_str).resolve()
-            display_path = str(file_path_obj.name) # Default to just name
-            if root_dir:
-                try:
-                    if file_path_obj.is_relative_to(root_dir): # Check if path is truly under root_dir
-                        display_path = str(file_path_obj.relative_to(root_dir))
-                    else: # If not, use absolute path
-                        display_path = str(file_path_obj)
-                except ValueError: # Should not happen if is_relative_to is used
-                    display_path = str(file_path_obj)
-            else: # No root_dir, use absolute path
-                display_path = str(file_path_obj)
-
-            content = self.read_file_content(str(file_path_obj))
+        def account(size):
+            if stats is not None:
+                stats.files += 1
+                stats.bytes_read += size
+                stats.seconds = time.perf_counter() - start_time
+                stats.cache_hits = self.content_cache.hits + self.content_cache.disk_hits - cache_hits_before
+
+        if workers <= 1 or len(file_paths) <= 1:
+            for file_path_str in file_paths:
+                display_path, content, size, digest = self._load_for_consolidation(file_path_str, root_dir, resolved_dirs, with_digests, snapshot)
+                account(size)
+                yield (display_path, content, digest) if with_digests else (display_path, content)
+            return
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="read")
+        try:
+            pending = deque()
+            paths = iter(file_paths)
+            for file_path_str in paths:
+                pending.append(pool.submit(self._load_for_consolidation, file_path_str, root_dir, resolved_dirs, with_digests, snapshot))
+                if len(pending) >= workers * 4:
+                    break
+            while pending:
+                display_path, content, size, digest = pending.popleft().result()
+                # Refill before handing the result out, so reads continue while the caller works
+                file_path_str = next(paths, None)
+                if file_path_str is not None:
+                    pending.append(pool.submit(self._load_for_consolidation, file_path_str, root_dir, resolved_dirs, with_digests, snapshot))
+                account(size)
+                yield (display_path, content, digest) if with_digests else (display_path, content)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def consolidate_files_content(self, file_paths: list[str], root_dir_path_str: str = None, workers: int = None,
+                                  stats: ReadStats = None, deduplicate: bool = None, budget_plan: BudgetPlan = None) -> str:
+        return "".join(self.iter_consolidated_files(file_paths, root_dir_path_str, workers, stats, deduplicate,
+                                                    budget_plan))
+
+    def iter_consolidated_files(self, file_paths: list[str], root_dir_path_str: str = None, workers: int = None,
+                                stats: ReadStats = None, deduplicate: bool = None, budget_plan: BudgetPlan = None,
+                                snapshot: ConsolidationSnapshot = None):
+        """
+        consolidate_files_content as a stream: one chunk per file, header and footer included.
+        With deduplicate (default: config.CONSOLIDATE_DEDUPLICATE) a file whose content is
+        identical to an earlier one is emitted as a reference to that file's path.
+        With a budget_plan, files it drops are not read and files it truncates are cut
+        to their allowance. Files emitted in full are recorded in snapshot, if given.
+        """
+        if deduplicate is None:
+            deduplicate = config.CONSOLIDATE_DEDUPLICATE
+        allowances = None
+        if budget_plan is not None:
+            file_paths = [path for path in file_paths if budget_plan.allowance(path) != 0]
+            allowances = iter([budget_plan.allowance(path) for path in file_paths])
+        if deduplicate:
+            contents = self.iter_file_contents(file_paths, root_dir_path_str, workers, stats, with_digests=True,
+                                               snapshot=snapshot)
+        else:
+            contents = ((display_path, content, None) for display_path, content
+                        in self.iter_file_contents(file_paths, root_dir_path_str, workers, stats, snapshot=snapshot))
+        first_paths = {} # content digest -> display path of its first occurrence
+        for display_path, content, digest in contents:
+            allowance = next(allowances) if allowances is not None else None
             header = f"--- FILE: {display_path} ---"
             footer = f"--- END OF FILE: {display_path} ---"
-            consolidated_texts.append(f"{header}\n{content}\n{footer}\n\n")
-            
-        return "".join(consolidated_texts)
\ No newline at end of file
+            if digest is not None:
+                first_path = first_paths.get(digest)
+                if first_path is not None:
+                    reference = f"[Identical to {first_path}]"
+                    if stats is not None:
+                        stats.duplicates[display_path] = first_path
+                        stats.duplicate_files += 1
+                        stats.bytes_deduplicated += len(content.encode('utf-8', 'surrogatepass')) - len(reference)
+                    content = reference
+                    allowance = None
+                elif allowance is None: # A truncated copy cannot stand in for the others
+                    first_paths[digest] = display_path
+            if allowance is not None:
+                overhead = self._budget_cost(f"{header}\n\n{footer}\n\n", budget_plan.unit)
+                content = self._truncate_to_budget(content, allowance - overhead, budget_plan.unit)
+                if snapshot is not None: # Not seen in full; the next delta includes it again
+                    snapshot.forget(display_path)
+            yield f"{header}\n{content}\n{footer}\n\n"
+
+    def iter_consolidation(self, file_paths: list[str], root_dir_path_str: str, tree_items: list = None,
+                           workers: int = None, stats: ReadStats = None, chunk_size: int = 64 * 1024,
+                           deduplicate: bool = None, budget_plan: BudgetPlan = None, record_snapshot: bool = None):
+        """
+        Streams the complete consolidation document - root line, file structure and file
+        contents - as text chunks, for writing to an output_sinks sink. Small pieces are
+        merged up to chunk_size; a file's content is never split, so the largest chunk
+        is bounded by MAX_FILE_SIZE_TO_READ_MB. Only the files being read ahead are held
+        in memory, never the whole document.
+        With a budget_plan (see plan_budget) only the files it keeps are included, and
+        the list of what it truncated or left out ends the document.
+        With record_snapshot (default: config.SNAPSHOT_ENABLED) the included files replace
+        the root's snapshot once the document is complete, as the baseline for iter_delta.
+        """
+        if record_snapshot is None:
+            record_snapshot = config.SNAPSHOT_ENABLED
+        snapshot = self.get_snapshot(os.path.realpath(root_dir_path_str)) if record_snapshot else None
+
+        def pieces():
+            yield from self._iter_preamble(root_dir_path_str, tree_items)
+            yield from self.iter_consolidated_files(file_paths, root_dir_path_str, workers, stats, deduplicate,
+                                                    budget_plan, snapshot)
+            if budget_plan is not None and not budget_plan.is_complete:
+                yield budget_plan.report()
+
+        if snapshot is not None:
+            snapshot.begin(replace=True)
+        yield from self._recording(self._coalesce(pieces(), chunk_size), snapshot)
+
+    @staticmethod
+    def _coalesce(pieces, chunk_size: int):
+        """Merges small text pieces into chunks of at least chunk_size characters."""
+        pending, pending_size = [], 0
+        for piece in pieces:
+            pending.append(piece)
+            pending_size += len(piece)
+            if pending_size >= chunk_size:
+                yield "".join(pending)
+                pending, pending_size = [], 0
+        if pending:
+            yield "".join(pending)
+
+    @staticmethod
+    def _recording(chunks, snapshot):
+        """Passes chunks through; saves snapshot once they are all out, or reverts it if the output stops early."""
+        if snapshot is None:
+            yield from chunks
+            return
+        completed = False
+        try:
+            yield from chunks
+            completed = True
+        finally:
+            if completed:
+                snapshot.save()
+            else:
+                snapshot.revert()
+
+    # --- Delta consolidation ---
+    def get_snapshot(self, root_path_str: str) -> ConsolidationSnapshot:
+        """Returns the (lazily loaded) consolidation snapshot for a resolved root path."""
+        snapshot = self._snapshots.get(root_path_str)
+        if snapshot is None:
+            snapshot = self._snapshots[root_path_str] = ConsolidationSnapshot(root_path_str)
+        return snapshot
+
+    def iter_delta(self, file_paths: list[str], root_dir_path_str: str, since_ref: str = None, diffs: bool = False,
+                   workers: int = None, stats: ReadStats = None, summary: "DeltaSummary" = None,
+                   chunk_size: int = 64 * 1024, record_snapshot: bool = None):
+        """
+        Streams a consolidation of only what changed among file_paths: files added or
+        modified since the root's snapshot (the last consolidation; see iter_consolidation)
+        or, with since_ref, since that git revision, followed by the files removed since.
+        With the snapshot, files whose signature is unchanged are not even opened; the
+        others are read and their hash compared. With diffs, modified files are shown as
+        unified diffs against their old text (from the snapshot if it kept texts, else
+        from git), falling back to the whole file when the old text is not available.
+        A snapshot keeps texts from the first diffs request on (ConsolidationSnapshot.keep_content).
+        Against the snapshot, the snapshot is updated afterwards (record_snapshot, default
+        config.SNAPSHOT_ENABLED), so the next delta starts from here. summary, if given,
+        is filled with the counts. Raises RuntimeError if git fails for since_ref.
+        """
+        root_dir = os.path.realpath(root_dir_path_str)
+        if workers is None:
+            workers = config.CONSOLIDATE_WORKERS
+        if record_snapshot is None:
+            record_snapshot = config.SNAPSHOT_ENABLED
+        snapshot = None
+        if since_ref:
+            baseline = GitBaseline(root_dir, since_ref, config.DEFAULT_ENCODING)
+        else:
+            snapshot = self.get_snapshot(root_dir)
+            if diffs: # Texts are only kept once diffs are wanted; until then the whole file stands in
+                snapshot.keep_content()
+            baseline = SnapshotBaseline(snapshot, self.read_file_content)
+            if not record_snapshot:
+                snapshot = None
+        if summary is None:
+            summary = DeltaSummary()
+        summary.baseline = baseline.description
+
+        resolved_dirs = {}
+        def batch_statuses(batch):
+            statuses = []
+            for file_path_str in batch:
+                resolved_path_str = self._resolve_file_path(file_path_str, resolved_dirs)
+                relative_path_str = self._display_path(resolved_path_str, root_dir)
+                statuses.append((relative_path_str, baseline.status(relative_path_str, resolved_path_str)))
+            return statuses
+
+        # Mostly one stat per file, so files are handed out in batches rather than one future each
+        batches = [file_paths[i:i + 256] for i in range(0, len(file_paths), 256)]
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="delta") as pool:
+            results = [result for batch in pool.map(batch_statuses, batches) for result in batch]
+        statuses = [status for _, status in results]
+        changed = [(path, status) for path, status in zip(file_paths, statuses) if status != "unchanged"]
+        removed = baseline.removed_paths({relative_path_str for relative_path_str, _ in results})
+        summary.added = statuses.count("added")
+        summary.modified = statuses.count("modified")
+        summary.unchanged = len(statuses) - len(changed)
+        summary.removed = len(removed)
+
+        def pieces():
+            yield f"Current Root Directory: {root_dir_path_str}\n"
+            yield (f"Changes since {baseline.description}: {summary.added} added, {summary.modified} modified, "
+                   f"{summary.removed} removed ({summary.unchanged} unchanged file(s) not shown)\n" + "="*30 + "\n")
+            contents = self.iter_file_contents([path for path, _ in changed], root_dir_path_str, workers, stats,
+                                               snapshot=snapshot)
+            for (_, status), (display_path, content) in zip(changed, contents):
+                if status == "modified" and diffs:
+                    old_content = baseline.old_content(display_path)
+                    if old_content is not None:
+                        yield self._format_diff(display_path, old_content, content)
+                        continue
+                yield f"--- FILE ({status}): {display_path} ---\n{content}\n--- END OF FILE: {display_path} ---\n\n"
+            for relative_path_str in removed:
+                yield f"--- REMOVED: {relative_path_str} ---\n\n"
+                if snapshot is not None:
+                    snapshot.forget(relative_path_str)
+
+        if snapshot is not None:
+            snapshot.begin(replace=False)
+        try:
+            yield from self._recording(self._coalesce(pieces(), chunk_size), snapshot)
+        finally:
+            if isinstance(baseline, GitBaseline):
+                baseline.close()
+
+    @staticmethod
+    def _format_diff(display_path: str, old_content: str, new_content: str) -> str:
+        old_lines = (old_content if old_content.endswith("\n") or not old_content else old_content + "\n").splitlines(True)
+        new_lines = (new_content if new_content.endswith("\n") or not new_content else new_content + "\n").splitlines(True)
+        diff = "".join(difflib.unified_diff(old_lines, new_lines, f"a/{display_path}", f"b/{display_path}"))
+        return f"--- DIFF: {display_path} ---\n{diff}--- END OF DIFF: {display_path} ---\n\n"
+
+    def _iter_preamble(self, root_dir_path_str: str, tree_items: list = None):
+        """The root line and file structure that open a consolidation document."""
+        yield f"Current Root Directory: {root_dir_path_str}\n"
+        if tree_items is not None:
+            yield "File Structure:\n"
+            for line in self.iter_tree_structure_lines(tree_items, Path(root_dir_path_str).name):
+                yield line + "\n"
+        else:
+            yield "File Structure: (Not available - rescan directory if needed)\n"
+        yield "Selected File Contents:\n" + "="*30 + "\n"
+
+    # --- Token budget ---
+    def plan_budget(self, file_paths: list[str], root_dir_path_str: str, budget: int, unit: str = "tokens",
+                    priorities: dict = None, tree_items: list = None, allow_truncation: bool = True,
+                    min_truncated: int = None) -> BudgetPlan:
+        """
+        Decides which of file_paths fit into a consolidation of at most 'budget' tokens (as
+        counted by token_counter) or bytes (UTF-8), for iter_consolidation(budget_plan=...).
+        The root line and file structure are charged first; each file then costs its
+        content plus header and footer. Files are packed by budget_packer.pack in order
+        of priority (default: config.CONSOLIDATE_PRIORITIES, see PriorityRules): whole
+        while they fit, then one truncated to what is left (at least min_truncated),
+        the rest left out. Room is kept for the list of omissions that ends the document.
+        Token counts come from the token index, so only changed files are read, and only
+        their first 64 KB with the estimate.
+        """
+        if unit not in ("tokens", "bytes"):
+            raise ValueError(f"Unknown budget unit: {unit}")
+        if min_truncated is None:
+            min_truncated = 256 if unit == "tokens" else 1024
+        priority_for = PriorityRules(config.CONSOLIDATE_PRIORITIES if priorities is None else priorities)
+        root_dir = os.path.realpath(root_dir_path_str)
+        resolved_dirs = {}
+        resolved_paths = {path: self._resolve_file_path(path, resolved_dirs) for path in file_paths}
+        labels = {path: self._display_path(resolved, root_dir) for path, resolved in resolved_paths.items()}
+
+        if unit == "tokens":
+            content_costs = {}
+            for counts in self.iter_token_counts(root_dir, list(resolved_paths.items())):
+                content_costs.update(counts)
+        else:
+            content_costs = {path: self._byte_cost(resolved) for path, resolved in resolved_paths.items()}
+        candidates = []
+        for path in file_paths:
+            label = labels[path]
+            overhead = self._budget_cost(f"--- FILE: {label} ---\n\n--- END OF FILE: {label} ---\n\n", unit)
+            candidates.append((path, content_costs.get(path, 0) + overhead, priority_for(label)))
+
+        fixed = sum(self._budget_cost(piece, unit) for piece in self._iter_preamble(root_dir_path_str, tree_items))
+        available = max(budget - fixed, 0)
+        reserved = 0
+        while True: # Repacked with room for the omissions list (capped in length, so this settles quickly)
+            plan = pack(candidates, max(available - reserved, 0), allow_truncation, min_truncated, unit)
+            plan.budget, plan.labels = budget, labels
+            report_cost = self._budget_cost(plan.report(), unit)
+            excess = plan.used + report_cost - available
+            if excess <= 0 or reserved >= available:
+                break
+            reserved += excess
+        plan.used += fixed + report_cost
+        return plan
+
+    def _budget_cost(self, text: str, unit: str) -> int:
+        if unit == "tokens":
+            return self.token_counter.count_text(text)
+        return len(text.encode('utf-8', 'surrogatepass'))
+
+    def _byte_cost(self, file_path_str: str) -> int:
+        """Bytes a file will take in the output: its size, or its placeholder if it is skipped."""
+        name = os.path.basename(file_path_str)
+        try:
+            st = os.stat(file_path_str)
+        except OSError:
+            return len(f"[File not found: {name}]")
+        if not stat.S_ISREG(st.st_mode):
+            return len(f"[Not a file: {name}]")
+        if st.st_size > self.max_file_size_bytes:
+            if config.LARGE_FILE_MODE == "skip":
+                return len(f"[File too large (>{config.MAX_FILE_SIZE_TO_READ_MB}MB): {name}]")
+            return config.LARGE_FILE_WINDOW_KB * 1024 + 128 * (config.LARGE_FILE_SAMPLES + 1) # Window and its markers
+        classification = self.file_classifier.lookup(file_path_str, file_signature(st))
+        skip_message = self._skip_message(classification, name) if classification is not None else None
+        return len(skip_message) if skip_message else st.st_size
+
+    def _truncate_to_budget(self, content: str, allowance: int, unit: str) -> str:
+        """Cuts content (at a line end where possible) so that it and a truncation note fit allowance."""
+        if self._budget_cost(content, unit) <= allowance:
+            return content
+        note = "[... truncated to fit the budget]"
+        room = allowance - self._budget_cost("\n" + note, unit)
+        if room <= 0:
+            return note
+        if unit == "bytes":
+            cut = content.encode('utf-8', 'surrogatepass')[:room].decode('utf-8', 'ignore')
+        else: # Proportional first guess, shrunk until it fits
+            cut = content[:len(content) * room // max(self._budget_cost(content, unit), 1)]
+            while cut and self._budget_cost(cut, unit) > room:
+                cut = cut[:len(cut) * 9 // 10]
+        line_end = cut.rfind("\n")
+        if line_end >= len(cut) // 2:
+            cut = cut[:line_end]
+        return f"{cut}\n{note}"
+
+    # --- Token counts ---
+    def get_token_index(self, root_path_str: str) -> TokenIndex:
+        """Returns the (lazily loaded) persistent token index for a resolved root path."""
+        token_index = self._token_indexes.get(root_path_str)
+        if token_index is None or token_index.counter_name != self.token_counter.name:
+            token_index = self._token_indexes[root_path_str] = TokenIndex(root_path_str, self.token_counter.name)
+        return token_index
+
+    def count_file_tokens(self, file_path_str: str, token_index: TokenIndex = None, relative_path_str: str = None) -> int:
+        """
+        Tokens the file contributes to a consolidation (its placeholder if it would be
+        skipped), not counting the header and footer lines. With the estimate only the
+        first SAMPLE_BYTES are read: they are classified like a full read would (the
+        classification is kept for it) and counted in place if the file is UTF-8.
+        Counts are looked up in and stored to token_index under relative_path_str.
+        """
+        try:
+            st = os.stat(file_path_str)
+        except OSError:
+            return 0
+        if not stat.S_ISREG(st.st_mode):
+            return 0
+        signature = file_signature(st)
+        if token_index is not None:
+            tokens = token_index.get(relative_path_str, signature)
+            if tokens is not None:
+                return tokens
+        read_at_ns = time.time_ns()
+        counter = self.token_counter
+        if not isinstance(counter, HeuristicTokenCounter) or st.st_size > self.max_file_size_bytes:
+            tokens = counter.count_text(self._read_file(file_path_str)[0])
+        else:
+            try:
+                with open(file_path_str, 'rb') as f:
+                    sample = f.read(HeuristicTokenCounter.SAMPLE_BYTES)
+            except OSError:
+                return 0
+            classification = self.file_classifier.classify(file_path_str, signature, sample, read_at_ns)
+            skip_message = self._skip_message(classification, os.path.basename(file_path_str))
+            if skip_message:
+                tokens = counter.count_text(skip_message)
+            elif classification.encoding in ("utf-8", "utf-8-sig"):
+                tokens = counter.count_sample(sample, st.st_size)
+            else: # Count the sample's UTF-8 form, scaled by the file's size
+                text_sample = classification.decode(sample).encode('utf-8', 'surrogatepass')
+                scale = st.st_size / len(sample) if sample else 1.0
+                tokens = counter.count_sample(text_sample, round(len(text_sample) * scale))
+        if token_index is not None:
+            token_index.put(relative_path_str, signature, tokens, read_at_ns)
+        return tokens
+
+    def iter_token_counts(self, root_path_str: str, file_items: list, workers: int = None,
+                          cancel_event: threading.Event = None, batch_size: int = 512, prune: bool = False):
+        """
+        Counts the tokens of (key, file path) pairs below root_path_str on a thread pool
+        (default: config.CONSOLIDATE_WORKERS threads) and yields lists of (key, tokens)
+        batch by batch, in the order of file_items. Unchanged files are answered from the
+        root's token index, which is saved at the end. With prune (file_items being the
+        whole tree) counts of files not in file_items are dropped from the index.
+        Stops early, without raising, once cancel_event is set.
+        """
+        if workers is None:
+            workers = config.CONSOLIDATE_WORKERS
+        token_index = self.get_token_index(root_path_str)
+        prefix = root_path_str if root_path_str.endswith(os.sep) else root_path_str + os.sep
+        prefix_length = len(prefix)
+
+        def count_batch(batch):
+            counts = []
+            for key, file_path_str in batch:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                relative_path_str = file_path_str[prefix_length:] if file_path_str.startswith(prefix) else file_path_str
+                counts.append((key, self.count_file_tokens(file_path_str, token_index, relative_path_str)))
+            return counts
+
+        batches = [file_items[i:i + batch_size] for i in range(0, len(file_items), batch_size)]
+        pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tokens")
+        try:
+            futures = [pool.submit(count_batch, batch) for batch in batches]
+            for future in futures:
+                counts = future.result()
+                if counts:
+                    yield counts
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if prune and not (cancel_event is not None and cancel_event.is_set()):
+                token_index.prune(path[prefix_length:] if path.startswith(prefix) else path for _, path in file_items)
+            token_index.save()
@@ -0,0 +1,124 @@
+# core/file_window.py
+import codecs
+
+# How an oversized file is shown: its first bytes, its last, both, or slices spread over it
+WINDOW_MODES = ("head", "tail", "head_tail", "sample")
+
+
+def plan_windows(size: int, mode: str, window_bytes: int, samples: int = 8) -> list:
+    """
+    Byte ranges [(start, end), ...] to read of a file of size bytes, window_bytes in all.
+    "sample" takes 'samples' equal slices spaced evenly from the start to the end of the
+    file. Overlapping ranges are merged, so a file smaller than the window is read whole.
+    """
+    if mode not in WINDOW_MODES:
+        raise ValueError(f"Unknown large file mode '{mode}' (expected one of {', '.join(WINDOW_MODES)})")
+    window_bytes = max(1, min(window_bytes, size))
+    if mode == "head":
+        ranges = [(0, window_bytes)]
+    elif mode == "tail":
+        ranges = [(size - window_bytes, size)]
+    elif mode == "head_tail":
+        half = max(1, window_bytes // 2)
+        ranges = [(0, half), (size - half, size)]
+    else:
+        samples = max(2, samples)
+        slice_bytes = max(1, window_bytes // samples)
+        step = (size - slice_bytes) / (samples - 1)
+        ranges = [(round(i * step), round(i * step) + slice_bytes) for i in range(samples)]
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def newline_bytes(encoding: str, head: bytes) -> tuple:
+    """
+    (encoded '\\n', code unit size, encoding to decode slices after the start with) for
+    a classification's encoding. BOM-detected UTF-16/32 take their byte order from the
+    BOM, since slices further in have none.
+    """
+    if encoding in ("utf-16", "utf-32"):
+        little_endian = head.startswith(codecs.BOM_UTF16_LE)
+        encoding += "-le" if little_endian else "-be"
+    newline = "\n".encode(encoding)
+    if encoding == "utf-8-sig":
+        newline = b"\n"
+    return newline, len(newline), encoding
+
+
+def _find_aligned(data: bytes, pattern: bytes, unit: int, start: int = 0, reverse: bool = False) -> int:
+    """data.find/rfind for a pattern that must start on a code unit boundary; -1 if absent."""
+    if reverse:
+        pos = data.rfind(pattern)
+        while pos > 0 and pos % unit:
+            pos = data.rfind(pattern, 0, pos + len(pattern) - 1)
+        return pos
+    pos = data.find(pattern, start)
+    while pos > 0 and pos % unit:
+        pos = data.find(pattern, pos + 1)
+    return pos
+
+
+def read_windows(f, size: int, ranges: list, newline: bytes, unit: int = 1) -> list:
+    """
+    Reads the ranges of an open binary file with one seek each and trims every slice
+    to whole lines: the partial line at its start (unless it starts the file) and at its
+    end (unless it ends the file). A slice without any newline is kept as it is.
+    Returns [(start, end, data), ...] with the trimmed offsets.
+    """
+    slices = []
+    for start, end in ranges:
+        start -= start % unit
+        f.seek(start)
+        data = f.read(end - start)
+        end = start + len(data)
+        if start > 0:
+            pos = _find_aligned(data, newline, unit)
+            if 0 <= pos < len(data) - len(newline):
+                data = data[pos + len(newline):]
+                start = end - len(data)
+        if end < size:
+            pos = _find_aligned(data, newline, unit, reverse=True)
+            if pos >= 0:
+                data = data[:pos + len(newline)]
+                end = start + len(data)
+        if data and (not slices or start >= slices[-1][1]):
+            slices.append((start, end, data))
+    return slices
+
+
+def format_windows(slices: list, size: int, newline: bytes, decode) -> str:
+    """
+    Joins the slices, decoded by decode(start, data), with a marker for every elided
+    range giving its byte offsets and line numbers. Lines are counted in the slices read,
+    so a line number after the first gap is an estimate from their average line length,
+    marked '~'.
+    """
+    total_read = sum(len(data) for _, _, data in slices)
+    total_newlines = sum(data.count(newline) for _, _, data in slices)
+    lines_per_byte = total_newlines / total_read if total_read else 0.0
+    parts = []
+    position, line, exact = 0, 1, True # Byte offset and line number reached so far
+
+    def line_label(number: int, is_exact: bool) -> str:
+        return f"{number:,}" if is_exact else f"~{number:,}"
+
+    for start, end, data in slices:
+        if start > position:
+            start_line = max(line + 1, round(1 + start * lines_per_byte))
+            parts.append(f"[... {start - position:,} bytes elided: bytes {position:,}-{start:,}, "
+                         f"lines {line_label(line, exact)}-{line_label(start_line - 1, False)} ...]\n")
+            line, exact = start_line, False
+        parts.append(decode(start, data))
+        if not parts[-1].endswith("\n"):
+            parts.append("\n")
+        line += data.count(newline)
+        position = end
+    if position < size:
+        parts.append(f"[... {size - position:,} bytes elided: bytes {position:,}-{size:,}, "
+                     f"lines {line_label(line, exact)}-~{max(line, round(size * lines_per_byte)):,} ...]\n")
+    return "".join(parts)
@@ -0,0 +1,331 @@
+# core/fs_watcher.py
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from . import config
+from .git_index import find_work_tree
+
+# inotify constants (see inotify(7))
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF
+               | _IN_CLOSE_WRITE | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, name length
+
+# Files whose rules decide what a scan lists (see gitignore.GitIgnoreStack)
+IGNORE_FILE_NAME = ".gitignore"
+EXCLUDE_FILE_NAME = "exclude" # In <git dir>/info; applies to the whole work tree
+
+
+class FileSystemWatcher:
+    """
+    Base class for directory watchers. Watchers only report *which directories*
+    changed (an entry was created, deleted or renamed in them); callers re-list those
+    directories themselves. A .gitignore written, added or removed counts as a change
+    of its directory and every watched directory below it, whose listings its rules
+    filter; a changed .git/info/exclude (see watch_git_excludes) as a full rescan.
+
+    Events are coalesced: take_changes() hands out the accumulated set only once no
+    new event arrived for debounce_seconds (or max_delay_seconds passed since the first
+    one), so a burst such as a 'git checkout' becomes a single batch. When a batch is
+    too large, or the kernel queue overflowed, it is reported as needing a full rescan.
+    """
+    def __init__(self, debounce_seconds: float = None, max_delay_seconds: float = None, max_batch_dirs: int = None):
+        self.debounce_seconds = config.WATCH_DEBOUNCE_MS / 1000 if debounce_seconds is None else debounce_seconds
+        self.max_delay_seconds = config.WATCH_MAX_DELAY_MS / 1000 if max_delay_seconds is None else max_delay_seconds
+        self.max_batch_dirs = config.WATCH_MAX_INCREMENTAL_DIRS if max_batch_dirs is None else max_batch_dirs
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._needs_full_rescan = False
+        self._first_event_time = None
+        self._last_event_time = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    # --- Public API ---
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def watch_directories(self, dir_paths):
+        for dir_path in dir_paths:
+            self.add_directory(dir_path)
+
+    def add_directory(self, dir_path: str):
+        raise NotImplementedError
+
+    def remove_directory(self, dir_path: str):
+        raise NotImplementedError
+
+    def watch_git_excludes(self, root_path_str: str):
+        """Also watches the .git/info/exclude of the work tree containing root_path_str, if any."""
+        work_tree = find_work_tree(root_path_str)
+        if work_tree is not None:
+            self._add_exclude_directory(os.path.join(work_tree[1], "info"))
+
+    def _add_exclude_directory(self, info_dir_path: str):
+        raise NotImplementedError
+
+    def take_changes(self, settled: bool = True):
+        """
+        Returns (changed_dir_paths, needs_full_rescan) once a burst of events has
+        settled, or None if there is nothing (yet) to report. With settled False the
+        changes so far are handed out at once, for a caller about to use the tree.
+        """
+        with self._lock:
+            if not self._pending and not self._needs_full_rescan:
+                return None
+            now = time.monotonic()
+            if settled and (now - self._last_event_time < self.debounce_seconds
+                    and now - self._first_event_time < self.max_delay_seconds):
+                return None
+            changed = self._pending
+            needs_full_rescan = self._needs_full_rescan or len(changed) > self.max_batch_dirs
+            self._pending = set()
+            self._needs_full_rescan = False
+            self._first_event_time = self._last_event_time = None
+            return changed, needs_full_rescan
+
+    # --- For subclasses ---
+    def _record_change(self, dir_path: str = None, full_rescan: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if self._first_event_time is None:
+                self._first_event_time = now
+            self._last_event_time = now
+            if full_rescan:
+                self._needs_full_rescan = True
+            elif dir_path is not None:
+                self._pending.add(dir_path)
+
+    def _record_ignore_file_change(self, dir_path: str, watched_paths):
+        """A directory's .gitignore changed: it and the watched directories below it are re-listed."""
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        for watched_path in [dir_path] + [path for path in watched_paths if path.startswith(prefix)]:
+            self._record_change(watched_path)
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class PollingWatcher(FileSystemWatcher):
+    """Portable fallback: stats every watched directory each interval and compares mtimes."""
+    def __init__(self, interval_seconds: float = None, **kwargs):
+        super().__init__(**kwargs)
+        self.interval_seconds = config.WATCH_POLL_INTERVAL_MS / 1000 if interval_seconds is None else interval_seconds
+        self._mtimes = {} # dir path -> mtime_ns (None if it could not be stat'ed)
+        # Edits in place leave the directory's mtime alone, so ignore files are stat'ed too
+        self._ignore_mtimes = {} # dir path -> mtime_ns of its .gitignore, for directories that have one
+        self._exclude_mtimes = {} # exclude file path -> mtime_ns (None if absent)
+
+    def add_directory(self, dir_path: str):
+        ignore_mtime = self._stat_mtime(os.path.join(dir_path, IGNORE_FILE_NAME))
+        with self._lock:
+            self._mtimes[dir_path] = self._stat_mtime(dir_path)
+            if ignore_mtime is not None:
+                self._ignore_mtimes[dir_path] = ignore_mtime
+
+    def remove_directory(self, dir_path: str):
+        with self._lock:
+            self._mtimes.pop(dir_path, None)
+            self._ignore_mtimes.pop(dir_path, None)
+
+    def _add_exclude_directory(self, info_dir_path: str):
+        exclude_path = os.path.join(info_dir_path, EXCLUDE_FILE_NAME)
+        with self._lock:
+            self._exclude_mtimes[exclude_path] = self._stat_mtime(exclude_path)
+
+    @staticmethod
+    def _stat_mtime(dir_path: str):
+        try:
+            return os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            with self._lock:
+                snapshot = list(self._mtimes.items())
+                ignore_dirs = list(self._ignore_mtimes)
+                exclude_files = list(self._exclude_mtimes.items())
+            for exclude_path, old_mtime in exclude_files:
+                new_mtime = self._stat_mtime(exclude_path)
+                if new_mtime != old_mtime:
+                    with self._lock:
+                        self._exclude_mtimes[exclude_path] = new_mtime
+                    self._record_change(full_rescan=True)
+            changed_dirs = set()
+            for dir_path, old_mtime in snapshot:
+                new_mtime = self._stat_mtime(dir_path)
+                if new_mtime != old_mtime:
+                    with self._lock:
+                        if dir_path in self._mtimes:
+                            self._mtimes[dir_path] = new_mtime
+                    # A vanished directory is reported through its parent's change
+                    if new_mtime is not None:
+                        self._record_change(dir_path)
+                        changed_dirs.add(dir_path)
+                    parent = os.path.dirname(dir_path)
+                    if new_mtime is None and parent in self._mtimes:
+                        self._record_change(parent)
+            # Ignore files edited in place, and ones added or removed in a changed directory
+            for dir_path in changed_dirs.union(ignore_dirs):
+                self._check_ignore_file(dir_path)
+
+    def _check_ignore_file(self, dir_path: str):
+        new_mtime = self._stat_mtime(os.path.join(dir_path, IGNORE_FILE_NAME))
+        with self._lock:
+            if dir_path not in self._mtimes or new_mtime == self._ignore_mtimes.get(dir_path):
+                return
+            if new_mtime is None:
+                del self._ignore_mtimes[dir_path]
+            else:
+                self._ignore_mtimes[dir_path] = new_mtime
+            watched_paths = list(self._mtimes)
+        self._record_ignore_file_change(dir_path, watched_paths)
+
+
+class InotifyWatcher(FileSystemWatcher):
+    """Linux watcher built on inotify through ctypes (one watch per directory)."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self._wake_r, self._wake_w = os.pipe()
+        self._paths_by_wd = {}
+        self._wds_by_path = {}
+        self._exclude_wds = set() # Watches on <git dir>/info directories
+        self._ctypes = ctypes
+        self.watch_limit_reached = False
+
+    def add_directory(self, dir_path: str):
+        wd = self._add_watch(dir_path)
+        if wd is not None:
+            with self._lock:
+                self._paths_by_wd[wd] = dir_path
+                self._wds_by_path[dir_path] = wd
+
+    def _add_exclude_directory(self, info_dir_path: str):
+        wd = self._add_watch(info_dir_path)
+        if wd is not None:
+            with self._lock:
+                self._exclude_wds.add(wd)
+
+    def _add_watch(self, dir_path: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), _WATCH_MASK)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            if err == errno.ENOSPC and not self.watch_limit_reached:
+                # Out of watches (fs.inotify.max_user_watches): changes in the remaining
+                # directories are only picked up by a manual refresh.
+                self.watch_limit_reached = True
+                print(f"inotify watch limit reached while watching {dir_path}; raise fs.inotify.max_user_watches")
+            return None
+        return wd
+
+    def remove_directory(self, dir_path: str):
+        with self._lock:
+            wd = self._wds_by_path.pop(dir_path, None)
+            if wd is not None:
+                self._paths_by_wd.pop(wd, None)
+        if wd is not None:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def stop(self):
+        if self._fd < 0: # Already stopped
+            return
+        if self._thread is not None:
+            os.write(self._wake_w, b"x")
+        super().stop()
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fd = -1
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+            if self._wake_r in readable:
+                return
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._handle_events(data)
+
+    def _handle_events(self, data: bytes):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            name_start = offset + _EVENT_HEADER.size
+            name = data[name_start:name_start + name_len].rstrip(b"\0")
+            offset = name_start + name_len
+            if mask & _IN_Q_OVERFLOW:
+                self._record_change(full_rescan=True)
+                continue
+            with self._lock:
+                is_exclude_directory = wd in self._exclude_wds
+                if is_exclude_directory and mask & _IN_IGNORED:
+                    self._exclude_wds.discard(wd)
+                dir_path = self._paths_by_wd.get(wd)
+                if mask & _IN_IGNORED: # Watch removed (directory deleted or unwatched)
+                    self._paths_by_wd.pop(wd, None)
+                    if dir_path is not None and self._wds_by_path.get(dir_path) == wd:
+                        del self._wds_by_path[dir_path]
+            if is_exclude_directory:
+                if name == EXCLUDE_FILE_NAME.encode() and not mask & _IN_IGNORED:
+                    self._record_change(full_rescan=True)
+                continue
+            if dir_path is None or mask & _IN_IGNORED:
+                continue
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                # The parent directory receives its own DELETE/MOVED_FROM event.
+                continue
+            if name == IGNORE_FILE_NAME.encode():
+                with self._lock:
+                    watched_paths = list(self._wds_by_path)
+                self._record_ignore_file_change(dir_path, watched_paths)
+            elif not mask & _IN_CLOSE_WRITE: # Other files written in place leave the listing alone
+                self._record_change(dir_path)
+
+
+def create_watcher(**kwargs) -> FileSystemWatcher:
+    """Returns an inotify watcher on Linux when available, otherwise the polling fallback."""
+    if sys.platform.startswith("linux") and not config.WATCH_FORCE_POLLING:
+        try:
+            return InotifyWatcher(**kwargs)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling watcher")
+    return PollingWatcher(**kwargs)
@@ -0,0 +1,252 @@
+# core/git_index.py
+import os
+import re
+import struct
+import hashlib
+import subprocess
+
+_HEADER = struct.Struct(">4sLL") # signature, version, entry count
+_EXTENSION_HEADER = struct.Struct(">4sL")
+_MODE_DIRECTORY = 0o040000 # Sparse index directory entry
+_MODE_GITLINK = 0o160000 # Submodule
+_FLAG_EXTENDED = 0x4000
+_FLAG_STAGE_MASK = 0x3000
+_FLAG_NAME_MASK = 0x0FFF
+_EXTENDED_SKIP_WORKTREE = 0x4000
+
+# Extensions whose presence means the file list is not all in this file
+_UNSUPPORTED_EXTENSIONS = {b"link": "split index", b"sdir": "sparse index"}
+
+
+class GitIndexError(Exception):
+    """The index could not be used (missing, corrupt or an unsupported layout)."""
+
+
+def find_work_tree(path_str: str):
+    """Returns (work tree top, git dir) for the repository containing path_str, or None."""
+    directory = path_str
+    while True:
+        git_path = os.path.join(directory, ".git")
+        if os.path.isdir(git_path):
+            return directory, git_path
+        if os.path.isfile(git_path): # Linked worktree or submodule: 'gitdir: <path>'
+            try:
+                with open(git_path, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if content.startswith("gitdir:"):
+                return directory, os.path.normpath(os.path.join(directory, content[len("gitdir:"):].strip()))
+            return None
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _hash_size(git_dir: str) -> int:
+    """20 for SHA-1 repositories, 32 for SHA-256 ones (extensions.objectFormat)."""
+    config_path = os.path.join(git_dir, "config")
+    if not os.path.isfile(config_path):
+        # Linked worktrees keep their config in the common dir
+        try:
+            with open(os.path.join(git_dir, "commondir"), 'r', encoding='utf-8') as f:
+                config_path = os.path.join(git_dir, f.read().strip(), "config")
+        except OSError:
+            return 20
+    try:
+        with open(config_path, 'r', encoding='utf-8', errors='replace') as f:
+            config_text = f.read()
+    except OSError:
+        return 20
+    return 32 if re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config_text, re.IGNORECASE | re.MULTILINE) else 20
+
+
+def read_index_entries(git_dir: str):
+    """
+    Parses <git_dir>/index (versions 2-4) and returns (tracked file paths, submodule paths),
+    both '/'-separated and relative to the work tree top. Entries that are not checked out
+    (skip-worktree) are left out and unmerged paths are reported once.
+    Raises GitIndexError if the index is missing, fails its checksum or uses a layout
+    (split or sparse index) that would need more than this file.
+    """
+    index_path = os.path.join(git_dir, "index")
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise GitIndexError(f"Cannot read {index_path}: {e}") from e
+
+    hash_size = _hash_size(git_dir)
+    if len(data) < _HEADER.size + hash_size:
+        raise GitIndexError("Index file is truncated")
+    signature, version, entry_count = _HEADER.unpack_from(data)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise GitIndexError(f"Unsupported index signature/version: {signature!r} v{version}")
+    trailer = data[-hash_size:]
+    if trailer != bytes(hash_size): # All zeroes with index.skipHash
+        digest = (hashlib.sha1 if hash_size == 20 else hashlib.sha256)(memoryview(data)[:-hash_size]).digest()
+        if digest != trailer:
+            raise GitIndexError("Index checksum mismatch")
+
+    flags_offset = 40 + hash_size # Fixed stat fields, then the object name
+    # ctime, mtime (2 x 8 bytes), dev, ino | mode | uid, gid, size, object name | flags
+    mode_and_flags = struct.Struct(f">24xL{12 + hash_size}xH")
+    unpack_mode_and_flags = mode_and_flags.unpack_from
+    files, submodules = [], []
+    previous_path = b""
+    offset = _HEADER.size
+    end = len(data) - hash_size
+    try:
+        for _ in range(entry_count):
+            mode, flags = unpack_mode_and_flags(data, offset)
+            path_offset = offset + flags_offset + 2
+            skip_worktree = False
+            if flags & _FLAG_EXTENDED:
+                extended_flags = int.from_bytes(data[path_offset:path_offset + 2], "big")
+                skip_worktree = bool(extended_flags & _EXTENDED_SKIP_WORKTREE)
+                path_offset += 2
+
+            if version == 4:
+                # Prefix compression: strip N bytes from the previous path, append a NUL-terminated suffix
+                strip = data[path_offset] & 0x7F
+                while data[path_offset] & 0x80:
+                    path_offset += 1
+                    strip = ((strip + 1) << 7) | (data[path_offset] & 0x7F)
+                path_offset += 1
+                suffix_end = data.index(b"\0", path_offset)
+                path = previous_path[:len(previous_path) - strip] + data[path_offset:suffix_end]
+                offset = suffix_end + 1
+            else:
+                name_length = flags & _FLAG_NAME_MASK
+                if name_length == _FLAG_NAME_MASK: # Long name: length not stored
+                    name_length = data.index(b"\0", path_offset + name_length) - path_offset
+                path = data[path_offset:path_offset + name_length]
+                # Entries are NUL-padded to a multiple of 8 bytes
+                offset += ((path_offset - offset) + name_length + 8) & ~7
+            if offset > end:
+                raise GitIndexError("Index entry runs past the end of the file")
+
+            if path == previous_path and flags & _FLAG_STAGE_MASK: # Further stages of an unmerged path
+                continue
+            previous_path = path
+            if mode == _MODE_DIRECTORY:
+                raise GitIndexError("Sparse index directory entries are not supported")
+            if skip_worktree:
+                continue
+            if mode == _MODE_GITLINK:
+                submodules.append(path)
+            else:
+                files.append(path)
+    except (IndexError, ValueError, struct.error) as e:
+        raise GitIndexError(f"Corrupt index entry: {e}") from e
+
+    while offset + _EXTENSION_HEADER.size <= end:
+        extension, size = _EXTENSION_HEADER.unpack_from(data, offset)
+        if extension in _UNSUPPORTED_EXTENSIONS:
+            raise GitIndexError(f"Unsupported index layout ({_UNSUPPORTED_EXTENSIONS[extension]})")
+        offset += _EXTENSION_HEADER.size + size
+    return _decode_paths(files), _decode_paths(submodules)
+
+
+def _decode_paths(paths: list) -> list:
+    """os.fsdecode for a list of paths, in one decode call instead of one per path."""
+    if not paths:
+        return []
+    return os.fsdecode(b"\0".join(paths)).split("\0")
+
+
+def start_worktree_changes(root_path_str: str):
+    """
+    Starts 'git ls-files' listing the untracked (not ignored) and the deleted paths below
+    root_path_str; collect the result with collect_worktree_changes. Returns None if git
+    cannot be run.
+    """
+    try:
+        return subprocess.Popen(
+            ["git", "ls-files", "-z", "-t", "--others", "--deleted", "--exclude-standard"],
+            cwd=root_path_str, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+
+
+def collect_worktree_changes(process, timeout: float = 60):
+    """
+    Returns (untracked, deleted) paths relative to the root given to start_worktree_changes,
+    or None if git failed. Untracked directories holding a repository of their own come
+    back with a trailing '/'.
+    """
+    try:
+        stdout, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return None
+    if process.returncode != 0:
+        return None
+    untracked, deleted = [], set()
+    for record in stdout.split(b"\0"):
+        if len(record) < 3:
+            continue
+        path = os.fsdecode(record[2:])
+        if record[:1] == b"?":
+            untracked.append(path)
+        elif record[:1] == b"R":
+            deleted.add(path)
+    return untracked, deleted
+
+
+def list_work_tree_files(root_path_str: str, include_untracked: bool = True):
+    """
+    Enumerates the files below root_path_str from the git index, without walking the
+    directory tree. With include_untracked, git's list of untracked (not ignored) files
+    is added and tracked files deleted from the work tree are dropped. That needs the git
+    binary; without it (or with include_untracked off) only the index is read - no
+    subprocess and no stat calls, but untracked files are missing and deleted ones listed.
+    Returns (file paths, directories to scan from disk), '/'-separated and relative to
+    root_path_str. The directories are submodules and nested repositories, whose contents
+    the index does not list. Returns None when root_path_str is not in a git work tree;
+    raises GitIndexError for an unusable index.
+    """
+    work_tree = find_work_tree(root_path_str)
+    if work_tree is None:
+        return None
+    top, git_dir = work_tree
+    process = None
+    if include_untracked:
+        process = start_worktree_changes(root_path_str)
+        if process is None:
+            print("git not found; listing tracked files from the index only")
+    try:
+        tracked, submodules = read_index_entries(git_dir) # Parsed while git works
+    except GitIndexError:
+        if process is not None:
+            process.kill()
+            process.communicate()
+        raise
+    untracked, deleted = [], set()
+    if process is not None:
+        changes = collect_worktree_changes(process)
+        if changes is not None:
+            untracked, deleted = changes
+        else:
+            print(f"'git ls-files' failed in {root_path_str}; listing tracked files from the index only")
+
+    root_in_repo = os.path.relpath(root_path_str, top)
+    if root_in_repo == os.curdir:
+        prefix = ""
+    else:
+        prefix = root_in_repo.replace(os.sep, "/") + "/"
+    prefix_length = len(prefix)
+
+    files = [path[prefix_length:] for path in tracked if path.startswith(prefix)]
+    if deleted:
+        files = [path for path in files if path not in deleted]
+    external_dirs = [path[prefix_length:] for path in submodules if path.startswith(prefix)]
+    for path in untracked:
+        if path.endswith("/"):
+            external_dirs.append(path.rstrip("/"))
+        else:
+            files.append(path)
+    return files, external_dirs
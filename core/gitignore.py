@@ -0,0 +1,261 @@
+# core/gitignore.py
+import os
+import re
+from .git_index import find_work_tree
+
+# git compares paths case-insensitively where the filesystem does (core.ignorecase)
+_REGEX_FLAGS = re.IGNORECASE if os.path.normcase('A') != 'A' else 0
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translates a gitignore glob into a regex over '/'-separated paths:
+    '*' and '?' never match a slash, '**' spans directories as gitignore(5)
+    describes ('**/x', 'x/**', 'a/**/b'), and a backslash escapes the next character.
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/'):
+                end = i + 2
+                if end == n: # 'x/**': everything inside
+                    parts.append('.*')
+                    i = end
+                    continue
+                if pattern[end] == '/': # '**/': zero or more directories
+                    parts.append('(?:.*/)?')
+                    i = end + 1
+                    continue
+            while i < n and pattern[i] == '*': # Any other run of stars is a single '*'
+                i += 1
+            parts.append('[^/]*')
+            continue
+        if c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n: # No closing bracket: a literal '['
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                negate = body[:1] in ('!', '^')
+                if negate:
+                    body = body[1:]
+                body = body.replace('\\', '\\\\').replace('[', '\\[')
+                parts.append(f"[^/{body}]" if negate else f"[{body}]")
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+
+def _parse_line(line: str):
+    """Returns (glob, negate, dir_only, anchored) for one gitignore line, or None for blanks and comments."""
+    line = line.rstrip('\n').rstrip('\r')
+    if not line or line.startswith('#'):
+        return None
+    # Trailing spaces are dropped unless escaped with a backslash
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash at the start or in the middle anchors the pattern to the file's directory
+    anchored = '/' in line
+    return line.lstrip('/'), negate, dir_only, anchored
+
+
+class GitIgnoreRules:
+    """
+    The compiled rules of one ignore file (a .gitignore, .git/info/exclude or the global
+    excludes file). Paths are given relative to the directory the rules apply to.
+
+    Rules are grouped by what they are matched against - the entry name for patterns
+    without a slash, the relative path otherwise - and by whether they also apply to
+    files. Each group is one regex whose alternatives are ordered last rule first, so the
+    first alternative that matches is the rule git would let win.
+    """
+    def __init__(self, lines):
+        rules = [rule for rule in map(_parse_line, lines) if rule is not None]
+        self.rule_count = len(rules)
+        self._negated = [negate for _, negate, _, _ in rules]
+        self._name_dirs, self._name_files = self._compile(rules, anchored=False)
+        self._path_dirs, self._path_files = self._compile(rules, anchored=True)
+
+    @classmethod
+    def from_file(cls, file_path_str: str):
+        with open(file_path_str, 'r', encoding='utf-8', errors='replace') as f:
+            return cls(f.read().splitlines())
+
+    @staticmethod
+    def _compile(rules: list, anchored: bool):
+        """Returns (regex for directories, regex for files); each is None if it has no rules."""
+        dir_parts, file_parts = [], []
+        for index in reversed(range(len(rules))):
+            glob, _, dir_only, rule_anchored = rules[index]
+            if rule_anchored != anchored:
+                continue
+            # Group names carry the rule's index so a match tells which rule won
+            part = f"(?P<r{index}>{_translate(glob)})"
+            dir_parts.append(part)
+            if not dir_only:
+                file_parts.append(part)
+        return (
+            re.compile(rf"(?:{'|'.join(dir_parts)})\Z", _REGEX_FLAGS) if dir_parts else None,
+            re.compile(rf"(?:{'|'.join(file_parts)})\Z", _REGEX_FLAGS) if file_parts else None,
+        )
+
+    def match(self, relative_path: str, name: str, is_dir: bool):
+        """
+        Returns True (ignored), False (re-included by a '!' rule) or None (no rule matched)
+        for a '/'-separated path relative to the rules' directory.
+        """
+        name_regex = self._name_dirs if is_dir else self._name_files
+        path_regex = self._path_dirs if is_dir else self._path_files
+        winner = -1
+        if name_regex is not None:
+            m = name_regex.match(name)
+            if m is not None:
+                winner = int(m.lastgroup[1:])
+        if path_regex is not None:
+            m = path_regex.match(relative_path)
+            if m is not None:
+                winner = max(winner, int(m.lastgroup[1:]))
+        if winner < 0:
+            return None
+        return not self._negated[winner]
+
+
+class GitIgnoreChain:
+    """
+    The ignore files that apply inside one directory, lowest precedence first:
+    the global excludes file, .git/info/exclude, then every .gitignore from the
+    repository top down to the directory itself. Each source is (rules, strip, prepend):
+    a path relative to the scan root is made relative to the rules' own directory by
+    dropping 'strip' leading characters and adding 'prepend' in front.
+    """
+    __slots__ = ("sources",)
+
+    def __init__(self, sources: tuple):
+        self.sources = sources
+
+    def __bool__(self):
+        return bool(self.sources)
+
+    def extended(self, rules: GitIgnoreRules, relative_dir_str: str):
+        strip = len(relative_dir_str) + 1 if relative_dir_str else 0
+        return GitIgnoreChain(self.sources + ((rules, strip, ""),))
+
+    def is_ignored(self, relative_path_str: str, name: str, is_dir: bool) -> bool:
+        """relative_path_str is relative to the scan root and '/'-separated."""
+        for rules, strip, prepend in reversed(self.sources):
+            decision = rules.match(prepend + relative_path_str[strip:], name, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+class GitIgnoreStack:
+    """
+    Resolves the GitIgnoreChain of every directory of one scan. Chains are built top-down
+    from the parent's chain; a directory listing already tells whether a .gitignore is
+    present, so directories without one cost nothing. Parsed files come from a cache
+    shared across scans and validated by (mtime, size), so unchanged files keep their
+    GitIgnoreRules object - scan indexes rely on that identity to reuse filtered listings.
+    """
+    FILE_NAME = ".gitignore"
+
+    def __init__(self, root_path_str: str, rules_cache: dict):
+        self.root_path_str = root_path_str
+        self._rules_cache = rules_cache # file path -> ((mtime_ns, size), GitIgnoreRules)
+        self._chains = {"": self._root_chain()}
+
+    def _load_rules(self, file_path_str: str):
+        try:
+            st = os.stat(file_path_str)
+        except OSError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._rules_cache.get(file_path_str)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            rules = GitIgnoreRules.from_file(file_path_str)
+        except (OSError, ValueError) as e:
+            print(f"Could not read ignore file {file_path_str}: {e}")
+            return None
+        self._rules_cache[file_path_str] = (signature, rules)
+        return rules
+
+    @staticmethod
+    def _global_excludes_path():
+        config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+        return os.path.join(config_home, "git", "ignore")
+
+    def _root_chain(self) -> GitIgnoreChain:
+        """Chain for the scan root, including ignore files of the repository above it."""
+        work_tree = find_work_tree(self.root_path_str)
+        sources = []
+        if work_tree is not None: # Outside a work tree only .gitignore files below the root count
+            repo_top, git_dir = work_tree
+            # Paths relative to the repository top start with the root's own location in it
+            root_in_repo = os.path.relpath(self.root_path_str, repo_top)
+            prepend = "" if root_in_repo == os.curdir else root_in_repo.replace(os.sep, "/") + "/"
+            for file_path_str in (self._global_excludes_path(), os.path.join(git_dir, "info", "exclude")):
+                rules = self._load_rules(file_path_str)
+                if rules is not None and rules.rule_count:
+                    sources.append((rules, 0, prepend))
+            # .gitignore files of the repository top and every directory above the root
+            parts = prepend.rstrip("/").split("/") if prepend else []
+            for depth in range(len(parts)):
+                rules = self._load_rules(os.path.join(repo_top, *parts[:depth], self.FILE_NAME))
+                if rules is not None and rules.rule_count:
+                    sources.append((rules, 0, "/".join(parts[depth:]) + "/"))
+
+        chain = GitIgnoreChain(tuple(sources))
+        rules = self._load_rules(os.path.join(self.root_path_str, self.FILE_NAME))
+        if rules is not None and rules.rule_count:
+            chain = chain.extended(rules, "")
+        return chain
+
+    def chain_for(self, relative_dir_str: str, has_gitignore: bool = None) -> GitIgnoreChain:
+        """
+        Returns the chain for a directory given relative to the root (os.sep-separated).
+        has_gitignore says whether the directory contains a .gitignore; None means unknown
+        (it is then looked up on disk).
+        """
+        chain = self._chains.get(relative_dir_str)
+        if chain is not None:
+            return chain
+        parent_chain = self.chain_for(os.path.dirname(relative_dir_str))
+        chain = parent_chain
+        dir_path_str = os.path.join(self.root_path_str, relative_dir_str)
+        gitignore_path = os.path.join(dir_path_str, self.FILE_NAME)
+        if has_gitignore is None:
+            has_gitignore = os.path.isfile(gitignore_path)
+        if has_gitignore:
+            rules = self._load_rules(gitignore_path)
+            if rules is not None and rules.rule_count:
+                chain = parent_chain.extended(rules, relative_dir_str.replace(os.sep, "/"))
+        self._chains[relative_dir_str] = chain
+        return chain
@@ -0,0 +1,134 @@
+# core/ignore_matcher.py
+import os
+import re
+import fnmatch
+from pathlib import Path
+
+_GLOB_MAGIC = ('*', '?', '[')
+PROJECT_IGNORE_FILE_NAME = ".file-consolidator-ignore" # As AppMainWindowQt.IGNORE_FILE_NAME
+# fnmatch.fnmatch compares os.path.normcase'd strings; that is the identity on POSIX.
+_NEEDS_NORMCASE = os.path.normcase('A/b') != 'A/b'
+
+
+def _has_magic(pattern: str) -> bool:
+    return any(c in pattern for c in _GLOB_MAGIC)
+
+
+def _combine_regex(patterns: list):
+    """Joins fnmatch translations into one alternation, or None if there is nothing to match."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+
+class _PatternSet:
+    """
+    One group of glob patterns split by how cheaply they can be tested:
+    literal names go into a set, '*<literal>' patterns into suffix tables
+    (bucketed by suffix length) and everything else into a single regex.
+    """
+    def __init__(self, patterns: list):
+        self.exact = set()
+        suffixes = {} # suffix length -> set of suffixes
+        complex_patterns = []
+        for pattern in patterns:
+            if not _has_magic(pattern):
+                self.exact.add(pattern)
+            elif pattern.startswith('*') and not _has_magic(pattern[1:]):
+                suffix = pattern[1:]
+                suffixes.setdefault(len(suffix), set()).add(suffix)
+            else:
+                complex_patterns.append(pattern)
+        self.match_all = 0 in suffixes # A bare '*'
+        self.suffixes = tuple((-length, group) for length, group in suffixes.items() if length)
+        self.regex = _combine_regex(complex_patterns)
+
+    def matches(self, value: str) -> bool:
+        if value in self.exact or self.match_all:
+            return True
+        for neg_length, group in self.suffixes:
+            if value[neg_length:] in group:
+                return True
+        return self.regex is not None and self.regex.match(value) is not None
+
+
+class IgnoreMatcher:
+    """
+    Compiled form of a scan's ignore patterns (defaults plus project-specific ones).
+
+    Built once per scan and then queried for every directory entry. Matching follows
+    the rules FileProcessor._is_ignored has always used:
+      * a pattern matches the entry name or its path relative to the scan root,
+      * patterns ending in a slash match any directory prefix of the relative path,
+      * a plain pattern equal to the first path component ignores directories below it.
+    Case handling matches fnmatch.fnmatch (os.path.normcase on both sides).
+    """
+    def __init__(self, patterns: list):
+        self.patterns = list(patterns)
+        normalized = [os.path.normcase(p) for p in self.patterns]
+        self._names = _PatternSet(normalized)
+        # A relative path is only tested when it contains a separator. Literal and
+        # '*<literal>' patterns without a separator can then only match it if they already
+        # matched the entry name, so this set keeps the rest: patterns containing a
+        # separator and every pattern that needs the regex.
+        self._relative_paths = _PatternSet([
+            n for n in normalized
+            if os.sep in n or '/' in n or _has_magic(n.lstrip('*'))
+        ])
+        self._dir_prefixes = _PatternSet([n for p, n in zip(self.patterns, normalized) if p.endswith(('/', '\\'))])
+        # Plain patterns whose final component matches itself, compared verbatim against
+        # the first component of the relative path (see _is_ignored history).
+        self._top_level_dir_names = set()
+        for p in self.patterns:
+            if p.endswith(('/', '\\')):
+                continue
+            name = Path(p).name
+            if name and fnmatch.fnmatch(name, p):
+                self._top_level_dir_names.add(name)
+
+    def is_ignored(self, name: str, relative_path_str: str | None, is_dir: bool, parents_checked: bool = False) -> bool:
+        """
+        Returns True if the entry should be skipped.
+
+        When parents_checked is True the caller guarantees that every ancestor directory
+        was itself tested with this matcher and kept (as a top-down scan does), so only
+        the last path prefix needs to be looked at instead of all of them.
+        """
+        if _NEEDS_NORMCASE:
+            name = os.path.normcase(name)
+        if self._names.matches(name):
+            return True
+        if relative_path_str is None:
+            return False
+        relative_norm = os.path.normcase(relative_path_str) if _NEEDS_NORMCASE else relative_path_str
+        is_nested = os.sep in relative_norm
+        if is_nested and self._relative_paths.matches(relative_norm):
+            return True
+
+        if parents_checked:
+            if self._dir_prefixes.matches(relative_norm + os.sep):
+                return True
+            return is_dir and not is_nested and relative_path_str in self._top_level_dir_names
+
+        prefix = ""
+        for i, part in enumerate(relative_norm.split(os.sep)):
+            prefix = os.path.join(prefix, part)
+            if self._dir_prefixes.matches(prefix + os.sep):
+                return True
+            if i == 0 and is_dir and relative_path_str.split(os.sep, 1)[0] in self._top_level_dir_names:
+                return True
+        return False
+
+
+def load_project_ignores(root_path_str: str) -> list:
+    """The patterns of the root's project ignore file, as the GUI loads them."""
+    patterns = []
+    try:
+        with open(os.path.join(root_path_str, PROJECT_IGNORE_FILE_NAME), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and line not in patterns:
+                    patterns.append(line)
+    except (FileNotFoundError, NotADirectoryError): # The scan reports a root that is no directory
+        pass
+    return patterns
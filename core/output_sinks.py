@@ -0,0 +1,259 @@
+# core/output_sinks.py
+import os
+import sys
+import zlib
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import config
+
+
+class OutputSink:
+    """
+    Destination for streamed consolidation output. write() receives text chunks in
+    order; close() finishes the output. Sinks are context managers.
+    """
+    def write(self, text: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FileSink(OutputSink):
+    """Writes to a file path (or an already open binary file object), encoding as it goes."""
+    def __init__(self, target, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self._owns_file = isinstance(target, (str, os.PathLike))
+        self._file = open(target, "wb") if self._owns_file else target
+        self.bytes_written = 0
+
+    def write(self, text: str):
+        data = text.encode(self.encoding)
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+def _zstd_compress_function():
+    """compress(data, level) for a zstd frame, or None without zstandard (or Python 3.14's compression.zstd)."""
+    try:
+        import zstandard
+        return lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+    except ImportError:
+        pass
+    try:
+        from compression import zstd
+        return lambda data, level: zstd.compress(data, level)
+    except ImportError:
+        return None
+
+
+def _gzip_compress(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # wbits 31: a gzip member
+    return compressor.compress(data) + compressor.flush()
+
+
+# Compression method -> (file extension, compress(data, level) or None if not available)
+COMPRESSION_METHODS = {
+    "zstd": (".zst", _zstd_compress_function()),
+    "gzip": (".gz", _gzip_compress),
+}
+
+
+def preferred_compression() -> str:
+    """config.OUTPUT_COMPRESSION if it is available, else gzip."""
+    method = config.OUTPUT_COMPRESSION
+    if COMPRESSION_METHODS.get(method, (None, None))[1] is None:
+        return "gzip"
+    return method
+
+
+def compression_for_path(path) -> str:
+    """The compression method a file name asks for by its extension, or None."""
+    name = os.fspath(path).lower()
+    for method, (extension, _) in COMPRESSION_METHODS.items():
+        if name.endswith(extension):
+            return method
+    return None
+
+
+class CompressedFileSink(OutputSink):
+    """
+    Writes compressed output to a file path (or open binary file object) as the text
+    streams in. The text is cut into BLOCK_BYTES blocks that are compressed on a
+    small thread pool - zlib and zstd release the GIL - while the caller goes on
+    reading files, and written in order as gzip members or zstd frames, which the
+    standard tools decompress as one stream. At most two blocks per thread are in
+    flight, so memory stays bounded. method defaults to preferred_compression(),
+    level to config.OUTPUT_COMPRESSION_LEVELS; an unavailable method raises ValueError.
+    """
+    BLOCK_BYTES = 1024 * 1024
+
+    def __init__(self, target, method: str = None, level: int = None, threads: int = None,
+                 encoding: str = "utf-8"):
+        self.method = method or preferred_compression()
+        extension, self._compress = COMPRESSION_METHODS.get(self.method, (None, None))
+        if self._compress is None:
+            raise ValueError(f"Compression '{self.method}' is not available"
+                             + (" (install the zstandard package)" if self.method == "zstd" else ""))
+        self.level = level if level is not None else config.OUTPUT_COMPRESSION_LEVELS[self.method]
+        self.encoding = encoding
+        self._threads = max(1, min(threads or config.OUTPUT_COMPRESSION_THREADS, os.cpu_count() or 1))
+        self._owns_file = isinstance(target, (str, os.PathLike))
+        self._file = open(target, "wb") if self._owns_file else target
+        self._pool = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="compress")
+        self._pending = deque() # Futures of compressed blocks, in output order
+        self._block = []
+        self._block_size = 0
+        self._blocks_submitted = 0
+        self._closed = False
+        self.bytes_written = 0 # Uncompressed
+        self.compressed_bytes = 0
+
+    def write(self, text: str):
+        data = text.encode(self.encoding)
+        self._block.append(data)
+        self._block_size += len(data)
+        self.bytes_written += len(data)
+        if self._block_size >= self.BLOCK_BYTES:
+            self._submit_block()
+
+    def _submit_block(self):
+        block = b"".join(self._block)
+        self._block, self._block_size = [], 0
+        self._pending.append(self._pool.submit(self._compress, block, self.level))
+        self._blocks_submitted += 1
+        # Write out what is done; wait only when too many blocks are in flight
+        while self._pending and (self._pending[0].done() or len(self._pending) > 2 * self._threads):
+            self._write_compressed(self._pending.popleft().result())
+
+    def _write_compressed(self, data: bytes):
+        self._file.write(data)
+        self.compressed_bytes += len(data)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._block or not self._blocks_submitted: # Empty output is still a valid stream
+                self._submit_block()
+            while self._pending:
+                self._write_compressed(self._pending.popleft().result())
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            if self._owns_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+def open_file_sink(path, encoding: str = "utf-8") -> OutputSink:
+    """A FileSink, or a CompressedFileSink if the file name ends in a compression extension."""
+    method = compression_for_path(path)
+    return CompressedFileSink(path, method, encoding=encoding) if method else FileSink(path, encoding)
+
+
+class SocketSink(OutputSink):
+    """Sends the output over a connected socket."""
+    def __init__(self, sock, encoding: str = "utf-8"):
+        self.sock = sock
+        self.encoding = encoding
+        self.bytes_written = 0
+
+    def write(self, text: str):
+        data = text.encode(self.encoding)
+        self.sock.sendall(data)
+        self.bytes_written += len(data)
+
+
+class CallbackSink(OutputSink):
+    """Hands every chunk to a callable, e.g. a text view's append method."""
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, text: str):
+        self.callback(text)
+
+
+class ClipboardPipeSink(OutputSink):
+    """
+    Streams into the system clipboard through the platform's copy command
+    (pbcopy, wl-copy, xclip or xsel), so the text is never held in one piece.
+    """
+    def __init__(self, command: list):
+        self.command = command
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+
+    @staticmethod
+    def find_command():
+        """Returns the copy command for this system, or None if there is none to pipe into."""
+        if sys.platform == "darwin":
+            candidates = [["pbcopy"]]
+        elif sys.platform.startswith("win"):
+            return None # clip.exe mangles non-ASCII text; pyperclip uses the native API instead
+        else:
+            candidates = []
+            if os.environ.get("WAYLAND_DISPLAY"):
+                candidates.append(["wl-copy"])
+            if os.environ.get("DISPLAY"):
+                candidates += [["xclip", "-selection", "clipboard"], ["xsel", "--clipboard", "--input"]]
+        for command in candidates:
+            if shutil.which(command[0]):
+                return command
+        return None
+
+    def write(self, text: str):
+        self._process.stdin.write(text.encode("utf-8"))
+
+    def close(self):
+        if self._process.stdin.closed:
+            return
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise OSError(f"'{' '.join(self.command)}' exited with status {self._process.returncode}")
+
+
+class BufferedClipboardSink(OutputSink):
+    """Fallback for systems without a copy command to pipe into: collects the text for pyperclip."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, text: str):
+        self._chunks.append(text)
+
+    def close(self):
+        if self._chunks is None:
+            return
+        import pyperclip
+        text = "".join(self._chunks)
+        self._chunks = None
+        pyperclip.copy(text)
+
+
+def open_clipboard_sink() -> OutputSink:
+    command = ClipboardPipeSink.find_command()
+    return ClipboardPipeSink(command) if command else BufferedClipboardSink()
+
+
+def write_chunks(chunks, sink: OutputSink) -> int:
+    """Writes every chunk to sink; returns the number of characters written."""
+    written = 0
+    for chunk in chunks:
+        sink.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,168 @@
+# core/scan_index.py
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from . import config
+
+# Entry flags stored per listing entry
+_FLAG_FILE = 1
+_FLAG_DIR = 2
+
+# A listing is only trusted if the directory's mtime is older than the moment it was
+# listed by at least this much; otherwise a change within the same timestamp tick
+# could go unnoticed. 2s covers the coarsest common mtime granularity (FAT).
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+class ScanIndex:
+    """
+    Persistent per-root record of directory listings, validated by directory mtime.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed in it,
+    so a listing recorded with the same mtime can be reused without reading the
+    directory again. Listings are stored unfiltered; ignore patterns are applied by
+    the scanner, so changing them does not invalidate the index.
+
+    Besides the raw listings, the index remembers the filtered listing built from each
+    one for the last filter used (ignore matcher plus .gitignore rules), which lets an
+    unchanged refresh reuse whole directories without testing their entries again. It is
+    kept as immutable (name, type, relative path) tuples, never as tree nodes, so no scan
+    shares nodes with another.
+    """
+    VERSION = 2
+
+    def __init__(self, root_path_str: str, index_path: Path = None):
+        self.root_path_str = root_path_str
+        self.index_path = Path(index_path) if index_path else self.index_path_for_root(root_path_str)
+        self._dirs = {} # relative dir -> (mtime_ns, listed_at_ns, entries)
+        self._built = {} # relative dir -> (filter key, entries, kept entries)
+        self._visited = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def index_path_for_root(root_path_str: str) -> Path:
+        digest = hashlib.sha1(root_path_str.encode('utf-8', 'surrogatepass')).hexdigest()
+        return config.SCAN_INDEX_DIR / f"{digest}.json"
+
+    def load(self):
+        """Loads the index from disk; a missing or unreadable file just means an empty index."""
+        try:
+            with self.index_path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.VERSION or data.get("root") != self.root_path_str:
+            return
+        self._dirs = {
+            relative_dir: (mtime_ns, listed_at_ns, self._entries_from_json(names, flags))
+            for relative_dir, (mtime_ns, listed_at_ns, names, flags) in data.get("dirs", {}).items()
+        }
+
+    def save(self):
+        """Writes the index if anything changed since it was loaded or last saved."""
+        if not self._dirty:
+            return
+        with self._lock:
+            dirs = {
+                relative_dir: [mtime_ns, listed_at_ns, *self._entries_to_json(entries)]
+                for relative_dir, (mtime_ns, listed_at_ns, entries) in self._dirs.items()
+            }
+            self._dirty = False
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            # json.dumps uses the C encoder; json.dump to a file would not
+            payload = json.dumps({"version": self.VERSION, "root": self.root_path_str, "dirs": dirs}, separators=(',', ':'))
+            with tmp_path.open('w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Could not save scan index {self.index_path}: {e}")
+
+    def begin_scan(self):
+        self._visited = set()
+        self.hits = 0
+        self.misses = 0
+
+    def end_scan(self, prune: bool = True):
+        """
+        Finishes a scan. With prune=True (a full walk) listings of directories that the
+        scan did not reach - deleted, moved or now ignored - are dropped.
+        """
+        if prune:
+            with self._lock:
+                stale = [d for d in self._dirs if d not in self._visited]
+                for relative_dir in stale:
+                    del self._dirs[relative_dir]
+                    self._built.pop(relative_dir, None)
+                if stale:
+                    self._dirty = True
+        self.save()
+
+    def invalidate(self, relative_dir_str: str):
+        """Forgets one directory's listing so the next scan reads it again."""
+        with self._lock:
+            if self._dirs.pop(relative_dir_str, None) is not None:
+                self._dirty = True
+            self._built.pop(relative_dir_str, None)
+
+    def get_entries(self, dir_path_str: str, relative_dir_str: str, read_directory):
+        """
+        Returns (entries, reused) for a directory. entries are the sorted
+        (is_file, lowercase name, name, is_dir) tuples produced by read_directory;
+        reused is True when the recorded listing was still valid and the directory
+        was not read.
+        """
+        self._visited.add(relative_dir_str)
+        mtime_ns = os.stat(dir_path_str).st_mtime_ns
+        cached = self._dirs.get(relative_dir_str)
+        if cached is not None and cached[0] == mtime_ns and mtime_ns + _RACY_WINDOW_NS < cached[1]:
+            self.hits += 1
+            return cached[2], True
+
+        self.misses += 1
+        listed_at_ns = time.time_ns()
+        entries = read_directory(dir_path_str)
+        with self._lock:
+            self._dirs[relative_dir_str] = (mtime_ns, listed_at_ns, entries)
+            self._built.pop(relative_dir_str, None)
+            self._dirty = True
+        return entries, False
+
+    def get_built_listing(self, relative_dir_str: str, filter_key, entries):
+        """
+        Returns the kept entries previously filtered from these exact entries with an
+        equal filter_key, if any. Filter keys are compared with ==; the scanner uses its
+        ignore matcher, or a tuple of it and the directory's .gitignore sources.
+        """
+        built = self._built.get(relative_dir_str)
+        if built is not None and built[1] is entries and built[0] == filter_key:
+            return built[2]
+        return None
+
+    def store_built_listing(self, relative_dir_str: str, filter_key, entries, listing):
+        self._built[relative_dir_str] = (filter_key, entries, listing)
+
+    @staticmethod
+    def _entries_to_json(entries):
+        """Encodes a listing as two strings: NUL-joined names and one flag digit per entry."""
+        names = "\0".join(name for _, _, name, _ in entries)
+        flags = "".join(str((_FLAG_FILE if is_file else 0) | (_FLAG_DIR if is_dir else 0)) for is_file, _, _, is_dir in entries)
+        return names, flags
+
+    @staticmethod
+    def _entries_from_json(names, flags):
+        if not flags:
+            return []
+        return [
+            (bool(int(flag) & _FLAG_FILE), name.lower(), sys.intern(name), bool(int(flag) & _FLAG_DIR))
+            for name, flag in zip(names.split("\0"), flags)
+        ]
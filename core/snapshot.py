@@ -0,0 +1,257 @@
+# core/snapshot.py
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+from . import config
+from .content_cache import file_signature, signature_is_settled
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ConsolidationSnapshot:
+    """
+    What the last consolidation of a root included: for each file (by path relative to
+    the root) its signature (see content_cache) and a hash of the text it contributed.
+    With store_content the text itself is kept too, zlib-compressed and stored once per
+    hash, so later changes can be shown as diffs; keep_content() turns that on for good.
+    Kept on disk under config.SNAPSHOT_DIR, one manifest per root (<sha1 of root>.json)
+    plus a directory of that name for the texts, and used as the baseline of delta
+    consolidations. record() is thread-safe; it runs on the read pool.
+    """
+    VERSION = 1
+
+    def __init__(self, root_path_str: str, snapshot_dir: Path = None, store_content: bool = None):
+        self.root_path_str = root_path_str
+        snapshot_dir = Path(snapshot_dir) if snapshot_dir else config.SNAPSHOT_DIR
+        digest = hashlib.sha1(root_path_str.encode('utf-8', 'surrogatepass')).hexdigest()
+        self.manifest_path = snapshot_dir / f"{digest}.json"
+        self.objects_dir = snapshot_dir / digest
+        self.store_content = config.SNAPSHOT_STORE_CONTENT if store_content is None else store_content
+        self.files = {} # relative path -> [size, mtime_ns, inode, hash]; signature None if it was not settled
+        self._previous = {} # The entries before begin(), reused for files whose signature is unchanged
+        self.created_at = None # time.time() of the consolidation that recorded it
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def description(self) -> str:
+        if self.created_at is None:
+            return "the last consolidation (none recorded)"
+        return f"the last consolidation ({time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.created_at))})"
+
+    def load(self) -> bool:
+        try:
+            with self.manifest_path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.VERSION or data.get("root") != self.root_path_str:
+            return False
+        self.files = data.get("files", {})
+        self.created_at = data.get("created_at")
+        self.store_content = self.store_content or data.get("store_content", False)
+        return True
+
+    def keep_content(self):
+        """Keeps the texts of the files recorded from now on (saved with the manifest), for diffs."""
+        self.store_content = True
+
+    def begin(self, replace: bool):
+        """Starts recording a consolidation; replace forgets the files recorded before."""
+        with self._lock:
+            self._previous = self.files
+            if replace:
+                self.files = {}
+            self.created_at = time.time()
+
+    def record(self, relative_path_str: str, file_path_str: str, content: str):
+        """
+        Records the text a file contributed. Its signature is taken now, after the read;
+        if it matches the one recorded before, the entry is kept without hashing the text.
+        """
+        try:
+            signature = file_signature(os.stat(file_path_str))
+        except OSError: # Gone; nothing to compare against later
+            return
+        # A file written since it was read has a fresh mtime; its signature must not vouch for what was read
+        if signature is not None and not signature_is_settled(signature, time.time_ns()):
+            signature = None
+        previous = self._previous.get(relative_path_str)
+        if signature is not None and previous is not None and tuple(previous[:3]) == signature:
+            if self.store_content and not (self.objects_dir / previous[3]).exists(): # Recorded before keep_content()
+                self._store_object(previous[3], content.encode('utf-8', 'surrogatepass'))
+            with self._lock:
+                self.files[relative_path_str] = previous
+            return
+        data = content.encode('utf-8', 'surrogatepass')
+        digest = content_hash(data)
+        if self.store_content:
+            self._store_object(digest, data)
+        with self._lock:
+            self.files[relative_path_str] = [*(signature or (None, None, None)), digest]
+
+    def revert(self):
+        """Drops what was recorded since the last save."""
+        with self._lock:
+            self.files = {}
+            self._previous = {}
+            self.created_at = None
+        self.load()
+
+    def forget(self, relative_path_str: str):
+        with self._lock:
+            self.files.pop(relative_path_str, None)
+
+    def content(self, digest: str):
+        """The recorded text with this hash, or None if it was not kept."""
+        try:
+            with open(self.objects_dir / digest, 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8', 'surrogatepass')
+        except (OSError, zlib.error):
+            return None
+
+    def save(self):
+        """Writes the manifest and deletes stored texts no file refers to any more (all of them without store_content)."""
+        with self._lock:
+            payload = json.dumps({"version": self.VERSION, "root": self.root_path_str, "created_at": self.created_at,
+                                  "store_content": self.store_content, "files": self.files}, separators=(',', ':'))
+            referenced = {entry[3] for entry in self.files.values()} if self.store_content else set()
+            self._previous = {}
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with tmp_path.open('w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"Could not save snapshot {self.manifest_path}: {e}")
+            return
+        try:
+            for entry in os.scandir(self.objects_dir):
+                if entry.name not in referenced:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+    def _store_object(self, digest: str, data: bytes):
+        object_path = self.objects_dir / digest
+        if object_path.exists(): # Stored by content, so unchanged files are never rewritten
+            return
+        tmp_path = object_path.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        try:
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('wb') as f:
+                f.write(zlib.compress(data, 1))
+            os.replace(tmp_path, object_path)
+        except OSError as e:
+            print(f"Could not store snapshot content {object_path}: {e}")
+
+
+class SnapshotBaseline:
+    """
+    Delta baseline from a ConsolidationSnapshot as it is now: files with an unchanged
+    signature are taken as unchanged, others are read and hashed. The entries are copied,
+    so recording the delta into the same snapshot does not move the baseline.
+    """
+    def __init__(self, snapshot: ConsolidationSnapshot, read_content):
+        self.snapshot = snapshot
+        self.read_content = read_content # file path -> text as consolidation includes it
+        self.description = snapshot.description
+        self._files = dict(snapshot.files)
+
+    def status(self, relative_path_str: str, file_path_str: str) -> str:
+        """'added', 'modified' or 'unchanged'."""
+        entry = self._files.get(relative_path_str)
+        if entry is None:
+            return "added"
+        try:
+            st = os.stat(file_path_str)
+        except OSError:
+            return "modified"
+        if entry[0] is not None and tuple(entry[:3]) == file_signature(st):
+            return "unchanged"
+        content = self.read_content(file_path_str)
+        return "unchanged" if content_hash(content.encode('utf-8', 'surrogatepass')) == entry[3] else "modified"
+
+    def removed_paths(self, present=()) -> list:
+        """Recorded files that no longer exist; the relative paths in present are known to."""
+        root = self.snapshot.root_path_str
+        return sorted(relative_path for relative_path in self._files
+                      if relative_path not in present and not os.path.lexists(os.path.join(root, relative_path)))
+
+    def old_content(self, relative_path_str: str):
+        entry = self._files.get(relative_path_str)
+        return self.snapshot.content(entry[3]) if entry is not None else None
+
+
+class GitBaseline:
+    """
+    Delta baseline from a git revision: the files of 'ref' below the root (git ls-tree)
+    and the ones the work tree changed since (git diff --name-status). Old texts are read
+    through one 'git cat-file --batch' process. Raises RuntimeError if git fails.
+    """
+    def __init__(self, root_path_str: str, ref: str, encoding: str = "utf-8"):
+        self.root_path_str = root_path_str
+        self.ref = ref
+        self.encoding = encoding
+        self.description = f"git revision '{ref}'"
+        ref_files = self._git("ls-tree", "-r", "--name-only", "-z", ref)
+        self._ref_files = set(self._split_paths(ref_files))
+        self._changes = {}
+        records = self._split_paths(self._git("diff", "--name-status", "-z", "--no-renames", "--relative", ref, "--"))
+        for status, path in zip(records[::2], records[1::2]):
+            self._changes[path] = status[:1]
+        self._cat_file = None
+
+    def _git(self, *args) -> bytes:
+        try:
+            result = subprocess.run(["git", *args], cwd=self.root_path_str, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+        except OSError as e:
+            raise RuntimeError(f"Cannot run git: {e}") from e
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"git {args[0]} failed")
+        return result.stdout
+
+    @staticmethod
+    def _split_paths(output: bytes) -> list:
+        return [os.fsdecode(path) for path in output.split(b"\0") if path]
+
+    @staticmethod
+    def _git_path(relative_path_str: str) -> str:
+        return relative_path_str.replace(os.sep, "/")
+
+    def status(self, relative_path_str: str, file_path_str: str) -> str:
+        git_path = self._git_path(relative_path_str)
+        if git_path not in self._ref_files:
+            return "added"
+        return "modified" if self._changes.get(git_path) in ("M", "T") else "unchanged"
+
+    def removed_paths(self, present=()) -> list:
+        return sorted(path for path, status in self._changes.items() if status == "D")
+
+    def old_content(self, relative_path_str: str):
+        if self._cat_file is None:
+            self._cat_file = subprocess.Popen(["git", "cat-file", "--batch"], cwd=self.root_path_str,
+                                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._cat_file.stdin.write(f"{self.ref}:./{self._git_path(relative_path_str)}\n".encode('utf-8', 'surrogateescape'))
+        self._cat_file.stdin.flush()
+        header = self._cat_file.stdout.readline().split()
+        if len(header) != 3: # '<name> missing'
+            return None
+        data = self._cat_file.stdout.read(int(header[2]))
+        self._cat_file.stdout.read(1) # Trailing newline
+        return data.decode(self.encoding, 'ignore').replace('\r\n', '\n')
+
+    def close(self):
+        if self._cat_file is not None:
+            self._cat_file.stdin.close()
+            self._cat_file.wait()
+            self._cat_file = None
@@ -0,0 +1,77 @@
+# core/tree_node.py
+import os
+import sys
+
+# Value of the 'children' slot for nodes that have no "children" key: files, and
+# directories a streaming scan has not listed yet.
+_ABSENT = object()
+
+
+class TreeNode:
+    """
+    One entry of a scanned tree, in place of the old {"name", "path", "type", "children"} dict.
+
+    Only the name (interned, so repeated names like '__init__.py' are stored once),
+    the type, the parent and the child list are kept. The absolute path is rebuilt from
+    the parent chain when asked for; top-level nodes hold their directory's path string
+    as parent. 'directory_error' placeholders share the path of the directory they sit in,
+    as they always have. Since the path rests on the parent chain, a node belongs to one
+    tree only: scans never reuse nodes of a tree they returned before.
+
+    Nodes still support item access (node["path"], node.get("children"), "children" in node)
+    so code written against the dict form keeps working. Unlike a dict, a node stored as
+    QTreeWidgetItem data is kept by reference instead of being copied into a QVariantMap.
+    """
+    __slots__ = ("name", "type", "parent", "children")
+
+    def __init__(self, name: str, node_type: str, parent, children=_ABSENT):
+        self.name = sys.intern(name)
+        self.type = node_type
+        self.parent = parent # TreeNode, or the containing directory's path for top-level nodes
+        self.children = children
+
+    @property
+    def path(self) -> str:
+        if self.type == "directory_error":
+            return self.parent.path if isinstance(self.parent, TreeNode) else self.parent
+        names = [self.name]
+        parent = self.parent
+        while isinstance(parent, TreeNode):
+            names.append(parent.name)
+            parent = parent.parent
+        names.append(parent.rstrip(os.sep) if parent != os.sep else "")
+        return os.sep.join(reversed(names))
+
+    # --- Mapping-style compatibility with the dict form ---
+    def __getitem__(self, key: str):
+        if key == "path":
+            return self.path
+        if key in ("name", "type") or (key == "children" and self.children is not _ABSENT):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key != "children":
+            raise KeyError(key)
+        self.children = value
+
+    def __contains__(self, key: str) -> bool:
+        if key == "children":
+            return self.children is not _ABSENT
+        return key in ("name", "path", "type")
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> dict:
+        """Returns the node and its loaded subtree in the old dict form."""
+        item_info = {"name": self.name, "path": self.path, "type": self.type}
+        if self.children is not _ABSENT:
+            item_info["children"] = None if self.children is None else [child.to_dict() for child in self.children]
+        return item_info
+
+    def __repr__(self):
+        return f"TreeNode({self.name!r}, {self.type!r})"
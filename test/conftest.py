@@ -0,0 +1,9 @@
+# test/conftest.py
+import os
+import sys
+
+# The Tk/tkinterdnd2 checks here are scripts run by hand (python test/check_tcl_tkdnd.py);
+# they do their work at import and exit, so pytest must not collect them.
+collect_ignore = ["check_tcl_tkdnd.py", "test_dnd_transform.py"]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+# test/test_cli.py
+# The headless entry point consolidates what the options select, without importing the GUI;
+# batch runs manifest jobs, one process per root.
+# Run with: python -m pytest test/test_cli.py
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+from core.ignore_matcher import PROJECT_IGNORE_FILE_NAME
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "root"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "app.py").write_text("print('app')\n")
+    (root / "src" / "notes.txt").write_text("notes\n")
+    (root / "build.txt").write_text("build output\n")
+    (root / PROJECT_IGNORE_FILE_NAME).write_text("# Project ignores\nbuild.txt\n")
+    return root
+
+
+def consolidate(root, output, *options) -> str:
+    assert cli.main(["consolidate", str(root), "-o", str(output), "--no-snapshot", "-q", *options]) == 0
+    return output.read_text() if output.suffix == ".txt" else gzip.decompress(output.read_bytes()).decode()
+
+
+def test_include_and_project_ignores_select_files(root, tmp_path):
+    text = consolidate(root, tmp_path / "out.txt", "-i", "*.py")
+    assert "print('app')" in text
+    assert "notes\n" not in text
+    assert "build output" not in text
+
+
+def test_exclude_and_compressed_output(root, tmp_path):
+    text = consolidate(root, tmp_path / "out.txt.gz", "-x", "*.py", "--no-tree")
+    assert "notes\n" in text
+    assert "print('app')" not in text
+
+
+def test_gui_is_not_imported(root, tmp_path):
+    script = ("import sys, cli; cli.main(sys.argv[1:]); "
+              "assert not {'PyQt6', 'tkinter', 'pyperclip'} & set(sys.modules), sorted(sys.modules)")
+    output = tmp_path / "out.txt"
+    subprocess.run([sys.executable, "-c", script, "consolidate", str(root), "-o", str(output), "--no-snapshot", "-q"],
+                   check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert "print('app')" in output.read_text()
+
+
+def run_batch(tmp_path, manifest, *options) -> tuple:
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest))
+    report_path = tmp_path / "report.json"
+    status = cli.main(["batch", str(manifest_path), "--report", str(report_path), "-q", *options])
+    return status, json.loads(report_path.read_text())["jobs"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_jobs_on_one_root_share_its_scan(root, tmp_path, jobs):
+    manifest = {"defaults": {"root": "root", "no_snapshot": True},
+                "jobs": [{"name": "py", "output": "out/py.txt", "include": "*.py"},
+                         {"name": "txt", "output": "out/txt.txt", "include": ["*.txt"]}]}
+    status, reports = run_batch(tmp_path, manifest, "-j", str(jobs))
+    assert status == 0
+    assert [report["name"] for report in reports] == ["py", "txt"]
+    assert [report["scan_shared"] for report in reports] == [False, True]
+    assert "print('app')" in (tmp_path / "out" / "py.txt").read_text()
+    assert "notes\n" in (tmp_path / "out" / "txt.txt").read_text()
+
+
+def test_failed_job_does_not_stop_the_others(root, tmp_path):
+    manifest = [{"root": "missing", "output": "missing.txt", "no_snapshot": True},
+                {"root": "root", "output": "root.txt", "no_snapshot": True}]
+    status, reports = run_batch(tmp_path, manifest, "-j", "2")
+    assert status == 1
+    assert [report["status"] for report in reports] == ["failed", "ok"]
+    assert "print('app')" in (tmp_path / "root.txt").read_text()
+
+
+def test_manifest_with_unknown_option_runs_nothing(root, tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps([{"root": "root", "output": "out.txt", "colour": "red"}]))
+    assert cli.main(["batch", str(manifest_path), "-q"]) == 1
+    assert not (tmp_path / "out.txt").exists()
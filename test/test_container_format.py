@@ -0,0 +1,55 @@
+# test/test_container_format.py
+# Consolidations written as containers read back to the same text and the same files.
+# Run with: python -m pytest test/test_container_format.py
+from core.container_format import ContainerReader, ContainerSink, container_to_text, text_to_container
+from core.file_processor import FileProcessor, ReadStats
+from core.output_sinks import write_chunks
+
+FILES = {
+    "a.txt": "shared text\n",
+    "b.txt": "shared text\n", # Deduplicated: a reference to a.txt
+    "c.txt": "[Identical to a.txt]", # Only looks like one
+    "d.txt": "[Identical to b.txt]",
+}
+
+
+def consolidate_to_container(tmp_path, deduplicate=True):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name, text in FILES.items():
+        (root / name).write_text(text)
+    stats = ReadStats()
+    chunks = list(FileProcessor().iter_consolidation([str(root / name) for name in FILES], str(root),
+                                                      stats=stats, deduplicate=deduplicate))
+    container_path = tmp_path / "out.fccx"
+    with ContainerSink(str(container_path), duplicates=stats.duplicates) as sink:
+        write_chunks(iter(chunks), sink)
+    return "".join(chunks), container_path, stats
+
+
+def test_round_trip_keeps_text_and_files(tmp_path):
+    text, container_path, stats = consolidate_to_container(tmp_path)
+    assert stats.duplicates == {"b.txt": "a.txt"}
+    with ContainerReader(str(container_path)) as reader:
+        assert "".join(reader.iter_text()) == text
+        assert reader.read("a.txt") == "shared text\n"
+        assert reader.read("b.txt") == "shared text\n"
+        assert reader.read("c.txt") == "[Identical to a.txt]" # Its own content, not a.txt's
+        assert reader.read("d.txt") == "[Identical to b.txt]"
+        same_as = {entry["path"]: entry.get("same_as") for entry in reader.entries}
+        assert same_as == {"a.txt": None, "b.txt": "a.txt", "c.txt": None, "d.txt": None}
+        assert reader.verify() == []
+
+
+def test_text_conversion_infers_no_references(tmp_path):
+    text, container_path, _ = consolidate_to_container(tmp_path)
+    text_path = tmp_path / "out.txt"
+    container_to_text(str(container_path), str(text_path))
+    assert text_path.read_text() == text
+    converted_path = tmp_path / "converted.fccx"
+    text_to_container(str(text_path), str(converted_path))
+    with ContainerReader(str(converted_path)) as reader:
+        assert "".join(reader.iter_text()) == text
+        assert reader.read("b.txt") == "[Identical to a.txt]" # Stored as it reads
+        assert reader.read("c.txt") == "[Identical to a.txt]"
+        assert not any("same_as" in entry for entry in reader.entries)
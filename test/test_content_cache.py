@@ -0,0 +1,88 @@
+# test/test_content_cache.py
+# Decoded contents are reused only while the file is unchanged: in memory and, with
+# CONTENT_CACHE_DISK_MB, on disk across processes. Nor may they outlive the settings
+# that let the file through.
+# Run with: python -m pytest test/test_content_cache.py
+import os
+import time
+
+import pytest
+
+from core import config
+from core.content_cache import ContentCache
+from core.file_processor import FileProcessor
+
+PAST = 1_000_000_000 # An mtime old enough for a file's signature to be trusted
+GENERATED_TEXT = "// Code generated by protoc. DO NOT EDIT.\npackage api\n"
+
+
+def write_file(path, text, mtime=PAST):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CONTENT_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(config, "CONTENT_CACHE_DISK_MB", 16)
+
+
+@pytest.fixture
+def generated_file(tmp_path, disk_cache, monkeypatch):
+    monkeypatch.setattr(config, "CLASSIFY_SKIP_GENERATED", False)
+    return write_file(tmp_path / "api.pb.go", GENERATED_TEXT)
+
+
+def test_unchanged_file_is_served_from_memory(tmp_path):
+    file_path = write_file(tmp_path / "a.txt", "first\n")
+    processor = FileProcessor()
+    assert processor.read_file_content(file_path) == "first\n"
+    assert processor.read_file_content(file_path) == "first\n"
+    assert processor.content_cache.hits == 1
+    write_file(tmp_path / "a.txt", "second\n", PAST + 1)
+    assert processor.read_file_content(file_path) == "second\n"
+    assert processor.content_cache.hits == 1
+
+
+def test_recently_modified_file_is_not_cached(tmp_path):
+    file_path = write_file(tmp_path / "a.txt", "fresh\n", time.time())
+    processor = FileProcessor()
+    processor.read_file_content(file_path)
+    processor.read_file_content(file_path)
+    assert processor.content_cache.hits == 0
+
+
+def test_disk_tier_outlives_the_processor(tmp_path, disk_cache):
+    file_path = write_file(tmp_path / "a.txt", "kept on disk\n")
+    assert FileProcessor().read_file_content(file_path) == "kept on disk\n"
+    processor = FileProcessor()
+    assert processor.read_file_content(file_path) == "kept on disk\n"
+    assert processor.content_cache.disk_hits == 1
+
+
+def test_memory_tier_stays_within_its_budget():
+    cache = ContentCache(max_bytes=1000)
+    for i in range(20):
+        cache.put(f"/f{i}", (100, PAST * 10**9, i), "x" * 100, read_at_ns=time.time_ns())
+    assert 0 < cache.size_bytes <= 1000
+    assert cache.get("/f19", (100, PAST * 10**9, 19)) == "x" * 100
+    assert cache.get("/f0", (100, PAST * 10**9, 0)) is None
+
+
+def test_disk_entry_is_not_served_after_skip_is_enabled(generated_file, monkeypatch):
+    assert FileProcessor().read_file_content(generated_file) == GENERATED_TEXT
+    monkeypatch.setattr(config, "CLASSIFY_SKIP_GENERATED", True)
+    processor = FileProcessor() # Fresh memory tier: only the disk entry could answer
+    assert processor.read_file_content(generated_file) == "[Generated file, skipped: api.pb.go]"
+    assert processor.content_cache.disk_hits == 0
+
+
+def test_memory_entry_follows_settings(generated_file, monkeypatch):
+    processor = FileProcessor()
+    assert processor.read_file_content(generated_file) == GENERATED_TEXT
+    monkeypatch.setattr(config, "CLASSIFY_SKIP_GENERATED", True)
+    assert processor.read_file_content(generated_file) == "[Generated file, skipped: api.pb.go]"
+    monkeypatch.setattr(config, "CLASSIFY_SKIP_GENERATED", False)
+    assert processor.read_file_content(generated_file) == GENERATED_TEXT
+    assert processor.content_cache.hits + processor.content_cache.disk_hits == 1
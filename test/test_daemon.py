@@ -0,0 +1,76 @@
+# test/test_daemon.py
+# A warm root serves the same document as the command line and follows the files on
+# disk without being scanned again; over TCP only clients with the token are served.
+# Run with: python -m pytest test/test_daemon.py
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import cli
+from core import config
+from core.daemon import ConsolidationDaemon
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    for name in ("SCAN_INDEX_DIR", "TOKEN_INDEX_DIR", "SNAPSHOT_DIR"):
+        monkeypatch.setattr(config, name, tmp_path / name.lower())
+    monkeypatch.setattr(config, "DAEMON_STATE_FILE", tmp_path / "daemon.json")
+    root = tmp_path / "root"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "app.py").write_text("print('app')\n")
+    (root / "README.md").write_text("# App\n")
+    return root
+
+
+def consolidate(daemon, root) -> str:
+    stream = daemon.consolidate({"root": str(root), "no_snapshot": True})
+    try:
+        return "".join(stream.chunks)
+    finally:
+        stream.close()
+
+
+def test_warm_root_matches_cli_and_follows_changes(root, tmp_path):
+    output = tmp_path / "cli.txt"
+    assert cli.main(["consolidate", str(root), "-o", str(output), "--no-snapshot", "-q"]) == 0
+    daemon = ConsolidationDaemon()
+    try:
+        assert consolidate(daemon, root) == output.read_text()
+        (root / "src" / "new.py").write_text("print('new')\n")
+        deadline = time.monotonic() + 3
+        while "print('new')" not in consolidate(daemon, root):
+            assert time.monotonic() < deadline, "the added file never appeared"
+            time.sleep(0.05)
+        [status] = daemon.status({})["roots"]
+        if status["watching"]:
+            assert status["scans"] == 1
+    finally:
+        daemon.shutdown()
+
+
+def test_tcp_requests_need_the_token(root):
+    daemon = ConsolidationDaemon()
+    thread = threading.Thread(target=daemon.serve, kwargs={"port": 0}, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 3
+        while not config.DAEMON_STATE_FILE.exists():
+            assert time.monotonic() < deadline, "the daemon never started"
+            time.sleep(0.02)
+        state = json.loads(config.DAEMON_STATE_FILE.read_text())
+        url = f"http://127.0.0.1:{state['port']}/consolidate"
+        body = json.dumps({"root": str(root), "no_snapshot": True}).encode()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(urllib.request.Request(url, body))
+        assert error.value.code in (401, 403)
+        request = urllib.request.Request(url, body, {"Authorization": f"Bearer {state['token']}"})
+        with urllib.request.urlopen(request) as response:
+            assert "print('app')" in response.read().decode()
+    finally:
+        daemon.shutdown()
+        thread.join(5)
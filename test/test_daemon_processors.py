@@ -0,0 +1,50 @@
+# test/test_daemon_processors.py
+# The daemon's two FileProcessors (with and without default ignores) must keep one record
+# per root, and compiling ignore patterns must be safe from concurrent request threads.
+# Run with: python -m pytest test/test_daemon_processors.py
+import threading
+
+import pytest
+
+from core import config
+from core.daemon import ConsolidationDaemon
+from core.file_processor import FileProcessor
+
+
+@pytest.fixture(autouse=True)
+def state_dirs(tmp_path, monkeypatch):
+    for name in ("SCAN_INDEX_DIR", "TOKEN_INDEX_DIR", "SNAPSHOT_DIR"):
+        monkeypatch.setattr(config, name, tmp_path / name.lower())
+
+
+def test_processors_share_per_root_stores(tmp_path):
+    daemon = ConsolidationDaemon()
+    with_defaults, without_defaults = daemon._processor(False), daemon._processor(True)
+    assert with_defaults is not without_defaults
+    assert without_defaults.ignore_patterns == []
+    root = str(tmp_path)
+    assert without_defaults.get_snapshot(root) is with_defaults.get_snapshot(root)
+    assert without_defaults.get_scan_index(root) is with_defaults.get_scan_index(root)
+    assert without_defaults.get_token_index(root) is with_defaults.get_token_index(root)
+
+
+def test_compile_ignore_patterns_from_many_threads():
+    file_processor = FileProcessor()
+    errors = []
+
+    def compile_many(offset):
+        try:
+            for i in range(300): # Far more pattern lists than are kept: evictions all the time
+                patterns = [f"*.ext{(offset + i) % 40}"]
+                assert file_processor.compile_ignore_patterns(patterns).is_ignored(
+                    f"a.ext{(offset + i) % 40}", None, False)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=compile_many, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(file_processor._ignore_matchers) <= 8
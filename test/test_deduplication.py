@@ -0,0 +1,21 @@
+# test/test_deduplication.py
+# Deduplicated consolidations reference only files whose text really is identical.
+# Run with: python -m pytest test/test_deduplication.py
+import pytest
+
+from core.file_processor import FileProcessor, ReadStats
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_only_identical_text_is_referenced(tmp_path, workers):
+    texts = {"a.txt": "same text\n", "b.txt": "same text\n", "c.txt": "same tex!\n", "d.txt": "",
+             "e.txt": "same text\n"}
+    for name, text in texts.items():
+        (tmp_path / name).write_text(text)
+    stats = ReadStats()
+    output = FileProcessor().consolidate_files_content(
+        [str(tmp_path / name) for name in texts], str(tmp_path), workers=workers, stats=stats, deduplicate=True)
+    assert "--- FILE: b.txt ---\n[Identical to a.txt]\n" in output
+    assert "--- FILE: e.txt ---\n[Identical to a.txt]\n" in output
+    assert "--- FILE: c.txt ---\nsame tex!\n" in output # Same length, different text
+    assert stats.duplicate_files == 2
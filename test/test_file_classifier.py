@@ -0,0 +1,85 @@
+# test/test_file_classifier.py
+# core.file_classifier on the kinds of files a project holds: binary data must be told
+# from text in any common encoding, minified code from ordinary source, and prose with
+# long soft-wrapped lines must stay text.
+# Run with: python -m pytest test/test_file_classifier.py
+import json
+
+from core.file_classifier import classify_buffer
+from core.file_processor import FileProcessor
+
+MINIFIED_JS = "!function(e,t){" + ";".join(
+    f"var a{i}=function(n){{return n*{i}+e.x[{i}]}},b{i}=t({i},'x')" for i in range(300)) + "}(window,document);"
+MINIFIED_CSS = ".a{color:red;margin:0 auto}.b>.c{padding:1px 2px 3px 4px}" * 100
+ONE_LINE_JSON = json.dumps([{"id": i, "name": f"item {i}", "tags": ["a", "b"]} for i in range(400)])
+WORDS = ("the scanner lists each directory once and keeps what it found, so a refresh only reads "
+         "directories whose entries changed since; files are read on a pool of threads").split()
+
+
+def paragraph(length: int, offset: int = 0) -> str:
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(WORDS[(len(words) * 7 + offset) % len(WORDS)])
+    return " ".join(words) + "."
+
+
+# Soft-wrapped Markdown: three ~1650-character paragraphs, each on one line
+PROSE_MARKDOWN = "# Project\n\n" + "\n\n".join(paragraph(1650, i) for i in range(3)) + "\n"
+
+
+def test_binary_data_is_binary():
+    assert not classify_buffer(bytes(range(256)) * 8).is_text
+    assert not classify_buffer(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + bytes(64)).is_text
+
+
+def test_encodings_are_detected():
+    text = "Grüße, naïve café\n" * 20
+    assert classify_buffer(text.encode("utf-8")).encoding == "utf-8"
+    assert classify_buffer(text.encode("cp1252")).encoding == "cp1252"
+    for encoding in ("utf-16", "utf-16-le", "utf-16-be"):
+        classification = classify_buffer(text.encode(encoding))
+        assert classification.is_text
+        assert classification.decode(text.encode(encoding)).lstrip("\ufeff") == text
+
+
+def test_minified_code_is_minified():
+    for text in (MINIFIED_JS, MINIFIED_CSS, ONE_LINE_JSON):
+        assert classify_buffer(text.encode()).minified
+
+
+def test_short_lines_are_not_minified():
+    code = "\n".join(f"def f{i}(a, b):\n    return a + b * {i}\n" for i in range(200))
+    assert not classify_buffer(code.encode()).minified
+
+
+def test_soft_wrapped_prose_is_not_minified():
+    assert len(PROSE_MARKDOWN) > 2048 and len(PROSE_MARKDOWN) / PROSE_MARKDOWN.count("\n") > 500
+    classification = classify_buffer(PROSE_MARKDOWN.encode())
+    assert classification.is_text and not classification.minified
+
+
+def test_prose_in_utf16_is_not_minified():
+    assert not classify_buffer(PROSE_MARKDOWN.encode("utf-16")).minified
+
+
+def test_minified_files_are_skipped(tmp_path):
+    (tmp_path / "app.py").write_text("print('hello')\n")
+    (tmp_path / "app.min.js").write_text(MINIFIED_JS)
+    output = FileProcessor().consolidate_files_content(
+        [str(tmp_path / "app.py"), str(tmp_path / "app.min.js")], str(tmp_path))
+    assert "print('hello')" in output
+    assert "[Minified file, skipped: app.min.js]" in output
+
+
+def test_tiny_files_with_nul_bytes_are_binary():
+    for data in (b"\x00", b"\x01\x00\x02", b"\x00\x01\x02"):
+        assert not classify_buffer(data).is_text, data
+
+
+def test_prose_readme_is_consolidated(tmp_path):
+    (tmp_path / "README.md").write_text(PROSE_MARKDOWN)
+    (tmp_path / "app.min.js").write_text(MINIFIED_JS)
+    output = FileProcessor().consolidate_files_content(
+        [str(tmp_path / "README.md"), str(tmp_path / "app.min.js")], str(tmp_path))
+    assert PROSE_MARKDOWN.strip() in output
+    assert "[Minified file, skipped: app.min.js]" in output
@@ -0,0 +1,52 @@
+# test/test_file_window.py
+# Oversized files are read as a window of whole lines, with markers for what was left out.
+# Run with: python -m pytest test/test_file_window.py
+import pytest
+
+from core import config
+from core.file_processor import FileProcessor
+from core.file_window import plan_windows
+
+LINES = [f"line {i:04d}\n" for i in range(1, 2001)] # 10 bytes each
+
+
+@pytest.fixture
+def large_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LARGE_FILE_WINDOW_KB", 1)
+    file_path = tmp_path / "big.txt"
+    file_path.write_text("".join(LINES))
+    return str(file_path)
+
+
+def read_window(file_path_str: str) -> str:
+    processor = FileProcessor()
+    processor.max_file_size_bytes = 4096
+    return processor.read_file_content(file_path_str)
+
+
+def test_plan_windows_merges_overlapping_ranges():
+    assert plan_windows(100, "head_tail", 1000) == [(0, 100)]
+    assert plan_windows(10_000, "head_tail", 1000) == [(0, 500), (9500, 10_000)]
+    assert plan_windows(10_000, "tail", 1000) == [(9000, 10_000)]
+    with pytest.raises(ValueError):
+        plan_windows(10_000, "middle", 1000)
+
+
+@pytest.mark.parametrize("mode", ["head", "tail", "head_tail", "sample"])
+def test_window_keeps_whole_lines(large_file, monkeypatch, mode):
+    monkeypatch.setattr(config, "LARGE_FILE_MODE", mode)
+    content = read_window(large_file)
+    note, _, body = content.partition("\n")
+    assert note.startswith("[Large file")
+    shown = [line + "\n" for line in body.splitlines() if not line.startswith("[...")]
+    assert shown and set(shown) <= set(LINES)
+    assert "bytes elided" in body
+    if mode in ("head", "head_tail"):
+        assert shown[0] == LINES[0]
+    if mode in ("tail", "head_tail"):
+        assert shown[-1] == LINES[-1]
+
+
+def test_skip_mode_still_skips(large_file, monkeypatch):
+    monkeypatch.setattr(config, "LARGE_FILE_MODE", "skip")
+    assert read_window(large_file).startswith("[File too large")
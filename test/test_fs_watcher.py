@@ -0,0 +1,69 @@
+# test/test_fs_watcher.py
+# Ignore files edited in place leave their directory's listing untouched, yet change
+# what a scan lists: watchers must still report them.
+# Run with: python -m pytest test/test_fs_watcher.py
+import os
+import sys
+import time
+
+import pytest
+
+from core.fs_watcher import InotifyWatcher, PollingWatcher
+
+WATCHERS = [PollingWatcher]
+if sys.platform.startswith("linux"):
+    WATCHERS.append(InotifyWatcher)
+
+
+def _wait_for_changes(watcher, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        changes = watcher.take_changes(settled=False)
+        if changes is not None:
+            return changes
+        time.sleep(0.02)
+    return None
+
+
+@pytest.fixture(params=WATCHERS, ids=lambda cls: cls.__name__)
+def work_tree(request, tmp_path):
+    (tmp_path / ".git" / "info").mkdir(parents=True)
+    (tmp_path / ".git" / "info" / "exclude").write_text("")
+    (tmp_path / "src" / "lib").mkdir(parents=True)
+    (tmp_path / "src" / ".gitignore").write_text("*.log\n")
+    (tmp_path / "src" / "notes.txt").write_text("notes\n")
+    kwargs = {"interval_seconds": 0.02} if request.param is PollingWatcher else {}
+    watcher = request.param(**kwargs)
+    for dir_path in (tmp_path, tmp_path / "src", tmp_path / "src" / "lib"):
+        watcher.add_directory(str(dir_path))
+    watcher.watch_git_excludes(str(tmp_path))
+    watcher.start()
+    yield tmp_path, watcher
+    watcher.stop()
+
+
+def test_gitignore_edited_in_place_reports_its_subtree(work_tree):
+    root, watcher = work_tree
+    with open(root / "src" / ".gitignore", "a") as f:
+        f.write("build/\n")
+    changed, needs_full_rescan = _wait_for_changes(watcher)
+    assert not needs_full_rescan
+    assert changed == {str(root / "src"), str(root / "src" / "lib")}
+
+
+def test_exclude_file_edit_needs_full_rescan(work_tree):
+    root, watcher = work_tree
+    with open(root / ".git" / "info" / "exclude", "a") as f:
+        f.write("*.tmp\n")
+    changes = _wait_for_changes(watcher)
+    assert changes is not None and changes[1]
+
+
+def test_other_files_edited_in_place_are_not_reported(work_tree):
+    root, watcher = work_tree
+    with open(root / "src" / "notes.txt", "a") as f:
+        f.write("more\n")
+    assert _wait_for_changes(watcher, timeout=0.3) is None
+    os.remove(root / "src" / "notes.txt")
+    changed, _ = _wait_for_changes(watcher)
+    assert str(root / "src") in changed
@@ -0,0 +1,56 @@
+# test/test_gitignore.py
+# Scans honour the .gitignore files below the root; a root inside a work tree also the
+# repository's exclude file and the .gitignore files above it, even when '.git' is a
+# file pointing elsewhere.
+# Run with: python -m pytest test/test_gitignore.py
+import os
+
+import pytest
+
+from core import config
+from core.file_processor import FileProcessor
+from core.gitignore import GitIgnoreStack
+
+
+@pytest.mark.parametrize("linked", [False, True], ids=["git_dir", "gitdir_file"])
+def test_root_inside_work_tree_uses_repository_rules(tmp_path, linked):
+    repo = tmp_path / "repo"
+    git_dir = tmp_path / "worktree.git" if linked else repo / ".git"
+    (git_dir / "info").mkdir(parents=True)
+    (git_dir / "info" / "exclude").write_text("*.tmp\n")
+    (repo / "pkg" / "src").mkdir(parents=True)
+    if linked:
+        (repo / ".git").write_text("gitdir: ../worktree.git\n")
+    (repo / ".gitignore").write_text("pkg/src/generated/\n")
+    (repo / "pkg" / ".gitignore").write_text("*.log\n")
+
+    chain = GitIgnoreStack(str(repo / "pkg" / "src"), {}).chain_for("")
+    assert chain.is_ignored("scratch.tmp", "scratch.tmp", False)
+    assert chain.is_ignored("build.log", "build.log", False)
+    assert chain.is_ignored("generated", "generated", True)
+    assert not chain.is_ignored("main.py", "main.py", False)
+
+
+def test_root_outside_work_tree_uses_only_its_own_rules(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    chain = GitIgnoreStack(str(tmp_path), {}).chain_for("")
+    assert chain.is_ignored("build.log", "build.log", False)
+    assert not chain.is_ignored("scratch.tmp", "scratch.tmp", False)
+
+
+def test_nested_gitignore_files_prune_the_scan(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "GITIGNORE_ENABLED", True)
+    monkeypatch.setattr(config, "SCAN_INDEX_ENABLED", False)
+    (tmp_path / ".git").mkdir()
+    for relative_path in ["app.py", "debug.bak", "keep.bak", "src/main.py", "src/out/gen.py", "src/notes.md",
+                          "docs/index.md"]:
+        path = tmp_path / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(relative_path)
+    (tmp_path / ".gitignore").write_text("*.bak\n!keep.bak\n")
+    (tmp_path / "src" / ".gitignore").write_text("out/\n/*.md\n")
+
+    tree = FileProcessor().generate_file_tree(str(tmp_path))
+    files = sorted(os.path.relpath(path, tmp_path) for path in FileProcessor.iter_file_paths(tree))
+    assert files == sorted([".gitignore", "app.py", "keep.bak", os.path.join("docs", "index.md"),
+                            os.path.join("src", ".gitignore"), os.path.join("src", "main.py")])
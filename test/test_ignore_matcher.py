@@ -0,0 +1,135 @@
+# test/test_ignore_matcher.py
+# Equivalence of core.ignore_matcher.IgnoreMatcher with the per-pattern fnmatch loop
+# FileProcessor._is_ignored used before it. Run with: python -m pytest test/test_ignore_matcher.py
+import os
+import zlib
+import fnmatch
+import itertools
+from pathlib import Path
+
+import pytest
+
+from core import config
+from core.ignore_matcher import IgnoreMatcher
+
+
+def reference_is_ignored(name: str, relative_path_str: str, is_dir: bool, patterns: list) -> bool:
+    """The original _is_ignored, with the entry's is_dir() passed in instead of asked of the filesystem."""
+    if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+        return True
+    if any(fnmatch.fnmatch(relative_path_str, pattern) for pattern in patterns):
+        return True
+    current_path_part = ""
+    for part in relative_path_str.split(os.sep):
+        current_path_part = os.path.join(current_path_part, part)
+        if any(fnmatch.fnmatch(current_path_part + os.sep, p) for p in patterns if p.endswith(('/', '\\'))):
+            return True
+        if is_dir and any(fnmatch.fnmatch(current_path_part, p) for p in patterns
+                          if not p.endswith(('/', '\\')) and Path(p).name == current_path_part):
+            return True
+    return False
+
+
+SUFFIX_PATTERNS = ["*.min.js", "*.map", "*.lock", "*~", "*.tar.gz"]
+EXACT_PATTERNS = ["Makefile", "secrets.txt", "README", "build", "coverage", ".idea"]
+WILDCARD_PATTERNS = ["test_*", "*cache*", "[ab]*.cfg", "?.md", "*.py[co]", "tmp*", "x?z"]
+PATH_PATTERNS = ["src/generated/*", "docs/build/", "a/b/c.txt", "*/tmp/*", "vendor/", "lib/*.js",
+                 "src/*/fixtures/", "out/*/*.o"]
+
+
+def long_project_list(count: int = 400) -> list:
+    """A large project ignore file: every kind of pattern, many times over."""
+    patterns = []
+    for i in range(count // 8):
+        patterns += [f"module_{i}.py", f"*.ext{i}", f"gen_{i}/", f"src/pkg{i}/*.py",
+                     f"data{i}*", f"pkg{i}", f"*/cache{i}/*", f"[0-9]report{i}.csv"]
+    return patterns
+
+
+PATTERN_SETS = {
+    "defaults": list(config.DEFAULT_IGNORE_PATTERNS),
+    "suffix": SUFFIX_PATTERNS,
+    "exact": EXACT_PATTERNS,
+    "wildcard": WILDCARD_PATTERNS,
+    "path": PATH_PATTERNS,
+    "long_project_list": long_project_list(),
+    "everything": (list(config.DEFAULT_IGNORE_PATTERNS) + SUFFIX_PATTERNS + EXACT_PATTERNS + WILDCARD_PATTERNS
+                   + PATH_PATTERNS + long_project_list()),
+}
+
+DIR_NAMES = ["src", "generated", "docs", "build", "node_modules", "venv", ".git", "__pycache__", "a", "b",
+             "tmp", "vendor", "pkg3", "cache7", "lib", "out", "x", "fixtures", "data2", "gen_4", "coverage"]
+FILE_NAMES = ["main.py", "m.pyc", "app.min.js", "c.txt", "Makefile", "test_io.py", "a.cfg", "c.cfg", "1.md",
+              "notes.md", "module_3.py", "file.ext5", "data12.bin", "x.o", "index.js", "archive.tar.gz",
+              "run.log", "keep~", "xyz", "9report2.csv", "secrets.txt", "tmpfile", "pkg3"]
+
+
+def entry_corpus():
+    """(relative path, is_dir) for nested directories up to three levels and files in each."""
+    entries = []
+    for depth in range(1, 4):
+        for dirs in itertools.product(DIR_NAMES, repeat=depth):
+            # Keep the corpus manageable: full fan-out at the top, a sample further down
+            if depth > 1 and zlib.crc32("/".join(dirs).encode()) % (5 if depth == 2 else 60):
+                continue
+            dir_path = os.path.join(*dirs)
+            entries.append((dir_path, True))
+            entries += [(os.path.join(dir_path, name), False) for name in FILE_NAMES]
+    entries += [(name, False) for name in FILE_NAMES]
+    # Fixed cases that the sampling might leave out
+    for path, is_dir in [("src/generated/x.py", False), ("docs/build/html/index.html", False),
+                         ("a/b/c.txt", False), ("src/tmp/main.py", False), ("vendor/lib/index.js", False),
+                         ("lib/index.js", False), ("src/pkg3/main.py", False), ("out/x/x.o", False),
+                         ("src/b/fixtures", True), ("sub/build", True), ("build", True), ("build", False)]:
+        entries.append((path.replace("/", os.sep), is_dir))
+    return sorted(set(entries))
+
+
+ENTRIES = entry_corpus()
+
+
+@pytest.mark.parametrize("set_name", sorted(PATTERN_SETS))
+def test_matches_reference_on_every_entry(set_name):
+    patterns = PATTERN_SETS[set_name]
+    matcher = IgnoreMatcher(patterns)
+    mismatches = []
+    for relative_path, is_dir in ENTRIES:
+        name = os.path.basename(relative_path)
+        expected = reference_is_ignored(name, relative_path, is_dir, patterns)
+        if matcher.is_ignored(name, relative_path, is_dir) != expected:
+            mismatches.append((relative_path, is_dir, expected))
+    assert not mismatches, f"{len(mismatches)} mismatches, e.g. {mismatches[:5]}"
+
+
+@pytest.mark.parametrize("set_name", sorted(PATTERN_SETS))
+def test_matches_reference_top_down_with_parents_checked(set_name):
+    """As a scan uses it: an entry is only tested once all its ancestors were tested and kept."""
+    patterns = PATTERN_SETS[set_name]
+    matcher = IgnoreMatcher(patterns)
+    kept_dirs = {""}
+    mismatches = []
+    tested = 0
+    for relative_path, is_dir in sorted(ENTRIES, key=lambda entry: entry[0].count(os.sep)):
+        if os.path.dirname(relative_path) not in kept_dirs:
+            continue
+        tested += 1
+        name = os.path.basename(relative_path)
+        expected = reference_is_ignored(name, relative_path, is_dir, patterns)
+        if matcher.is_ignored(name, relative_path, is_dir, parents_checked=True) != expected:
+            mismatches.append((relative_path, is_dir, expected))
+        if is_dir and not expected:
+            kept_dirs.add(relative_path)
+    assert tested > len(FILE_NAMES)
+    assert not mismatches, f"{len(mismatches)} mismatches, e.g. {mismatches[:5]}"
+
+
+def test_corpus_exercises_both_outcomes():
+    patterns = PATTERN_SETS["everything"]
+    outcomes = {reference_is_ignored(os.path.basename(path), path, is_dir, patterns) for path, is_dir in ENTRIES}
+    assert outcomes == {True, False}
+
+
+def test_entry_outside_root_only_matches_by_name():
+    matcher = IgnoreMatcher(["*.log", "src/*"])
+    assert matcher.is_ignored("run.log", None, False)
+    assert not matcher.is_ignored("main.py", None, False)
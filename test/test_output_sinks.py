@@ -0,0 +1,29 @@
+# test/test_output_sinks.py
+# Compressed output decompresses, with the standard tools, to exactly the text written.
+# Run with: python -m pytest test/test_output_sinks.py
+import gzip
+
+from core.output_sinks import CompressedFileSink, FileSink, open_file_sink, write_chunks
+
+
+def test_gzip_blocks_decompress_as_one_stream(tmp_path, monkeypatch):
+    monkeypatch.setattr(CompressedFileSink, "BLOCK_BYTES", 1024) # Many blocks in flight
+    chunks = [f"--- FILE: f{i}.txt ---\n{'text ' * i}\n" for i in range(500)]
+    path = tmp_path / "out.txt.gz"
+    with CompressedFileSink(str(path), "gzip", threads=4) as sink:
+        write_chunks(iter(chunks), sink)
+    assert gzip.decompress(path.read_bytes()).decode() == "".join(chunks)
+    assert sink.bytes_written == len("".join(chunks).encode())
+
+
+def test_empty_output_is_a_valid_stream(tmp_path):
+    path = tmp_path / "empty.gz"
+    CompressedFileSink(str(path), "gzip").close()
+    assert gzip.decompress(path.read_bytes()) == b""
+
+
+def test_file_name_picks_the_sink(tmp_path):
+    with open_file_sink(tmp_path / "out.txt.gz") as sink:
+        assert isinstance(sink, CompressedFileSink) and sink.method == "gzip"
+    with open_file_sink(tmp_path / "out.txt") as sink:
+        assert isinstance(sink, FileSink)
@@ -0,0 +1,64 @@
+# test/test_snapshot_content.py
+# Snapshots keep no file texts by default; a diff-mode delta turns that on for its root.
+# Run with: python -m pytest test/test_snapshot_content.py
+import os
+import time
+
+import pytest
+
+from core import config
+from core.file_processor import FileProcessor
+from core.snapshot import ConsolidationSnapshot
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", tmp_path / "snapshots")
+    monkeypatch.setattr(config, "SNAPSHOT_ENABLED", True)
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.py").write_text("one\ntwo\n")
+    (root / "b.py").write_text("three\n")
+    return str(root)
+
+
+def modify(path_str: str, text: str):
+    with open(path_str, "w") as f:
+        f.write(text)
+    later = time.time() + 5 # A signature that differs from the recorded one
+    os.utime(path_str, (later, later))
+
+
+def stored_texts(root_str: str) -> list:
+    objects_dir = ConsolidationSnapshot(os.path.realpath(root_str)).objects_dir
+    return os.listdir(objects_dir) if objects_dir.is_dir() else []
+
+
+def consolidate(file_processor, root_str):
+    return "".join(file_processor.iter_consolidation(
+        [os.path.join(root_str, name) for name in ("a.py", "b.py")], root_str))
+
+
+def delta(file_processor, root_str, diffs):
+    return "".join(file_processor.iter_delta([os.path.join(root_str, name) for name in ("a.py", "b.py")],
+                                             root_str, diffs=diffs))
+
+
+def test_no_texts_stored_by_default(root):
+    assert config.SNAPSHOT_STORE_CONTENT is False
+    file_processor = FileProcessor()
+    consolidate(file_processor, root)
+    assert stored_texts(root) == []
+    modify(os.path.join(root, "a.py"), "one\n2\n")
+    output = delta(file_processor, root, diffs=True) # No old text yet: the whole file
+    assert "--- FILE (modified): a.py ---\none\n2\n" in output
+
+
+def test_diff_request_keeps_texts_from_then_on(root):
+    consolidate(FileProcessor(), root)
+    delta(FileProcessor(), root, diffs=True) # Nothing changed; asks for diffs all the same
+    consolidate(FileProcessor(), root) # Unchanged files have their texts stored now
+    assert len(stored_texts(root)) == 2
+    modify(os.path.join(root, "a.py"), "one\n2\n")
+    output = delta(FileProcessor(), root, diffs=True) # A fresh processor: the choice was saved
+    assert "--- DIFF: a.py ---" in output and "-two\n+2\n" in output
@@ -0,0 +1,90 @@
+# test/test_tree_sharing.py
+# A scan must never hand out nodes of a tree returned earlier: those trees may still be
+# in use (on the GUI thread, say) while a refresh or subtree scan runs elsewhere.
+# Run with: python -m pytest test/test_tree_sharing.py
+import os
+import time
+
+import pytest
+
+from core import config
+from core.file_processor import FileProcessor
+from core.tree_node import TreeNode
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SCAN_INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(config, "SCAN_INDEX_ENABLED", True)
+    root = tmp_path / "root"
+    for relative_path in ["a/one.py", "a/b/two.py", "a/b/c/three.txt", "d/four.md", "five.txt"]:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(relative_path)
+    # Old enough for the scan index to trust its listings (see scan_index._RACY_WINDOW_NS)
+    past = time.time() - 60
+    for dir_path, _, _ in os.walk(root):
+        os.utime(dir_path, (past, past))
+    return str(root)
+
+
+def snapshot_tree(file_processor, tree_items):
+    """(node, parent, path) for every node, to compare after later scans."""
+    return [(node, node.parent, path) for node, path in file_processor._iter_with_paths(tree_items)]
+
+
+def assert_untouched(snapshot):
+    for node, parent, path in snapshot:
+        assert node.parent is parent, f"{path}: parent replaced by {node.parent!r}"
+        assert node.path == path
+
+
+def node_ids(file_processor, tree_items) -> set:
+    return {id(node) for node, _ in file_processor._iter_with_paths(tree_items)}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_rescan_leaves_first_tree_untouched(root, workers):
+    file_processor = FileProcessor()
+    first = file_processor.generate_file_tree(root, workers=workers)
+    before = snapshot_tree(file_processor, first)
+    second = file_processor.generate_file_tree(root, workers=workers)
+    assert file_processor.get_scan_index(root).hits > 0 # The listings were reused...
+    assert not node_ids(file_processor, first) & node_ids(file_processor, second) # ...but not the nodes
+    assert_untouched(before)
+
+
+def test_scan_subtree_leaves_live_tree_untouched(root):
+    file_processor = FileProcessor()
+    file_processor.generate_file_tree(root)
+    live = file_processor.generate_file_tree(root) # Built from reused listings, as after a refresh
+    before = snapshot_tree(file_processor, live)
+    children = file_processor.scan_subtree(root, os.path.join(root, "a"))
+    assert [child.name for child in children] == ["b", "one.py"]
+    assert_untouched(before)
+    live_a = next(node for node in live if node.name == "a")
+    assert all(isinstance(node.parent, TreeNode) for node, _ in file_processor._iter_with_paths(live_a.children))
+
+
+def test_lazy_expand_leaves_previous_tree_untouched(root):
+    file_processor = FileProcessor()
+    full = file_processor.generate_file_tree(root)
+    before = snapshot_tree(file_processor, full)
+    lazy = file_processor.generate_file_tree(root, lazy=True)
+    file_processor.expand_directory(lazy, root, os.path.join(root, "a"))
+    assert_untouched(before)
+
+
+def test_copy_tree_fills_in_subtree_scans_without_touching_either(root):
+    file_processor = FileProcessor()
+    lazy = file_processor.generate_file_tree(root, lazy=True)
+    subtree = file_processor.scan_subtree(root, os.path.join(root, "a"))
+    before = snapshot_tree(file_processor, lazy) + snapshot_tree(file_processor, subtree)
+    copy = file_processor.copy_tree(lazy, {os.path.join(root, "a"): subtree})
+    assert_untouched(before)
+    assert not node_ids(file_processor, copy) & (node_ids(file_processor, lazy) | node_ids(file_processor, subtree))
+    assert sorted(file_processor.iter_file_paths(copy)) == sorted(
+        [os.path.join(root, "five.txt")] + list(file_processor.iter_file_paths(subtree)))
+    lines = file_processor.format_tree_structure(copy, "root").split("\n")
+    assert "│   │   │   └── three.txt" in lines
+    assert "├── d/ (not loaded)" in lines # No scan of its own: unknown, not empty
@@ -1,5 +1,13 @@
 import pyperclip
-import tkinter.messagebox as messagebox
+from core.output_sinks import open_clipboard_sink, write_chunks
+
+def _show_error(title: str, message: str):
+    """Error dialog via tkinter, imported only when there is an error to show (and skipped if it is missing)."""
+    try:
+        import tkinter.messagebox as messagebox
+    except ImportError:
+        return
+    messagebox.showerror(title, message)
 
 def copy_to_clipboard(text_to_copy: str):
     """
@@ -22,8 +30,34 @@ def copy_to_clipboard(text_to_copy: str):
             "- clip (comes with Windows)"
         )
         print(error_message) # Print to console as GUI might not be fully available for this popup
-        messagebox.showerror("Clipboard Error", error_message)
+        _show_error("Clipboard Error", error_message)
     except Exception as e: # Catch any other unexpected errors
         error_message = f"An unexpected error occurred while copying to clipboard: {e}"
         print(error_message)
-        messagebox.showerror("Clipboard Error", error_message)
\ No newline at end of file
+        _show_error("Clipboard Error", error_message)
+
+def copy_chunks_to_clipboard(chunks):
+    """
+    Copies text given as an iterable of chunks, piping it to the platform's copy
+    command as it comes so the text is never joined into one string. Falls back to
+    pyperclip (which needs the whole text) where there is no command to pipe into.
+    """
+    try:
+        with open_clipboard_sink() as sink:
+            written = write_chunks(chunks, sink)
+        if written:
+            print("Content copied to clipboard.")
+    except (pyperclip.PyperclipException, OSError) as e:
+        error_message = (
+            f"Could not copy to clipboard: {e}\n\n"
+            "Please ensure you have a copy/paste mechanism installed, such as:\n"
+            "- xclip, xsel or wl-copy (on Linux)\n"
+            "- pbcopy (comes with macOS)\n"
+            "- clip (comes with Windows)"
+        )
+        print(error_message)
+        _show_error("Clipboard Error", error_message)
+    except Exception as e:
+        error_message = f"An unexpected error occurred while copying to clipboard: {e}"
+        print(error_message)
+        _show_error("Clipboard Error", error_message)